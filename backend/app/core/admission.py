@@ -0,0 +1,268 @@
+# Priority-based admission control and load shedding for the HTTP app
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from urllib.parse import parse_qs
+
+from app.core.config import settings
+
+# Priority classes, highest first
+URGENT, NORMAL, ANALYTICS, BATCH = "urgent", "normal", "analytics", "batch"
+PRIORITY_CLASSES = (URGENT, NORMAL, ANALYTICS, BATCH)
+
+# Paths that are never queued or shed
+EXEMPT_PATHS = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json")
+# Long-lived streams would pin a concurrency slot for their whole lifetime
+STREAMING_SUFFIXES = ("/stream",)
+# Job results stay open until the job finishes when followed
+JOBS_PREFIX = "/api/v1/jobs/"
+FOLLOW_SUFFIX = "/results"
+TRUE_VALUES = ("1", "on", "t", "true", "y", "yes")
+
+MATCHING_PREFIX = "/api/v1/matching/"
+ANALYTICS_PREFIX = "/api/v1/analytics/"
+LATENCY_SAMPLES = 2048
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"{priority} request shed")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _ClassStats:
+    __slots__ = ("admitted", "shed", "queue_waits", "latencies")
+
+    def __init__(self):
+        self.admitted = 0
+        self.shed = 0
+        self.queue_waits: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+
+def _percentile(samples: Deque[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+
+class AdmissionController:
+    """
+    Strict-priority admission with per-class concurrency limits.
+
+    A request runs immediately when its class and the server both have free
+    slots and no higher-priority request is waiting. Otherwise it queues until
+    a slot is handed to it or its class deadline expires, at which point it is
+    shed. Classes with a zero-length queue are shed as soon as they cannot run.
+    """
+
+    def __init__(self, max_concurrency: int, class_limits: Dict[str, int],
+                 queue_timeouts_ms: Dict[str, int], max_queue: Dict[str, int], retry_after: int):
+        self.max_concurrency = max_concurrency
+        self.class_limits = class_limits
+        self.queue_timeouts = {cls: ms / 1000 for cls, ms in queue_timeouts_ms.items()}
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.class_in_flight = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {cls: deque() for cls in PRIORITY_CLASSES}
+        self.stats = {cls: _ClassStats() for cls in PRIORITY_CLASSES}
+
+    def _can_run(self, priority: str) -> bool:
+        return (self.in_flight < self.max_concurrency
+                and self.class_in_flight[priority] < self.class_limits.get(priority, self.max_concurrency))
+
+    def _higher_waiting(self, priority: str) -> bool:
+        for cls in PRIORITY_CLASSES:
+            if cls == priority:
+                return bool(self.waiters[cls])
+            if self.waiters[cls]:
+                return True
+        return False
+
+    def _start(self, priority: str):
+        self.in_flight += 1
+        self.class_in_flight[priority] += 1
+        self.stats[priority].admitted += 1
+
+    async def acquire(self, priority: str):
+        stats = self.stats[priority]
+        if self._can_run(priority) and not self._higher_waiting(priority):
+            self._start(priority)
+            stats.queue_waits.append(0.0)
+            return
+
+        queue = self.waiters[priority]
+        if len(queue) >= self.max_queue.get(priority, 0):
+            stats.shed += 1
+            raise Overloaded(priority, self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeouts.get(priority, 0))
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                queue.remove(waiter)
+                waiter.cancel()
+                stats.shed += 1
+                raise Overloaded(priority, self.retry_after)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(priority)
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+        # The slot was reserved by _dispatch when the waiter was woken
+        stats.queue_waits.append(time.perf_counter() - started)
+
+    def release(self, priority: str):
+        self.in_flight -= 1
+        self.class_in_flight[priority] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiters in priority order."""
+        for cls in PRIORITY_CLASSES:
+            queue = self.waiters[cls]
+            while queue and self._can_run(cls):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._start(cls)
+                waiter.set_result(None)
+            if queue and self.in_flight >= self.max_concurrency:
+                # Server is full and a higher class is still waiting
+                return
+
+    def record_latency(self, priority: str, seconds: float):
+        self.stats[priority].latencies.append(seconds)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "classes": {
+                cls: {
+                    "in_flight": self.class_in_flight[cls],
+                    "queued": len(self.waiters[cls]),
+                    "admitted": stats.admitted,
+                    "shed": stats.shed,
+                    "queue_wait_ms_p50": _percentile(stats.queue_waits, 0.5),
+                    "queue_wait_ms_p99": _percentile(stats.queue_waits, 0.99),
+                    "latency_ms_p50": _percentile(stats.latencies, 0.5),
+                    "latency_ms_p99": _percentile(stats.latencies, 0.99),
+                }
+                for cls, stats in self.stats.items()
+            },
+        }
+
+
+def classify(method: str, path: str, body: Optional[bytes] = None) -> str:
+    """Map a request to its priority class."""
+    if path.startswith(ANALYTICS_PREFIX):
+        return ANALYTICS
+    if "/batch" in path or "/export" in path or path.startswith("/api/v1/jobs"):
+        return BATCH
+    if path.startswith(MATCHING_PREFIX) and body:
+        try:
+            if json.loads(body).get("urgency") == URGENT:
+                return URGENT
+        except (ValueError, AttributeError):
+            pass
+    return NORMAL
+
+
+def is_stream(scope) -> bool:
+    """Whether a request opens a long-lived stream: SSE endpoints and followed job results."""
+    path = scope.get("path", "")
+    if path.endswith(STREAMING_SUFFIXES):
+        return True
+    if path.startswith(JOBS_PREFIX) and path.endswith(FOLLOW_SUFFIX):
+        follow = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("follow", [""])[-1]
+        return follow.lower() in TRUE_VALUES
+    return False
+
+
+class AdmissionMiddleware:
+    """ASGI middleware queueing or shedding requests through an AdmissionController."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path.startswith(EXEMPT_PATHS) or is_stream(scope):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.perf_counter()
+        body = None
+        if scope["method"] == "POST" and scope["path"].startswith(MATCHING_PREFIX):
+            # Matching urgency lives in the JSON body; buffer it and replay it downstream
+            body, receive = await _buffer_body(receive)
+        priority = classify(scope["method"], scope["path"], body)
+
+        try:
+            await self.controller.acquire(priority)
+        except Overloaded as e:
+            await _send_overloaded(send, e)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority)
+            self.controller.record_latency(priority, time.perf_counter() - arrived)
+
+
+async def _buffer_body(receive):
+    chunks: List[bytes] = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    body = b"".join(chunks)
+    replayed = False
+
+    async def replay():
+        nonlocal replayed
+        if not replayed:
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return body, replay
+
+
+async def _send_overloaded(send, error: Overloaded):
+    payload = json.dumps({"detail": "Server overloaded, please retry later",
+                          "priority": error.priority}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            (b"retry-after", str(error.retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+admission_controller = AdmissionController(
+    max_concurrency=settings.admission_max_concurrency,
+    class_limits=settings.admission_class_limits,
+    queue_timeouts_ms=settings.admission_queue_timeouts_ms,
+    max_queue=settings.admission_max_queue,
+    retry_after=settings.admission_retry_after_seconds,
+)
@@ -0,0 +1,384 @@
+# Recommendation candidates: per-user top-N services precomputed over a process pool into a memory-mapped table
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.event_log import Record, event_log
+from app.core.geo_sharding import SERVICE_TYPES
+from app.core.shared_state import SharedStateReader, publish
+from app.core.simulator import LOCATION_NAMES
+
+logger = logging.getLogger(__name__)
+
+SERVICE_INDEX = {name: i for i, name in enumerate(SERVICE_TYPES)}
+LOCATION_INDEX = {name: i for i, name in enumerate(LOCATION_NAMES)}
+
+# Blend of the user's own history, services co-booked with it and the local prior
+HISTORY_WEIGHT, AFFINITY_WEIGHT, PRIOR_WEIGHT = 0.5, 0.3, 0.2
+
+# Table arrays besides the model; one row per active user, sorted by user key
+TABLE_ARRAYS = ("user_ids", "counts", "locations", "services", "scores")
+
+
+class CandidateModel(NamedTuple):
+    """Item co-occurrence and popularity priors, fit from per-user booking counts."""
+    cooccurrence: np.ndarray  # (S, S): share of row-service bookers who also booked the column service
+    location_popularity: np.ndarray  # (L, S): booking share per location
+    popularity: np.ndarray  # (S,): booking share overall
+
+
+def user_key(user_id: str) -> int:
+    """Table key of a user: numeric ids map to themselves, others to a stable 62-bit hash."""
+    if user_id.isdigit() and int(user_id) < 1 << 62:
+        return int(user_id)
+    return (1 << 62) | int.from_bytes(hashlib.blake2b(user_id.encode(), digest_size=8).digest(), "little") >> 2
+
+
+def fit_model(counts: np.ndarray, locations: np.ndarray) -> CandidateModel:
+    booked = (counts > 0).astype(np.float64)
+    cooccurrence = booked.T @ booked
+    cooccurrence /= np.maximum(np.diag(cooccurrence)[:, None], 1.0)
+    totals = counts.astype(np.float64)
+    by_location = np.zeros((len(LOCATION_NAMES), len(SERVICE_TYPES)))
+    known = locations >= 0
+    np.add.at(by_location, locations[known], totals[known])
+    location_popularity = by_location / np.maximum(by_location.sum(axis=1, keepdims=True), 1.0)
+    popularity = totals.sum(axis=0) / max(totals.sum(), 1.0)
+    return CandidateModel(cooccurrence, location_popularity, popularity)
+
+
+def score_users(counts: np.ndarray, locations: np.ndarray, model: CandidateModel) -> np.ndarray:
+    """(m, S) scores in [0, 1] for m users from their booking counts and home locations (-1 if unknown)."""
+    counts = counts.astype(np.float64)
+    history = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1.0)
+    affinity = history @ model.cooccurrence
+    prior = np.where((locations >= 0)[:, None], model.location_popularity[np.maximum(locations, 0)],
+                     model.popularity)
+    # Cold users have no history: the prior is all there is to go on
+    cold = (counts.sum(axis=1) == 0)[:, None]
+    return np.where(cold, prior, HISTORY_WEIGHT * history + AFFINITY_WEIGHT * np.minimum(affinity, 1.0)
+                    + PRIOR_WEIGHT * prior)
+
+
+def top_services(scores: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    services = np.argsort(-scores, axis=1, kind="stable")[:, :top_n]
+    return services.astype(np.int8), np.take_along_axis(scores, services, axis=1).astype(np.float16)
+
+
+def _score_chunk(args) -> Tuple[np.ndarray, np.ndarray]:
+    counts, locations, model, top_n = args
+    return top_services(score_users(counts, locations, model), top_n)
+
+
+def _booking_history(data_root: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Per-user service counts and home locations from the simulator's booking
+    columns plus every booking in the event log; returns (user keys,
+    counts, locations, log offset replayed up to).
+    """
+    n_services = len(SERVICE_TYPES)
+    counts = np.zeros((0, n_services), dtype=np.int64)
+    locations = np.zeros(0, dtype=np.int8)
+    bookings_dir = os.path.join(data_root, "bookings")
+    if os.path.isdir(bookings_dir):
+        columns = {name: np.load(os.path.join(bookings_dir, f"{name}.npy"), mmap_mode="r")
+                   for name in ("customer_id", "service", "location")}
+        customers_path = os.path.join(data_root, "customers", "location.npy")
+        n_users = int(columns["customer_id"].max()) + 1 if len(columns["customer_id"]) else 0
+        locations = np.full(n_users, -1, dtype=np.int8)
+        if os.path.exists(customers_path):
+            home = np.load(customers_path, mmap_mode="r")
+            locations[:min(n_users, len(home))] = home[:n_users]
+        flat = np.zeros(n_users * n_services, dtype=np.int64)
+        for begin in range(0, len(columns["customer_id"]), settings.retrain_chunk_size):
+            customer = np.asarray(columns["customer_id"][begin:begin + settings.retrain_chunk_size])
+            flat += np.bincount(customer * n_services + columns["service"][begin:begin + len(customer)],
+                                minlength=len(flat))
+            if not os.path.exists(customers_path):
+                locations[customer] = columns["location"][begin:begin + len(customer)]
+        counts = flat.reshape(n_users, n_services)
+
+    # Bookings that arrived through the event log, keyed like the table
+    extra: Dict[int, np.ndarray] = {}
+    extra_locations: Dict[int, int] = {}
+    offset, end = 0, event_log.end_offset
+    while offset < end:
+        records, offset = event_log.read(offset, settings.ingestion_batch_size, {"booking"})
+        for _, event in records:
+            service = SERVICE_INDEX.get(event.get("service"))
+            if event.get("customer_id") is None or service is None:
+                continue
+            key = user_key(str(event["customer_id"]))
+            extra.setdefault(key, np.zeros(n_services, dtype=np.int64))[service] += 1
+            if event.get("location") in LOCATION_INDEX:
+                extra_locations[key] = LOCATION_INDEX[event["location"]]
+
+    keys = np.arange(len(counts), dtype=np.int64)
+    new_keys = sorted(key for key in extra if key >= len(counts))
+    for key, delta in extra.items():
+        if key < len(counts):
+            counts[key] += delta
+            locations[key] = extra_locations.get(key, locations[key])
+    if new_keys:
+        keys = np.concatenate([keys, np.array(new_keys, dtype=np.int64)])
+        counts = np.concatenate([counts, np.array([extra[key] for key in new_keys])])
+        locations = np.concatenate([locations, np.array([extra_locations.get(key, -1) for key in new_keys],
+                                                        dtype=np.int8)])
+    active = counts.sum(axis=1) > 0
+    return keys[active], counts[active], locations[active], end
+
+
+def build_candidates(data_root: Optional[str] = None, root: Optional[str] = None, top_n: Optional[int] = None,
+                     workers: Optional[int] = None) -> dict:
+    """
+    Full build: fit the model on every user's history, score active users
+    in chunks across a process pool and publish the table as a new
+    shared-state generation. Returns timings and table size.
+    """
+    top_n = top_n or settings.candidates_top_n
+    seconds = {}
+    started = time.perf_counter()
+    user_ids, counts, locations, log_offset = _booking_history(data_root or settings.retrain_data_path)
+    seconds["history"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    model = fit_model(counts, locations)
+    chunk = settings.candidates_chunk_users
+    tasks = [(counts[begin:begin + chunk], locations[begin:begin + chunk], model, top_n)
+             for begin in range(0, len(user_ids), chunk)]
+    services = np.zeros((len(user_ids), top_n), dtype=np.int8)
+    scores = np.zeros((len(user_ids), top_n), dtype=np.float16)
+    with ProcessPoolExecutor(max_workers=workers or settings.candidates_workers or None) as pool:
+        for begin, (chunk_services, chunk_scores) in zip(range(0, len(user_ids), chunk), pool.map(_score_chunk, tasks)):
+            services[begin:begin + len(chunk_services)] = chunk_services
+            scores[begin:begin + len(chunk_scores)] = chunk_scores
+    seconds["scoring"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    arrays = {
+        "user_ids": user_ids,
+        "counts": np.minimum(counts, np.iinfo(np.uint16).max).astype(np.uint16),
+        "locations": locations,
+        "services": services,
+        "scores": scores,
+        **model._asdict(),
+    }
+    generation = publish(arrays, root=root or settings.candidates_path,
+                         metadata={"top_n": top_n, "log_offset": log_offset, "users": len(user_ids),
+                                   "built_at": time.time()})
+    seconds["publish"] = time.perf_counter() - started
+    table_bytes = sum(arrays[name].nbytes for name in TABLE_ARRAYS)
+    logger.info(f"Built recommendation candidates for {len(user_ids):,} users "
+                f"({table_bytes / 1e6:.1f} MB) in {sum(seconds.values()):.1f}s")
+    return {"generation": generation, "users": len(user_ids), "top_n": top_n, "log_offset": log_offset,
+            "table_bytes": table_bytes, "seconds": {stage: round(value, 3) for stage, value in seconds.items()}}
+
+
+class Recommendation(NamedTuple):
+    services: List[str]
+    scores: List[float]
+    booked: List[bool]  # whether the user has booked each service before
+    bookings: int  # the user's known bookings across all services
+    source: str  # "table" or "live"
+
+
+class CandidateStore:
+    """
+    Serving side of the candidate table.
+
+    Lookups bisect the memory-mapped, sorted user keys, so a hit costs a
+    binary search and one row read, with the table shared by every worker.
+    Users with bookings newer than the table, users not in it and requests
+    for more than top_n services are scored live from the same model. The
+    event log consumer collects new bookings per user; `refresh()` rescores
+    only those users and publishes the patched table.
+    """
+
+    def __init__(self, root: str):
+        self.reader = SharedStateReader(root=root)
+        self._pending: Dict[int, np.ndarray] = {}
+        self._pending_locations: Dict[int, int] = {}
+        self._log_offset: Optional[int] = None
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+
+    def _state(self, reattach: bool = False):
+        if reattach:
+            self.reader._next_check = 0.0
+        return self.reader.current()
+
+    def start_offset(self) -> int:
+        """Event log position the table plus pending bookings cover; the consumer starts here."""
+        with self._lock:
+            if self._log_offset is None:
+                state = self._state()
+                self._log_offset = state.metadata["log_offset"] if state is not None else event_log.end_offset
+            return self._log_offset
+
+    def _record_locked(self, records: List[Record]):
+        for offset, event in records:
+            service = SERVICE_INDEX.get(event.get("service"))
+            if offset < self._log_offset or event.get("customer_id") is None or service is None:
+                continue
+            key = user_key(str(event["customer_id"]))
+            self._pending.setdefault(key, np.zeros(len(SERVICE_TYPES), dtype=np.int64))[service] += 1
+            if event.get("location") in LOCATION_INDEX:
+                self._pending_locations[key] = LOCATION_INDEX[event["location"]]
+
+    def record(self, records: List[Record], next_offset: int):
+        """Event log consumer: remember what each user booked since the table was built."""
+        self.start_offset()
+        with self._lock:
+            self._record_locked(records)
+            self._log_offset = max(self._log_offset, next_offset)
+
+    def recommend(self, user_id: str, location: Optional[str], n: int) -> Recommendation:
+        key = user_key(user_id)
+        state = self._state()
+        row = None
+        if state is not None:
+            user_ids = state["user_ids"]
+            found = int(np.searchsorted(user_ids, key))
+            row = found if found < len(user_ids) and user_ids[found] == key else None
+        pending = self._pending.get(key)
+        if row is not None and pending is None and n <= state.metadata["top_n"]:
+            services = state["services"][row, :n].tolist()
+            booked = state["counts"][row]
+            return Recommendation([SERVICE_TYPES[s] for s in services], state["scores"][row, :n].astype(float).tolist(),
+                                  [bool(booked[s]) for s in services], int(booked.sum()), "table")
+
+        # Live fallback: cold or unknown users, bookings newer than the table, or more than top_n
+        counts = np.zeros(len(SERVICE_TYPES), dtype=np.int64)
+        home = -1
+        if row is not None:
+            counts += state["counts"][row]
+            home = int(state["locations"][row])
+        if pending is not None:
+            counts += pending
+            home = self._pending_locations.get(key, home)
+        home = LOCATION_INDEX.get(location, home)
+        if state is not None:
+            model = CandidateModel(*(state[name] for name in CandidateModel._fields))
+        else:
+            model = fit_model(np.ones((1, len(SERVICE_TYPES))), np.array([-1]))
+        scores = score_users(counts[None, :], np.array([home]), model)[0]
+        services = np.argsort(-scores, kind="stable")[:n].tolist()
+        return Recommendation([SERVICE_TYPES[s] for s in services], scores[services].tolist(),
+                              [bool(counts[s]) for s in services], int(counts.sum()), "live")
+
+    def refresh(self) -> int:
+        """Rescore users with new bookings and publish the patched table; returns the users refreshed."""
+        if not self._building.acquire(blocking=False):
+            return 0
+        try:
+            state = self._state(reattach=True)
+            with self._lock:
+                if state is None or not self._pending:
+                    return 0
+                pending = {key: delta.copy() for key, delta in self._pending.items()}
+                pending_locations = dict(self._pending_locations)
+                log_offset = self._log_offset
+
+            arrays = {name: np.array(state[name]) for name in state.arrays}
+            keys = np.array(sorted(pending), dtype=np.int64)
+            new_keys = np.setdiff1d(keys, arrays["user_ids"], assume_unique=True)
+            if len(new_keys):
+                # Rows for users the table has not seen, inserted so keys stay sorted
+                at = np.searchsorted(arrays["user_ids"], new_keys)
+                arrays["user_ids"] = np.insert(arrays["user_ids"], at, new_keys)
+                for name, fill in (("counts", 0), ("locations", -1), ("services", 0), ("scores", 0)):
+                    arrays[name] = np.insert(arrays[name], at, fill, axis=0)
+            rows = np.searchsorted(arrays["user_ids"], keys)
+            counts = arrays["counts"][rows].astype(np.int64) + np.array([pending[key] for key in keys.tolist()])
+            arrays["counts"][rows] = np.minimum(counts, np.iinfo(np.uint16).max)
+            arrays["locations"][rows] = [pending_locations.get(key, location) for key, location
+                                         in zip(keys.tolist(), arrays["locations"][rows].tolist())]
+            model = CandidateModel(*(arrays[name] for name in CandidateModel._fields))
+            services, scores = top_services(score_users(counts, arrays["locations"][rows], model),
+                                            state.metadata["top_n"])
+            arrays["services"][rows], arrays["scores"][rows] = services, scores
+            publish(arrays, root=self.reader.root, metadata={**state.metadata, "log_offset": log_offset,
+                                                             "users": len(arrays["user_ids"])})
+            with self._lock:
+                # Bookings recorded while rescoring stay pending for the next refresh
+                for key, delta in pending.items():
+                    remaining = self._pending[key] - delta
+                    if remaining.any():
+                        self._pending[key] = remaining
+                    else:
+                        del self._pending[key]
+                        self._pending_locations.pop(key, None)
+                self._state(reattach=True)
+            return len(keys)
+        finally:
+            self._building.release()
+
+    def rebuild(self, **kwargs) -> dict:
+        """Full build, then re-collect only the bookings logged after the offset it replayed up to."""
+        if not self._building.acquire(blocking=False):
+            raise RuntimeError("A candidate build is already running")
+        try:
+            report = build_candidates(root=self.reader.root, **kwargs)
+            with self._lock:
+                self._pending.clear()
+                self._pending_locations.clear()
+                self._log_offset = report["log_offset"]
+                self._state(reattach=True)
+                end = event_log.end_offset
+                while self._log_offset < end:
+                    records, self._log_offset = event_log.read(self._log_offset, settings.ingestion_batch_size,
+                                                               {"booking"})
+                    self._record_locked(records)
+            return report
+        finally:
+            self._building.release()
+
+    @property
+    def building(self) -> bool:
+        return self._building.locked()
+
+    def status(self) -> dict:
+        state = self._state()
+        status = {"generation": None, "pending_users": len(self._pending), "log_offset": self._log_offset}
+        if state is not None:
+            status.update(generation=state.generation, **state.metadata,
+                          table_bytes=sum(state[name].nbytes for name in TABLE_ARRAYS))
+            status["log_offset"] = self._log_offset if self._log_offset is not None else state.metadata["log_offset"]
+        return status
+
+
+candidate_store = CandidateStore(settings.candidates_path)
+
+
+async def candidates_refresh_loop():
+    """Background job rescoring users with new bookings every candidates_refresh_interval_seconds."""
+    while True:
+        await asyncio.sleep(settings.candidates_refresh_interval_seconds)
+        try:
+            refreshed = await asyncio.to_thread(candidate_store.refresh)
+            if refreshed:
+                logger.info(f"Refreshed recommendation candidates for {refreshed} users")
+        except Exception as e:
+            logger.error(f"Candidate refresh failed: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Precompute per-user recommendation candidates")
+    parser.add_argument("--data", default=None, help="simulator output directory (default: retrain_data_path)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--top-n", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=settings.log_level)
+    print(json.dumps(build_candidates(args.data, top_n=args.top_n, workers=args.workers), indent=2))
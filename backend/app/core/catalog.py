@@ -0,0 +1,21 @@
+# Service catalog: the one source of per-service prices, durations and demand assumptions
+
+# Quoted price (INR) and duration (minutes) before surge, and relative daily demand
+SERVICE_CATALOG = {
+    "House Cleaning": {"base_price": 1200, "base_duration": 120, "base_demand": 15},
+    "Plumbing Repair": {"base_price": 2000, "base_duration": 90, "base_demand": 8},
+    "Electrical Services": {"base_price": 2300, "base_duration": 100, "base_demand": 12},
+    "Interior Painting": {"base_price": 3200, "base_duration": 240, "base_demand": 5},
+    "Lawn Care": {"base_price": 1000, "base_duration": 80, "base_demand": 10},
+    "HVAC Services": {"base_price": 2500, "base_duration": 150, "base_demand": 7},
+    "Security System": {"base_price": 2950, "base_duration": 180, "base_demand": 4},
+    "Custom Furniture": {"base_price": 4000, "base_duration": 300, "base_demand": 3},
+}
+SERVICE_TYPES = list(SERVICE_CATALOG)
+
+BASE_PRICES = {name: service["base_price"] for name, service in SERVICE_CATALOG.items()}
+BASE_DURATIONS = {name: service["base_duration"] for name, service in SERVICE_CATALOG.items()}
+BASE_DEMAND = {name: service["base_demand"] for name, service in SERVICE_CATALOG.items()}
+
+COMPLEXITY_MULTIPLIERS = {"low": 0.8, "medium": 1.0, "high": 1.5}
+WEEKEND_DEMAND_SURGE = 1.3
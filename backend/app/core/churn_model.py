@@ -0,0 +1,264 @@
+# Churn model: training pipeline, versioned artifacts and vectorized serving
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Raw customer columns, in the order the feature matrix is built from them
+RAW_COLUMNS = [
+    "bookings_count",
+    "avg_rating_given",
+    "days_since_last_booking",
+    "total_spent",
+    "complaint_count",
+    "preferred_services_count",
+]
+LABEL_COLUMN = "churned"
+
+FEATURE_NAMES = [
+    "log_bookings",
+    "avg_rating",
+    "log_recency_days",
+    "log_total_spent",
+    "complaints",
+    "preferred_services",
+]
+
+# Human-readable reason shown when a feature pushes churn risk up
+FACTOR_LABELS = {
+    "log_bookings": "Low engagement history",
+    "avg_rating": "Below average satisfaction ratings",
+    "log_recency_days": "Long time since last booking",
+    "log_total_spent": "Low lifetime spend",
+    "complaints": "Previous complaints filed",
+    "preferred_services": "Few preferred services on record",
+}
+
+# Prior used until the first trained artifact is published. The weights mirror
+# the direction and rough size of the original hand-tuned rules.
+DEFAULT_MEAN = np.array([1.95, 4.2, 3.83, 9.21, 0.5, 1.5])
+DEFAULT_SCALE = np.array([0.8, 0.5, 1.0, 1.0, 1.0, 1.5])
+DEFAULT_WEIGHTS = np.array([-0.6, -0.7, 0.9, -0.4, 0.6, -0.1])
+DEFAULT_BIAS = -1.0
+
+# Every HOLDOUT_EVERY-th customer is kept out of training for validation
+HOLDOUT_EVERY = 10
+
+MIN_FACTOR_CONTRIBUTION = 0.1  # in log-odds
+MAX_KEY_FACTORS = 3
+
+
+def build_features(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Turn raw customer columns into the (n, d) model feature matrix."""
+    return np.column_stack([
+        np.log1p(np.maximum(columns["bookings_count"], 0)),
+        columns["avg_rating_given"],
+        np.log1p(np.maximum(columns["days_since_last_booking"], 0)),
+        np.log1p(np.maximum(columns["total_spent"], 0)),
+        np.clip(columns["complaint_count"], 0, 10),
+        columns["preferred_services_count"],
+    ]).astype(np.float64)
+
+
+def top_factors(contributions: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column indices of each row's top_n largest contributions, largest first,
+    and the contributions themselves; both (n, top_n), from one argsort
+    over the whole batch.
+    """
+    idx = np.argsort(-contributions, axis=1, kind="stable")[:, :top_n]
+    return idx, np.take_along_axis(contributions, idx, axis=1)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class ChurnModel:
+    """Standardized L2-regularized logistic regression over FEATURE_NAMES."""
+
+    def __init__(self, weights: np.ndarray, bias: float, mean: np.ndarray,
+                 scale: np.ndarray, version: str = "default", metrics: Optional[dict] = None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.version = version
+        self.metrics = metrics or {}
+
+    @classmethod
+    def default(cls) -> "ChurnModel":
+        return cls(DEFAULT_WEIGHTS, DEFAULT_BIAS, DEFAULT_MEAN, DEFAULT_SCALE)
+
+    def contributions(self, X: np.ndarray) -> np.ndarray:
+        """Per-feature log-odds contributions, shape (n, d)."""
+        return (X - self.mean) / self.scale * self.weights
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Churn probability for every row of X in one matrix-vector product."""
+        return _sigmoid(((X - self.mean) / self.scale) @ self.weights + self.bias)
+
+    def key_factors(self, contributions: np.ndarray, top_n: int = MAX_KEY_FACTORS) -> List[List[str]]:
+        """Labels of the (at most top_n) features pushing each row's churn risk up the most."""
+        idx, values = top_factors(contributions, top_n)
+        labels = [FACTOR_LABELS[name] for name in FEATURE_NAMES]
+        return [[labels[j] for j, value in zip(row_idx, row_values) if value > MIN_FACTOR_CONTRIBUTION]
+                for row_idx, row_values in zip(idx.tolist(), values.tolist())]
+
+    def save(self, storage_path: str) -> str:
+        """Write a versioned artifact and atomically repoint LATEST at it."""
+        model_dir = os.path.join(storage_path, "churn")
+        os.makedirs(model_dir, exist_ok=True)
+        base = os.path.join(model_dir, f"churn-{self.version}")
+        np.savez(base + ".npz", weights=self.weights, bias=np.array(self.bias),
+                 mean=self.mean, scale=self.scale)
+        with open(base + ".json", "w") as f:
+            json.dump({"version": self.version, "features": FEATURE_NAMES, "metrics": self.metrics}, f)
+        tmp = os.path.join(model_dir, "LATEST.tmp")
+        with open(tmp, "w") as f:
+            f.write(self.version)
+        os.replace(tmp, os.path.join(model_dir, "LATEST"))
+        return base + ".npz"
+
+    @classmethod
+    def load_latest(cls, storage_path: str) -> Optional["ChurnModel"]:
+        model_dir = os.path.join(storage_path, "churn")
+        try:
+            with open(os.path.join(model_dir, "LATEST")) as f:
+                version = f.read().strip()
+            base = os.path.join(model_dir, f"churn-{version}")
+            with np.load(base + ".npz") as data:
+                weights, bias = data["weights"], float(data["bias"])
+                mean, scale = data["mean"], data["scale"]
+            with open(base + ".json") as f:
+                metrics = json.load(f).get("metrics", {})
+        except FileNotFoundError:
+            return None
+        return cls(weights, bias, mean, scale, version=version, metrics=metrics)
+
+
+def iter_training_chunks(data_path: str, chunk_size: int,
+                         split: Optional[str] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (features, labels) chunks from a directory of per-column .npy files.
+
+    Columns are memory-mapped so only one chunk is materialized at a time.
+    With split="train" or split="holdout", every HOLDOUT_EVERY-th row is
+    held out, so validation never sees training rows.
+    """
+    columns = {name: np.load(os.path.join(data_path, f"{name}.npy"), mmap_mode="r")
+               for name in RAW_COLUMNS + [LABEL_COLUMN]}
+    n = len(columns[LABEL_COLUMN])
+    for start in range(0, n, chunk_size):
+        chunk = {name: np.asarray(col[start:start + chunk_size]) for name, col in columns.items()}
+        if split is not None:
+            held_out = (np.arange(start, start + len(chunk[LABEL_COLUMN])) % HOLDOUT_EVERY) == 0
+            keep = held_out if split == "holdout" else ~held_out
+            chunk = {name: values[keep] for name, values in chunk.items()}
+        yield build_features(chunk), chunk[LABEL_COLUMN].astype(np.float64)
+
+
+def log_loss(model: "ChurnModel", data_path: str, chunk_size: int = 100_000, split: Optional[str] = None) -> float:
+    """Mean log-loss of `model` over (a split of) the training data."""
+    count, total = 0, 0.0
+    for X, y in iter_training_chunks(data_path, chunk_size, split):
+        p = np.clip(model.predict_proba(X), 1e-7, 1 - 1e-7)
+        total += float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).sum())
+        count += len(y)
+    return total / count if count else float("nan")
+
+
+def train_churn_model(data_path: str, chunk_size: int = 100_000, epochs: int = 3,
+                      l2: float = 1e-4, learning_rate: float = 0.1,
+                      batch_size: int = 4096, split: Optional[str] = None,
+                      initial: Optional[ChurnModel] = None) -> ChurnModel:
+    """
+    Fit the churn model out-of-core.
+
+    A first pass over the chunks collects feature means and variances, then
+    each epoch runs mini-batch gradient descent over every chunk in turn, so
+    memory use is bounded by chunk_size regardless of the number of customers.
+    Passing `initial` warm-starts from an existing model and reuses its
+    standardization, skipping the statistics pass.
+    """
+    d = len(FEATURE_NAMES)
+    if initial is not None:
+        mean, scale = initial.mean, initial.scale
+        weights, bias = initial.weights.copy(), initial.bias
+    else:
+        count, total, total_sq = 0, np.zeros(d), np.zeros(d)
+        for X, _ in iter_training_chunks(data_path, chunk_size, split):
+            count += len(X)
+            total += X.sum(axis=0)
+            total_sq += (X * X).sum(axis=0)
+        if count == 0:
+            raise ValueError(f"No training rows found in {data_path}")
+        mean = total / count
+        scale = np.sqrt(np.maximum(total_sq / count - mean * mean, 1e-12))
+        weights, bias = np.zeros(d), 0.0
+
+    step = 0
+    loss = float("nan")
+    for epoch in range(epochs):
+        loss_sum, count = 0.0, 0
+        for X, y in iter_training_chunks(data_path, chunk_size, split):
+            count += len(y)
+            Z_chunk = (X - mean) / scale
+            for start in range(0, len(y), batch_size):
+                Z, yb = Z_chunk[start:start + batch_size], y[start:start + batch_size]
+                p = _sigmoid(Z @ weights + bias)
+                lr = learning_rate / (1.0 + 1e-4 * step)
+                error = p - yb
+                weights -= lr * (Z.T @ error / len(yb) + l2 * weights)
+                bias -= lr * float(error.mean())
+                step += 1
+                p = np.clip(p, 1e-7, 1 - 1e-7)
+                loss_sum += float(-(yb * np.log(p) + (1 - yb) * np.log(1 - p)).sum())
+        if count == 0:
+            raise ValueError(f"No training rows found in {data_path}")
+        loss = loss_sum / count
+        logger.info(f"Churn training epoch {epoch + 1}/{epochs}: log-loss {loss:.4f}")
+
+    version = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    return ChurnModel(weights, bias, mean, scale, version=version,
+                      metrics={"train_log_loss": loss, "rows": count})
+
+
+_model: Optional[ChurnModel] = None
+_published_stamp: Optional[int] = None
+_next_check = 0.0
+
+
+def _latest_stamp() -> Optional[int]:
+    try:
+        return os.stat(os.path.join(settings.model_storage_path, "churn", "LATEST")).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_churn_model() -> ChurnModel:
+    """
+    Currently served churn model; falls back to the prior if none is published.
+
+    LATEST is re-checked at most every model_reload_interval_seconds, so
+    artifacts published by the retraining worker are picked up without
+    a restart and without blocking requests on training.
+    """
+    global _model, _published_stamp, _next_check
+    now = time.monotonic()
+    if _model is None or now >= _next_check:
+        _next_check = now + settings.model_reload_interval_seconds
+        stamp = _latest_stamp()
+        if _model is None or stamp != _published_stamp:
+            _model = ChurnModel.load_latest(settings.model_storage_path) or _model or ChurnModel.default()
+            _published_stamp = stamp
+    return _model
@@ -0,0 +1,114 @@
+# Request coalescing, short-TTL memoization and idempotency replay
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+
+
+class RequestCoalescer:
+    """
+    Share one computation between identical concurrent requests.
+
+    Requests with the same key join the in-flight computation instead of
+    starting their own; finished results are memoized for `ttl` seconds and,
+    when the client supplies an idempotency key, replayed for retries of the
+    same request. `invalidate()` bumps a generation counter so results
+    computed before an availability change are never served again. The
+    computation runs as its own task, so a requester that disconnects does
+    not cancel it for the others.
+    """
+
+    def __init__(self, ttl: float, idempotency_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.idempotency_ttl = idempotency_ttl
+        self.max_entries = max_entries
+        self.generation = 0
+        self._in_flight: Dict[Tuple[Hashable, int], asyncio.Task] = {}
+        self._results: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._idempotent: "OrderedDict[str, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self.requests = 0
+        self.computations = 0
+        self.joined = 0
+        self.cache_hits = 0
+        self.replays = 0
+
+    def invalidate(self):
+        self.generation += 1
+        self._results.clear()
+
+    @staticmethod
+    def _evict(entries: OrderedDict, max_entries: int):
+        while len(entries) > max_entries:
+            entries.popitem(last=False)
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                  idempotency_key: Optional[str] = None) -> Any:
+        self.requests += 1
+        now = time.monotonic()
+
+        if idempotency_key is not None:
+            replay = self._idempotent.get(idempotency_key)
+            if replay is not None and replay[0] > now and replay[1] == key:
+                self.replays += 1
+                return replay[2]
+
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > now and cached[1] == self.generation:
+            self.cache_hits += 1
+            result = cached[2]
+        else:
+            flight_key = (key, self.generation)
+            task = self._in_flight.get(flight_key)
+            if task is not None:
+                self.joined += 1
+            else:
+                task = self._start(flight_key, compute)
+            # Shielded: a requester that goes away (client disconnect) leaves the computation to the rest
+            result = await asyncio.shield(task)
+
+        if idempotency_key is not None:
+            self._idempotent[idempotency_key] = (now + self.idempotency_ttl, key, result)
+            self._evict(self._idempotent, self.max_entries)
+        return result
+
+    def _start(self, flight_key: Tuple[Hashable, int], compute: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Run the computation as its own task, not tied to the request that started it."""
+        self.computations += 1
+        task = asyncio.ensure_future(self._compute(flight_key, compute))
+        self._in_flight[flight_key] = task
+        # Nobody may be waiting any more; mark a failure as retrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return task
+
+    async def _compute(self, flight_key: Tuple[Hashable, int], compute: Callable[[], Awaitable[Any]]) -> Any:
+        key, generation = flight_key
+        try:
+            result = await compute()
+            if generation == self.generation:
+                self._results[key] = (time.monotonic() + self.ttl, generation, result)
+                self._results.move_to_end(key)
+                self._evict(self._results, self.max_entries)
+            return result
+        finally:
+            del self._in_flight[flight_key]
+
+    def metrics(self) -> dict:
+        return {
+            "requests": self.requests,
+            "computations": self.computations,
+            "joined_in_flight": self.joined,
+            "cache_hits": self.cache_hits,
+            "idempotent_replays": self.replays,
+            "coalescing_ratio": round(self.requests / self.computations, 2) if self.computations else None,
+            "generation": self.generation,
+        }
+
+
+matching_coalescer = RequestCoalescer(
+    ttl=settings.matching_cache_ttl_seconds,
+    idempotency_ttl=settings.matching_idempotency_ttl_seconds,
+    max_entries=settings.matching_cache_max_entries,
+)
@@ -0,0 +1,140 @@
+# Response compression: negotiated gzip or zstd, streamed once a response passes a size threshold
+
+import logging
+import zlib
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:  # zstd is offered only when the zstandard package is installed
+    zstandard = None
+
+# Already compressed or needing per-event delivery
+UNCOMPRESSED_TYPES = (b"text/event-stream", b"application/vnd.apache.parquet", b"image/", b"application/zip")
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Preferred encoding we support from an Accept-Encoding header (zstd over gzip on ties)."""
+    offered = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    candidates = [(offered.get(name, offered.get("*", 0.0)), rank, name)
+                  for rank, name in enumerate(("gzip", "zstd")) if name != "zstd" or zstandard is not None]
+    quality, _, name = max(candidates)
+    return name if quality > 0 else None
+
+
+def _vary(start: dict) -> dict:
+    """Add Accept-Encoding to a response start's Vary header."""
+    headers = list(start.get("headers", []))
+    for i, (name, value) in enumerate(headers):
+        if name == b"vary":
+            if value.strip() == b"*" or b"accept-encoding" in value.lower():
+                return start
+            headers[i] = (name, value + b", Accept-Encoding")
+            break
+    else:
+        headers.append((b"vary", b"Accept-Encoding"))
+    return {**start, "headers": headers}
+
+
+def _compressor(encoding: str, gzip_level: int, zstd_level: int):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=zstd_level).compressobj()
+    return zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses of at least `minimum_size` bytes.
+
+    The body is buffered only until the threshold is reached; from then on
+    every chunk is compressed as it passes through, so streamed responses
+    stay streamed and memory stays bounded. Smaller responses go out
+    unchanged. Every compressible response carries Vary: Accept-Encoding,
+    whether or not it was encoded, so shared caches key on the encoding.
+    A strong ETag gets an encoding suffix, since the compressed bytes are
+    a different representation.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next((value.decode("latin-1") for name, value in scope["headers"]
+                       if name == b"accept-encoding"), "")
+        encoding = negotiate(accept) if accept else None
+
+        start = None
+        buffered = []
+        size = 0
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, size, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                compressible = not (message["status"] < 200 or message["status"] == 204
+                                    or b"content-encoding" in headers
+                                    or content_type.startswith(UNCOMPRESSED_TYPES))
+                if compressible:
+                    message = _vary(message)
+                passthrough = encoding is None or not compressible or message["status"] == 304
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                buffered.append(body)
+                size += len(body)
+                if size < self.minimum_size:
+                    if not more_body:
+                        await send(start)
+                        await send({"type": "http.response.body", "body": b"".join(buffered)})
+                    return
+                compressor = _compressor(encoding, self.gzip_level, self.zstd_level)
+                await send(self._encoded_start(start, encoding))
+                body = b"".join(buffered)
+                buffered.clear()
+            data = compressor.compress(body)
+            if not more_body:
+                data += compressor.flush()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _encoded_start(start: dict, encoding: str) -> dict:
+        headers = []
+        for name, value in start.get("headers", []):
+            if name == b"content-length":
+                continue
+            if name == b"etag" and value.endswith(b'"'):
+                value = value[:-1] + f'-{encoding}"'.encode()
+            headers.append((name, value))
+        headers.append((b"content-encoding", encoding.encode()))
+        return {**start, "headers": headers}
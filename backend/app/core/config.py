@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -41,7 +41,127 @@ class Settings(BaseSettings):
     recommendation_model_threshold: float = 0.7
     prediction_confidence_threshold: float = 0.8
     max_recommendations: int = 5
-    
+
+    # Churn model training
+    churn_training_data_path: str = "./data/churn"
+    churn_training_chunk_size: int = 100_000
+    churn_training_epochs: int = 3
+    churn_l2_penalty: float = 1e-4
+    churn_learning_rate: float = 0.1
+
+    # Background retraining (separate, resource-limited worker process)
+    retrain_enabled: bool = True
+    retrain_data_path: str = "./data/marketplace"
+    retrain_cpu_seconds_limit: int = 3600
+    retrain_memory_limit_mb: int = 4096
+    retrain_niceness: int = 10
+    retrain_chunk_size: int = 1_000_000
+    retrain_holdout_rows: int = 500_000
+    retrain_demand_holdout_days: int = 14
+    retrain_max_regression: float = 0.02
+    model_reload_interval_seconds: float = 5.0
+
+    # Trending services sketches
+    trending_bucket_seconds: int = 3600
+    trending_window_buckets: int = 24
+    trending_baseline_buckets: int = 168
+    trending_sketch_capacity: int = 64
+    trending_decay: float = 0.97
+    trending_max_locations: int = 500
+    trending_cache_seconds: float = 1.0
+    trending_baseline_smoothing: float = 1.0  # add-k pseudo-bookings per service in the baseline
+
+    # Location rollups
+    rollup_storage_path: str = "./data/rollups"
+    rollup_daily_retention_days: int = 120
+    rollup_flush_interval_seconds: int = 300
+
+    # Admission control (priority classes: urgent, normal, analytics, batch)
+    admission_enabled: bool = True
+    admission_max_concurrency: int = 64
+    admission_class_limits: Dict[str, int] = {"urgent": 64, "normal": 48, "analytics": 16, "batch": 8}
+    admission_queue_timeouts_ms: Dict[str, int] = {"urgent": 5000, "normal": 2000, "analytics": 250, "batch": 0}
+    admission_max_queue: Dict[str, int] = {"urgent": 1000, "normal": 500, "analytics": 32, "batch": 0}
+    admission_retry_after_seconds: int = 2
+
+    # Provider matching coalescing
+    matching_cache_ttl_seconds: float = 5.0
+    matching_idempotency_ttl_seconds: float = 300.0
+    matching_cache_max_entries: int = 10_000
+    matching_time_window_minutes: int = 60
+
+    # Real-time metrics streaming
+    metrics_stream_interval_seconds: float = 1.0
+    metrics_stream_client_buffer: int = 16
+
+    # Shared read-only state across workers
+    shared_state_path: str = "./data/shared"
+    shared_state_check_interval_seconds: float = 1.0
+
+    # Geo-sharded provider matching. With no nodes configured this process
+    # searches every cell itself; otherwise nodes[i] owns shard i.
+    matching_shard_nodes: List[str] = []
+    matching_shard_index: int = 0
+    matching_shard_timeout_seconds: float = 0.25
+    matching_cell_degrees: float = 0.05
+    matching_search_radius_km: float = 10.0
+
+    # Dynamic pricing: surge multipliers per zone (matching grid cell) x service x time slot
+    pricing_enabled: bool = True
+    pricing_recompute_interval_seconds: float = 10.0
+    pricing_max_zones: int = 16_384
+    pricing_slot_hours: int = 3
+    pricing_demand_half_life_seconds: float = 300.0
+    pricing_requests_per_provider: float = 2.0
+    pricing_min_supply: float = 1.0
+    pricing_sensitivity: float = 0.5
+    pricing_smoothing: float = 0.5
+    pricing_min_multiplier: float = 0.9
+    pricing_max_multiplier: float = 2.5
+    pricing_step: float = 0.05
+
+    # Location normalization: free-text locations resolve to gazetteer zones
+    location_gazetteer_path: str = "./app/data/gazetteer.tsv"
+    location_cache_size: int = 65_536
+    location_fuzzy_threshold: float = 0.7
+    location_fuzzy_margin: float = 0.1
+
+    # Background jobs (long forecasts, bulk scoring), tracked in the database_url SQLite file
+    jobs_enabled: bool = True
+    jobs_workers: int = 2
+    jobs_max_concurrency: Dict[str, int] = {"demand_forecast": 1, "churn_scoring": 2, "duration_scoring": 2}
+    jobs_results_path: str = "./data/jobs"
+    jobs_poll_interval_seconds: float = 1.0
+    demand_max_inline_horizon_days: int = 90
+
+    # Event log: append-only segments that rollups, trending and pricing tail
+    event_log_path: str = "./data/events"
+    event_log_segment_bytes: int = 64 * 1024 * 1024
+    event_log_fsync_bytes: int = 1024 * 1024
+    event_log_fsync_interval_ms: float = 20.0
+    event_log_index_interval: int = 1024
+    ingestion_batch_size: int = 10_000
+
+    # Recommendation candidates: per-user top-N table rebuilt offline, patched for users with new bookings
+    candidates_path: str = "./data/candidates"
+    candidates_top_n: int = 5
+    candidates_workers: int = 0  # 0 uses every CPU
+    candidates_chunk_users: int = 100_000
+    candidates_refresh_interval_seconds: float = 60.0
+
+    # HTTP responses: ETags from data versions, gzip/zstd above a size threshold
+    etags_enabled: bool = True
+    compression_enabled: bool = True
+    compression_min_bytes: int = 1024
+    compression_gzip_level: int = 6
+    compression_zstd_level: int = 3
+
+    # Request profiling (off by default; switchable at runtime via /api/v1/admin/profiling)
+    profiling_enabled: bool = False
+    profiling_sample_rate: float = 0.01
+    profiling_interval_ms: float = 5.0
+    profiling_output_path: str = "./data/profiles"
+
     class Config:
         env_file = ".env"
         case_sensitive = False
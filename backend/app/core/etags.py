@@ -0,0 +1,100 @@
+# Conditional requests: strong ETags from data-version counters, 304 before the endpoint runs
+
+import hashlib
+import logging
+import time
+from datetime import date
+from typing import Callable
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# In-memory counters restart from zero, so every tag is scoped to this process
+BOOT_ID = f"{time.time_ns():x}"
+
+# Suffixes the compression middleware appends to tags of encoded representations
+ENCODING_SUFFIXES = ("-gzip", "-zstd")
+# If-None-Match answers 304 only on reads; other methods ignore it and run as usual
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def conditional(*sources: Callable[[], object]):
+    """
+    Mark an endpoint as cacheable by ETag. Its tag is derived from the
+    current value of every source (version counters, model versions, the
+    date for endpoints that depend on "today") plus the request method,
+    path, query and body, so it is known before the endpoint runs.
+    """
+    def decorate(handler):
+        handler.etag_sources = sources
+        return handler
+    return decorate
+
+
+def today() -> str:
+    return date.today().isoformat()
+
+
+def compute_etag(sources, method: str, path: str, query: bytes, body: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for part in (BOOT_ID, settings.version, *(str(source()) for source in sources), method, path):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(query)
+    digest.update(b"\0")
+    digest.update(body)
+    return f'"{digest.hexdigest()}"'
+
+
+def matches(if_none_match: str, etag: str) -> bool:
+    """
+    Strong comparison against an If-None-Match list, ignoring our encoding
+    suffixes. "*" is not handled here: it matches only when the endpoint
+    has a representation, which is known after it runs.
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        for suffix in ENCODING_SUFFIXES:
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[:-len(suffix) - 1] + '"'
+        if candidate == etag:
+            return True
+    return False
+
+
+class ConditionalRoute(APIRoute):
+    """
+    Route class honouring @conditional: adds the ETag to 200 responses and
+    answers a GET or HEAD whose If-None-Match lists the tag with 304 before
+    the endpoint runs. "If-None-Match: *" gets a 304 only when the endpoint
+    answers 200. Used as the route_class of routers that have conditional
+    endpoints; other endpoints are left untouched.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        sources = getattr(self.endpoint, "etag_sources", None)
+        if sources is None or not settings.etags_enabled:
+            return handler
+
+        async def conditional_handler(request: Request) -> Response:
+            # The body is cached on the request, so the endpoint reads it again for free
+            body = await request.body() if request.method == "POST" else b""
+            etag = compute_etag(sources, request.method, request.url.path,
+                                request.scope.get("query_string", b""), body)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if_none_match = request.headers.get("if-none-match") if request.method in SAFE_METHODS else None
+            if if_none_match and matches(if_none_match, etag):
+                return Response(status_code=304, headers=headers)
+            response = await handler(request)
+            if response.status_code == 200:
+                if if_none_match and if_none_match.strip() == "*":
+                    return Response(status_code=304, headers=headers)
+                response.headers.update(headers)
+            return response
+
+        return conditional_handler
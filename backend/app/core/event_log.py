@@ -0,0 +1,408 @@
+# Append-only segmented event log: the ingestion backbone for booking, rating, complaint and provider events
+
+import bisect
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("booking", "rating", "complaint", "provider_status")
+
+# Record framing: payload length and CRC-32, then the JSON payload
+HEADER = struct.Struct("<II")
+
+SEGMENT_SUFFIX = ".log"
+OFFSETS_FILE = "offsets.json"
+# flock'ed exclusively by appends and shared by reads, across every process using the log
+LOCK_FILE = "append.lock"
+
+Record = Tuple[int, dict]
+
+
+def _segment_name(base_offset: int) -> str:
+    return f"{base_offset:020d}{SEGMENT_SUFFIX}"
+
+
+def _scan(buffer, position: int, end: int, index_interval: int, count: int = 0) -> Tuple[int, int, List[int]]:
+    """
+    Walk complete, checksummed records in buffer[position:end], the first
+    of which is record number `count` of its segment.
+
+    Returns (records up to the end, end of the last good record, index)
+    where the index holds the position of every index_interval-th record.
+    Stops at the first torn or corrupt record.
+    """
+    index = []
+    while position + HEADER.size <= end:
+        length, crc = HEADER.unpack_from(buffer, position)
+        stop = position + HEADER.size + length
+        if stop > end or zlib.crc32(buffer[position + HEADER.size:stop]) != crc:
+            break
+        if count % index_interval == 0:
+            index.append(position)
+        count += 1
+        position = stop
+    return count, position, index
+
+
+class _Segment:
+    """One log file holding records [base, base + count)."""
+
+    __slots__ = ("path", "base", "count", "size", "index", "map")
+
+    def __init__(self, path: str, base: int):
+        self.path = path
+        self.base = base
+        self.count = 0
+        self.size = 0
+        self.index: Optional[List[int]] = None
+        self.map: Optional[mmap.mmap] = None
+
+    def close_map(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+
+class EventLog:
+    """
+    Local append-only event log split into fixed-size segments.
+
+    Records get consecutive offsets and are never rewritten. Appends go
+    through one buffered file handle; fsync is batched, issued once
+    `fsync_bytes` are pending or by `sync()` from the flush loop, so
+    concurrent writers share one disk flush. Reads memory-map segments and
+    jump to the nearest sparse index entry, so replay from any offset costs
+    a bisect plus a short walk. A torn tail left by a crash is truncated on
+    open. Consumers keep their own positions; `commit_offset` persists them
+    for readers that have no state of their own to checkpoint. A read-only
+    log (backfill workers) never truncates or appends, so it can be opened
+    beside the live writer.
+
+    Every uvicorn worker opens the same log. Appends hold an exclusive
+    flock on the log directory's lock file and reads a shared one; under it
+    each process first takes in the records and segments the others wrote
+    since it last looked, so offsets stay unique and every process sees
+    the same records. Appends are flushed before the lock is released.
+    """
+
+    def __init__(self, path: str, segment_bytes: int, fsync_bytes: int, index_interval: int,
+                 read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.segment_bytes = segment_bytes
+        self.fsync_bytes = fsync_bytes
+        self.index_interval = index_interval
+        self.segments: List[_Segment] = []
+        self._bases: List[int] = []
+        self._file = None
+        self._pending = 0
+        self._durable = 0
+        self._offsets: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+        self._lock_fd: Optional[int] = None
+        self._opened = False
+
+    # Opening and recovery
+
+    def _open(self):
+        if self._opened:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.path, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._flocked(exclusive=not self.read_only):
+            names = sorted(name for name in os.listdir(self.path) if name.endswith(SEGMENT_SUFFIX))
+            for name in names:
+                self.segments.append(_Segment(os.path.join(self.path, name), int(name[:-len(SEGMENT_SUFFIX)])))
+            for segment, following in zip(self.segments, self.segments[1:]):
+                segment.count = following.base - segment.base
+                segment.size = os.path.getsize(segment.path)
+            if not self.segments:
+                self.segments.append(_Segment(os.path.join(self.path, _segment_name(0)), 0))
+            # The active segment is walked from the start, as another process would have appended to it
+            self.segments[-1].index = []
+            self._bases = [segment.base for segment in self.segments]
+            if not self.read_only:
+                self._file = open(self.segments[-1].path, "ab")
+            self._catch_up()
+        self._durable = self._end()
+        self._opened = True
+
+    @contextmanager
+    def _flocked(self, exclusive: bool):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _catch_up(self):
+        """
+        Take in records appended and segments rolled since this process last
+        looked, including by other processes; call under the flock. A torn
+        tail left by a crash is truncated, unless the log is read-only.
+        """
+        while True:
+            active = self.segments[-1]
+            try:
+                size = os.path.getsize(active.path)
+            except FileNotFoundError:
+                size = 0
+            if size > active.size:
+                with open(active.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buffer:
+                    active.count, end, index = _scan(buffer, active.size, size, self.index_interval, active.count)
+                active.index.extend(index)
+                active.size = end
+                if end < size and not self.read_only:
+                    logger.warning(f"Truncating {size - end} bytes of torn records from {active.path}")
+                    with open(active.path, "r+b") as f:
+                        f.truncate(end)
+                        os.fsync(f.fileno())
+            following = os.path.join(self.path, _segment_name(active.base + active.count))
+            if not active.count or not os.path.exists(following):
+                return
+            # Another process rolled the log: this segment is sealed
+            segment = _Segment(following, active.base + active.count)
+            segment.index = []
+            self.segments.append(segment)
+            self._bases.append(segment.base)
+            if self._file is not None:
+                self._file.close()
+                self._file = open(following, "ab")
+
+    @property
+    def start_offset(self) -> int:
+        with self._lock:
+            self._open()
+            return self.segments[0].base
+
+    @property
+    def end_offset(self) -> int:
+        """Offset the next appended record will get."""
+        with self._lock:
+            self._open()
+            with self._flocked(exclusive=False):
+                self._catch_up()
+            return self._end()
+
+    def _end(self) -> int:
+        active = self.segments[-1]
+        return active.base + active.count
+
+    @property
+    def durable_offset(self) -> int:
+        """Records below this offset have been fsynced."""
+        return self._durable
+
+    # Appending
+
+    def append(self, event_type: str, event: dict) -> int:
+        return self.append_many([(event_type, event)])[0]
+
+    def append_many(self, events: Iterable[Tuple[str, dict]]) -> List[int]:
+        """Append events in order and return their offsets; fsyncs once fsync_bytes are pending."""
+        if self.read_only:
+            raise ValueError(f"Event log {self.path} is open read-only")
+        payloads = [json.dumps({"type": event_type, **event}, separators=(",", ":"), default=str).encode()
+                    for event_type, event in events]
+        with self._lock:
+            self._open()
+            with self._flocked(exclusive=True):
+                self._catch_up()
+                active = self.segments[-1]
+                if active.size >= self.segment_bytes:
+                    active = self._roll()
+                first = active.base + active.count
+                frames = []
+                position = active.size
+                for payload in payloads:
+                    if active.count % self.index_interval == 0:
+                        active.index.append(position)
+                    frames.append(HEADER.pack(len(payload), zlib.crc32(payload)))
+                    frames.append(payload)
+                    position += HEADER.size + len(payload)
+                    active.count += 1
+                data = b"".join(frames)
+                self._file.write(data)
+                # Other processes read the file, not this buffer
+                self._file.flush()
+                active.size = position
+                self._pending += len(data)
+                if self._pending >= self.fsync_bytes:
+                    self._sync_locked()
+            return list(range(first, first + len(payloads)))
+
+    def _roll(self) -> _Segment:
+        self._sync_locked()
+        self._file.close()
+        active = self.segments[-1]
+        base = active.base + active.count
+        segment = _Segment(os.path.join(self.path, _segment_name(base)), base)
+        segment.index = []
+        self.segments.append(segment)
+        self._bases.append(segment.base)
+        self._file = open(segment.path, "ab")
+        return segment
+
+    def _sync_locked(self):
+        if self._file is None:
+            return
+        if self._pending:
+            # fsync flushes the file, so records other processes appended before are durable too
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._durable = self._end()
+
+    def sync(self) -> int:
+        """Flush and fsync pending appends; returns the durable offset."""
+        with self._lock:
+            if self._opened:
+                self._sync_locked()
+            return self._durable
+
+    # Reading
+
+    def _segment_for(self, offset: int) -> Optional[_Segment]:
+        slot = bisect.bisect_right(self._bases, offset) - 1
+        return self.segments[slot] if slot >= 0 else None
+
+    def _mapped(self, segment: _Segment):
+        """A read-only map covering everything written to the segment so far."""
+        if segment is self.segments[-1] and self._file is not None:
+            self._file.flush()
+        if segment.map is None or len(segment.map) < segment.size:
+            segment.close_map()
+            with open(segment.path, "rb") as f:
+                segment.map = mmap.mmap(f.fileno(), segment.size, access=mmap.ACCESS_READ)
+        if segment.index is None:
+            _, _, segment.index = _scan(segment.map, 0, segment.size, self.index_interval)
+        return segment.map
+
+    def read(self, offset: int, max_records: int = 1000, types: Optional[Set[str]] = None) -> Tuple[List[Record], int]:
+        """
+        Up to max_records (offset, event) pairs starting at `offset`, and the
+        offset to continue from. Offsets before the start of the log resume
+        at the oldest record; `types` filters without stopping the walk.
+        """
+        records: List[Record] = []
+        with self._lock:
+            self._open()
+            with self._flocked(exclusive=False):
+                self._catch_up()
+            offset = max(offset, self.segments[0].base)
+            while len(records) < max_records and offset < self._end():
+                segment = self._segment_for(offset)
+                if segment.count == 0:
+                    break
+                buffer = self._mapped(segment)
+                relative = offset - segment.base
+                entry = relative // self.index_interval
+                position = segment.index[entry]
+                for _ in range(relative - entry * self.index_interval):
+                    position += HEADER.size + HEADER.unpack_from(buffer, position)[0]
+                while relative < segment.count and len(records) < max_records:
+                    length, crc = HEADER.unpack_from(buffer, position)
+                    payload = buffer[position + HEADER.size:position + HEADER.size + length]
+                    if zlib.crc32(payload) != crc:
+                        raise ValueError(f"Corrupt record at offset {segment.base + relative} in {segment.path}")
+                    event = json.loads(payload)
+                    if types is None or event["type"] in types:
+                        records.append((segment.base + relative, event))
+                    position += HEADER.size + length
+                    relative += 1
+                offset = segment.base + relative
+        return records, offset
+
+    def segment_ranges(self) -> List[Tuple[int, int]]:
+        """[base, end) offsets of every segment, for splitting a replay across workers."""
+        with self._lock:
+            self._open()
+            with self._flocked(exclusive=False):
+                self._catch_up()
+            return [(segment.base, segment.base + segment.count) for segment in self.segments]
+
+    def offset_since(self, timestamp: float) -> int:
+        """First offset of the oldest segment still written to at or after `timestamp`."""
+        with self._lock:
+            self._open()
+            for segment in self.segments:
+                if segment is self.segments[-1] or os.path.getmtime(segment.path) >= timestamp:
+                    return segment.base
+        return self._end()
+
+    # Committed consumer offsets
+
+    def _offsets_path(self) -> str:
+        return os.path.join(self.path, OFFSETS_FILE)
+
+    def committed_offsets(self) -> Dict[str, int]:
+        with self._lock:
+            self._open()
+            if self._offsets is None:
+                try:
+                    with open(self._offsets_path()) as f:
+                        self._offsets = json.load(f)
+                except FileNotFoundError:
+                    self._offsets = {}
+            return dict(self._offsets)
+
+    def committed_offset(self, consumer: str) -> Optional[int]:
+        return self.committed_offsets().get(consumer)
+
+    def commit_offset(self, consumer: str, offset: int):
+        offsets = self.committed_offsets()
+        offsets[consumer] = offset
+        with self._lock:
+            tmp = self._offsets_path() + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(offsets, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self._offsets_path())
+            self._offsets = offsets
+
+    def status(self) -> dict:
+        with self._lock:
+            self._open()
+            with self._flocked(exclusive=False):
+                self._catch_up()
+            return {
+                "path": self.path,
+                "start_offset": self.segments[0].base,
+                "end_offset": self._end(),
+                "durable_offset": self._durable,
+                "segments": len(self.segments),
+                "bytes": sum(segment.size for segment in self.segments),
+            }
+
+    def close(self):
+        with self._lock:
+            if not self._opened:
+                return
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+            for segment in self.segments:
+                segment.close_map()
+            os.close(self._lock_fd)
+            self.segments, self._bases, self._file, self._offsets, self._lock_fd = [], [], None, None, None
+            self._opened = False
+
+
+event_log = EventLog(
+    path=settings.event_log_path,
+    segment_bytes=settings.event_log_segment_bytes,
+    fsync_bytes=settings.event_log_fsync_bytes,
+    index_interval=settings.event_log_index_interval,
+)
@@ -0,0 +1,102 @@
+# Columnar exports: stream column batches as Arrow IPC or Parquet
+
+import io
+import logging
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class Categorical(NamedTuple):
+    """A low-cardinality string column as integer codes into a list of names (an Arrow dictionary)."""
+    codes: np.ndarray
+    names: Sequence[str]
+
+
+Column = Union[np.ndarray, Categorical]
+Batch = Dict[str, Column]
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise RuntimeError("Arrow and Parquet exports require pyarrow") from e
+    return pa
+
+
+def project(requested: Optional[str], available: Sequence[str]) -> List[str]:
+    """Columns named in a comma-separated projection, in the order given; all columns when empty."""
+    if not requested:
+        return list(available)
+    columns = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in columns if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}; available: {', '.join(available)}")
+    return columns
+
+
+def _record_batch(pa, batch: Batch):
+    arrays = []
+    for column in batch.values():
+        if isinstance(column, Categorical):
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(column.codes, type=pa.int32()), pa.array(list(column.names), type=pa.string())))
+        else:
+            # NaN in float columns becomes null, like None in the JSON responses
+            arrays.append(pa.array(column, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, names=list(batch))
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def stream_batches(batches: Iterator[Batch], fmt: str) -> Iterator[bytes]:
+    """
+    Encode column batches as an Arrow IPC stream or a Parquet file, yielding
+    bytes as each batch is written (one Parquet row group per batch). The
+    first batch fixes the schema, so producers yield at least one, possibly
+    empty, batch.
+    """
+    pa = _pyarrow()
+    sink = io.BytesIO()
+    writer = None
+    try:
+        for batch in batches:
+            record_batch = _record_batch(pa, batch)
+            if writer is None:
+                if fmt == "parquet":
+                    import pyarrow.parquet as pq
+                    writer = pq.ParquetWriter(sink, record_batch.schema, compression="zstd")
+                else:
+                    writer = pa.ipc.new_stream(sink, record_batch.schema)
+            if fmt == "parquet":
+                writer.write_table(pa.Table.from_batches([record_batch]))
+            else:
+                writer.write_batch(record_batch)
+            yield _drain(sink)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield _drain(sink)
+
+
+def export_response(batches: Iterator[Batch], fmt: str, name: str):
+    """StreamingResponse for an export; raises RuntimeError when pyarrow is missing."""
+    from fastapi.responses import StreamingResponse
+
+    _pyarrow()
+    media_type, extension = FORMATS[fmt]
+    return StreamingResponse(stream_batches(batches, fmt), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'})
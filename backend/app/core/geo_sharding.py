@@ -0,0 +1,187 @@
+# Geo-sharded provider index and scatter-gather routing for provider matching
+
+import asyncio
+import logging
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.catalog import SERVICE_TYPES
+from app.core.config import settings
+from app.core.shared_state import SharedState
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+SERVICE_BITS = {name: 1 << i for i, name in enumerate(SERVICE_TYPES)}
+
+# Shared state arrays the index is built from
+PROVIDER_COLUMNS = ("provider_id", "provider_name", "provider_lat", "provider_lon", "provider_rating",
+                    "provider_experience", "provider_services", "provider_price")
+
+Cell = Tuple[int, int]
+
+
+def cell_of(lat: float, lon: float, cell_deg: float) -> Cell:
+    return (math.floor(lat / cell_deg), math.floor(lon / cell_deg))
+
+
+def cells_covering(lat: float, lon: float, radius_km: float, cell_deg: float) -> List[Cell]:
+    """All grid cells intersecting the bounding box of the search circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    lat_lo, lon_lo = cell_of(lat - dlat, lon - dlon, cell_deg)
+    lat_hi, lon_hi = cell_of(lat + dlat, lon + dlon, cell_deg)
+    return [(i, j) for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)]
+
+
+def shard_for_cell(cell: Cell, n_shards: int) -> int:
+    """Stable cell -> shard assignment (independent of Python's hash seed)."""
+    return ((cell[0] * 73856093) ^ (cell[1] * 19349663)) % n_shards
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class ProviderIndex:
+    """
+    Providers of the cells owned by one shard, grouped by grid cell.
+
+    Columns stay as (possibly memory-mapped) arrays; each cell keeps the row
+    numbers of its providers so a search only touches the covered cells.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], cell_deg: float,
+                 shard_index: int = 0, shard_count: int = 1):
+        self.columns = columns
+        self.cell_deg = cell_deg
+        lat_cells = np.floor(np.asarray(columns["provider_lat"]) / cell_deg).astype(np.int64)
+        lon_cells = np.floor(np.asarray(columns["provider_lon"]) / cell_deg).astype(np.int64)
+        owned = ((lat_cells * 73856093) ^ (lon_cells * 19349663)) % shard_count == shard_index
+        rows = np.flatnonzero(owned)
+        keys = lat_cells[rows] * (1 << 32) + (lon_cells[rows] & 0xFFFFFFFF)
+        order = np.argsort(keys, kind="stable")
+        rows, keys = rows[order], keys[order]
+        boundaries = np.flatnonzero(np.diff(keys)) + 1
+        self.cells: Dict[Cell, np.ndarray] = {}
+        for group in np.split(rows, boundaries) if len(rows) else []:
+            row = group[0]
+            self.cells[(int(lat_cells[row]), int(lon_cells[row]))] = group
+        self.size = len(rows)
+
+    @classmethod
+    def from_shared_state(cls, state: Optional[SharedState], cell_deg: float,
+                          shard_index: int = 0, shard_count: int = 1) -> Optional["ProviderIndex"]:
+        if state is None or not all(name in state for name in PROVIDER_COLUMNS):
+            return None
+        return cls({name: state[name] for name in PROVIDER_COLUMNS}, cell_deg, shard_index, shard_count)
+
+    def search(self, lat: float, lon: float, radius_km: float, service_type: str, k: int,
+               cells: Optional[Iterable[Cell]] = None, min_price: Optional[float] = None,
+               max_price: Optional[float] = None) -> List[dict]:
+        """
+        Top-k providers offering `service_type` within `radius_km`, best match first.
+
+        `min_price`/`max_price` bound the provider's base price and are applied
+        before distances are computed.
+        """
+        cells = cells if cells is not None else cells_covering(lat, lon, radius_km, self.cell_deg)
+        groups = [self.cells[cell] for cell in map(tuple, cells) if cell in self.cells]
+        if not groups:
+            return []
+        rows = np.concatenate(groups)
+        c = self.columns
+        service_bit = SERVICE_BITS.get(service_type, 0)
+        if service_bit:
+            rows = rows[(np.asarray(c["provider_services"][rows]) & service_bit) != 0]
+        if min_price is not None or max_price is not None:
+            price = np.asarray(c["provider_price"][rows])
+            rows = rows[(price >= (min_price or 0)) & (price <= (max_price if max_price is not None else np.inf))]
+        distance = haversine_km(lat, lon, c["provider_lat"][rows], c["provider_lon"][rows])
+        within = distance <= radius_km
+        rows, distance = rows[within], distance[within]
+        if not len(rows):
+            return []
+        rating = np.asarray(c["provider_rating"][rows], dtype=np.float64)
+        experience = np.asarray(c["provider_experience"][rows], dtype=np.float64)
+        score = 0.5 * rating / 5.0 + 0.3 * (1.0 - distance / radius_km) + 0.2 * np.minimum(experience, 15) / 15
+        top = np.argsort(-score)[:k] if len(score) > k else np.argsort(-score)
+        return [
+            {
+                "provider_id": str(c["provider_id"][rows[i]]),
+                "name": str(c["provider_name"][rows[i]]),
+                "rating": round(float(rating[i]), 1),
+                "experience_years": int(experience[i]),
+                "distance_km": round(float(distance[i]), 1),
+                "price_estimate": int(c["provider_price"][rows[i]]),
+                "match_score": round(float(score[i]), 3),
+            }
+            for i in top
+        ]
+
+
+class ShardRouter:
+    """
+    Scatter a search to the shards owning the covered cells and merge top-k.
+
+    Only shards that own at least one covered cell are contacted. Each shard
+    call has its own timeout; shards that time out or fail are reported so
+    the caller can flag the response as partial.
+    """
+
+    def __init__(self, nodes: Sequence[str], timeout: float, local_index: Optional[ProviderIndex] = None,
+                 local_shard: Optional[int] = None):
+        self.nodes = list(nodes)
+        self.timeout = timeout
+        self.local_index = local_index
+        self.local_shard = local_shard
+        self._client = None
+
+    def _http(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def _query_shard(self, shard: int, cells: List[Cell], payload: dict) -> List[dict]:
+        if shard == self.local_shard and self.local_index is not None:
+            return self.local_index.search(payload["latitude"], payload["longitude"], payload["radius_km"],
+                                           payload["service_type"], payload["k"], cells=cells,
+                                           min_price=payload.get("min_price"), max_price=payload.get("max_price"))
+        response = await self._http().post(f"{self.nodes[shard]}/api/v1/matching/shard/search",
+                                           json={**payload, "cells": cells})
+        response.raise_for_status()
+        return response.json()
+
+    async def search(self, lat: float, lon: float, radius_km: float, service_type: str, k: int,
+                     min_price: Optional[float] = None,
+                     max_price: Optional[float] = None) -> Tuple[List[dict], List[int]]:
+        """Merged top-k matches and the list of shards that did not answer in time."""
+        cell_deg = settings.matching_cell_degrees
+        by_shard: Dict[int, List[Cell]] = {}
+        for cell in cells_covering(lat, lon, radius_km, cell_deg):
+            by_shard.setdefault(shard_for_cell(cell, len(self.nodes)), []).append(cell)
+        payload = {"latitude": lat, "longitude": lon, "radius_km": radius_km,
+                   "service_type": service_type, "k": k, "min_price": min_price, "max_price": max_price}
+        shards = list(by_shard)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self._query_shard(shard, by_shard[shard], payload), self.timeout)
+              for shard in shards),
+            return_exceptions=True,
+        )
+        merged, failed = [], []
+        for shard, result in zip(shards, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Shard {shard} failed or timed out: {result!r}")
+                failed.append(shard)
+            else:
+                merged.extend(result)
+        merged.sort(key=lambda match: match["match_score"], reverse=True)
+        return merged[:k], failed
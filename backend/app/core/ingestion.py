@@ -0,0 +1,166 @@
+# Event ingestion: append to the event log, then let rollups, trend sketches, pricing and candidates tail it
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.candidates import candidate_store
+from app.core.config import settings
+from app.core.event_log import EventLog, Record, event_log
+from app.core.pricing import pricing_engine
+from app.core.rollups import EVENT_TYPES as ROLLUP_EVENT_TYPES, get_rollup_store, rollup_items
+from app.core.trending import trend_tracker
+
+logger = logging.getLogger(__name__)
+
+# Fields an event must carry for its type to be useful downstream
+REQUIRED_FIELDS = {
+    "booking": ("service",),
+    "rating": ("service", "rating"),
+    "complaint": ("customer_id",),
+    "provider_status": ("provider_id", "status"),
+}
+
+
+class LogConsumer:
+    """
+    An in-process reader tailing the event log from its own position.
+
+    `start()` gives the first offset on the first poll; after that the
+    consumer advances by whatever it has applied. `handle(records,
+    next_offset)` applies one batch; consumers that persist state store
+    next_offset with it, so a restart resumes exactly after the last batch
+    they saved.
+    """
+
+    def __init__(self, name: str, handle: Callable[[List[Record], int], None], start: Callable[[], int],
+                 types: Optional[Set[str]] = None):
+        self.name = name
+        self.handle = handle
+        self.start = start
+        self.types = types
+        self.position: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def poll(self, log: EventLog, max_records: int) -> int:
+        """Apply the next batch; returns the number of offsets consumed."""
+        with self._lock:
+            if self.position is None:
+                self.position = self.start()
+            records, next_offset = log.read(self.position, max_records, self.types)
+            if next_offset > self.position:
+                self.handle(records, next_offset)
+            consumed, self.position = next_offset - self.position, next_offset
+            return consumed
+
+
+def _when(event: dict) -> datetime:
+    return datetime.fromisoformat(event["timestamp"])
+
+
+def _apply_to_rollups(records: List[Record], next_offset: int):
+    get_rollup_store().record_batch(rollup_items(records), next_offset)
+
+
+def _apply_to_trends(records: List[Record], next_offset: int):
+    trend_tracker.record_many((event["service"], event.get("location"), _when(event).timestamp())
+                              for _, event in records)
+
+
+def _apply_to_pricing(records: List[Record], next_offset: int):
+    for _, event in records:
+        pricing_engine.set_provider_online(event["provider_id"], event["status"] != "unavailable")
+
+
+def _trend_start() -> int:
+    # Sketches live in memory: rebuild them from segments covering the trend and baseline windows
+    horizon = (settings.trending_window_buckets + settings.trending_baseline_buckets) * settings.trending_bucket_seconds
+    return event_log.offset_since(time.time() - horizon)
+
+
+consumers: Dict[str, LogConsumer] = {
+    "rollups": LogConsumer("rollups", _apply_to_rollups, lambda: get_rollup_store().log_offset,
+                           types=ROLLUP_EVENT_TYPES),
+    "trending": LogConsumer("trending", _apply_to_trends, _trend_start, types={"booking"}),
+    "pricing": LogConsumer("pricing", _apply_to_pricing, lambda: event_log.start_offset,
+                           types={"provider_status"}),
+    "candidates": LogConsumer("candidates", candidate_store.record, candidate_store.start_offset,
+                              types={"booking"}),
+}
+
+
+def consume_pending() -> int:
+    """Bring every consumer up to the end of the log; returns the offsets consumed."""
+    total = 0
+    for consumer in consumers.values():
+        try:
+            while True:
+                consumed = consumer.poll(event_log, settings.ingestion_batch_size)
+                total += consumed
+                if not consumed:
+                    break
+        except Exception as e:
+            logger.error(f"Event consumer {consumer.name} failed at offset {consumer.position}: {e}")
+    return total
+
+
+def consumer_status() -> dict:
+    end = event_log.end_offset
+    committed = event_log.committed_offsets()
+    status = {name: {"position": consumer.position,
+                     "lag": None if consumer.position is None else end - consumer.position}
+              for name, consumer in consumers.items()}
+    for name, offset in committed.items():
+        status.setdefault(name, {"position": offset, "lag": end - offset})
+    return status
+
+
+# Set after each fsync by the ingestion loop; None when the loop is not running
+_sync_round: Optional[asyncio.Event] = None
+
+
+async def wait_durable(offset: int):
+    """Wait until `offset` is fsynced, sharing the ingestion loop's next fsync with concurrent writers."""
+    while event_log.durable_offset <= offset:
+        if _sync_round is None:
+            await asyncio.to_thread(event_log.sync)
+            return
+        await _sync_round.wait()
+
+
+async def ingest(events: List[Tuple[str, dict]]) -> List[int]:
+    """
+    Append events and return their offsets once they are durable and the
+    in-process consumers have applied them, so callers read their writes.
+    """
+    # Appends may roll a segment or fsync; keep that disk work off the event loop
+    offsets = await asyncio.to_thread(event_log.append_many, events)
+    if offsets:
+        await wait_durable(offsets[-1])
+        await asyncio.to_thread(consume_pending)
+    return offsets
+
+
+async def ingestion_loop():
+    """Background job: batched fsync every event_log_fsync_interval_ms, then consumers catch up."""
+    global _sync_round
+    _sync_round = asyncio.Event()
+    # Resolve positions afresh: rollups may have been reloaded from disk since the last run
+    for consumer in consumers.values():
+        consumer.position = None
+    try:
+        while True:
+            await asyncio.sleep(settings.event_log_fsync_interval_ms / 1000)
+            try:
+                await asyncio.to_thread(event_log.sync)
+                synced, _sync_round = _sync_round, asyncio.Event()
+                synced.set()
+                await asyncio.to_thread(consume_pending)
+            except Exception as e:
+                logger.error(f"Event log sync failed: {e}")
+    finally:
+        synced, _sync_round = _sync_round, None
+        synced.set()
@@ -0,0 +1,273 @@
+# Background jobs: long forecasts and bulk scoring, persisted in SQLite with chunked result files
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Type
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    total_items INTEGER NOT NULL,
+    done_items INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+
+class JobType(NamedTuple):
+    """
+    A kind of job. `count(params)` is the number of items the job produces
+    and `run_chunk(params, start, stop)` returns items [start, stop) as a
+    JSON array; chunks are independent, so a job resumes from its last
+    completed chunk.
+    """
+    params_model: Type[BaseModel]
+    count: Callable[[BaseModel], int]
+    run_chunk: Callable[[BaseModel, int, int], bytes]
+    chunk_size: int
+
+
+job_types: Dict[str, JobType] = {}
+
+
+def register_job_type(name: str, params_model: Type[BaseModel], count: Callable[[BaseModel], int],
+                      run_chunk: Callable[[BaseModel, int, int], bytes], chunk_size: int):
+    job_types[name] = JobType(params_model, count, run_chunk, chunk_size)
+
+
+def sqlite_path(database_url: str) -> str:
+    """File path of a sqlite:/// database URL."""
+    if not database_url.startswith("sqlite:///"):
+        raise ValueError(f"Jobs need a SQLite database_url, got {database_url}")
+    return database_url[len("sqlite:///"):]
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.utcfromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+
+class JobQueue:
+    """
+    Jobs persisted in SQLite and run by a pool of worker threads.
+
+    Every job row carries its progress; each finished chunk is written to
+    its own result file before the row is advanced, so after a restart
+    running jobs go back to the queue and continue from the first missing
+    chunk. At most `max_concurrency[job_type]` jobs of a type run at once.
+    """
+
+    def __init__(self, db_path: str, results_path: str, workers: int,
+                 max_concurrency: Dict[str, int], poll_interval: float):
+        self.db_path = db_path
+        self.results_path = results_path
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_types: Dict[str, str] = {}
+        self._cancelled: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def _execute(self, sql: str, args: tuple = ()) -> List[sqlite3.Row]:
+        with self._db_lock:
+            return self._connection().execute(sql, args).fetchall()
+
+    def _row(self, job_id: str) -> Optional[sqlite3.Row]:
+        rows = self._execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def _view(self, row: sqlite3.Row) -> dict:
+        total, done = row["total_items"], row["done_items"]
+        return {
+            "job_id": row["job_id"], "job_type": row["job_type"], "status": row["status"],
+            "progress": round(done / total, 4) if total else 1.0,
+            "total_items": total, "done_items": done, "chunks": row["chunks"], "error": row["error"],
+            "created_at": _iso(row["created_at"]), "started_at": _iso(row["started_at"]),
+            "finished_at": _iso(row["finished_at"]),
+        }
+
+    def submit(self, job_type: str, params: dict) -> dict:
+        """Validate and enqueue a job; raises KeyError for unknown types and ValidationError for bad params."""
+        kind = job_types[job_type]
+        parsed = kind.params_model.model_validate(params)
+        job_id = uuid.uuid4().hex
+        self._execute("INSERT INTO jobs (job_id, job_type, status, params, total_items, created_at) "
+                      "VALUES (?, ?, ?, ?, ?, ?)",
+                      (job_id, job_type, QUEUED, parsed.model_dump_json(), kind.count(parsed), time.time()))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._row(job_id)
+        return self._view(row) if row is not None else None
+
+    def list(self, status: Optional[str] = None, job_type: Optional[str] = None, limit: int = 100) -> List[dict]:
+        clauses, args = [], []
+        if status:
+            clauses.append("status = ?")
+            args.append(status)
+        if job_type:
+            clauses.append("job_type = ?")
+            args.append(job_type)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._execute(f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*args, limit))
+        return [self._view(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued or running job; a running job stops after its current chunk."""
+        self._execute("UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status IN (?, ?)",
+                      (CANCELLED, time.time(), job_id, QUEUED, RUNNING))
+        if job_id in self._running:
+            self._cancelled.add(job_id)
+        return self.get(job_id)
+
+    def chunk_path(self, job_id: str, chunk: int) -> str:
+        return os.path.join(self.results_path, job_id, f"chunk-{chunk:05d}.json")
+
+    def iter_chunks(self, job_id: str, start: int = 0) -> Iterator[bytes]:
+        """Result chunks written so far, in order."""
+        chunk = start
+        while os.path.exists(self.chunk_path(job_id, chunk)):
+            with open(self.chunk_path(job_id, chunk), "rb") as f:
+                yield f.read()
+            chunk += 1
+
+    def recover(self):
+        """Requeue jobs that were running when the process stopped."""
+        self._execute("UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING))
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Mark the oldest runnable queued job as running, respecting per-type limits."""
+        active: Dict[str, int] = {}
+        for job_type in self._running_types.values():
+            active[job_type] = active.get(job_type, 0) + 1
+        full = [name for name in job_types if active.get(name, 0) >= self.max_concurrency.get(name, 1)]
+        rows = self._execute(
+            f"SELECT * FROM jobs WHERE status = ? AND job_type NOT IN ({','.join('?' * len(full))}) "
+            "ORDER BY created_at LIMIT 1", (QUEUED, *full))
+        if not rows:
+            return None
+        self._execute("UPDATE jobs SET status = ?, started_at = COALESCE(started_at, ?) WHERE job_id = ?",
+                      (RUNNING, time.time(), rows[0]["job_id"]))
+        return rows[0]
+
+    def _write_chunk(self, job_id: str, chunk: int, body: bytes):
+        path = self.chunk_path(job_id, chunk)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+    async def _run_job(self, row: sqlite3.Row):
+        job_id = row["job_id"]
+        kind = job_types.get(row["job_type"])
+        loop = asyncio.get_running_loop()
+        try:
+            if kind is None:
+                raise ValueError(f"Unknown job type {row['job_type']}")
+            params = kind.params_model.model_validate_json(row["params"])
+            total, chunk = row["total_items"], row["chunks"]
+            for start in range(chunk * kind.chunk_size, total, kind.chunk_size):
+                if job_id in self._cancelled:
+                    return
+                stop = min(start + kind.chunk_size, total)
+                body = await loop.run_in_executor(self._executor, kind.run_chunk, params, start, stop)
+                await loop.run_in_executor(self._executor, self._write_chunk, job_id, chunk, body)
+                chunk += 1
+                self._execute("UPDATE jobs SET done_items = ?, chunks = ? WHERE job_id = ? AND status = ?",
+                              (stop, chunk, job_id, RUNNING))
+            self._execute("UPDATE jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status = ?",
+                          (SUCCEEDED, time.time(), job_id, RUNNING))
+        except asyncio.CancelledError:
+            # Shutting down: leave the job running in the table so recover() requeues it
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self._execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                          (FAILED, str(e), time.time(), job_id))
+        finally:
+            self._running.pop(job_id, None)
+            self._running_types.pop(job_id, None)
+            self._cancelled.discard(job_id)
+            self._wakeup.set()
+
+    async def run(self):
+        """Dispatch queued jobs to the worker pool until cancelled."""
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self.recover()
+        try:
+            while True:
+                while len(self._running) < self.workers:
+                    row = self._claim()
+                    if row is None:
+                        break
+                    self._running[row["job_id"]] = asyncio.create_task(self._run_job(row))
+                    self._running_types[row["job_id"]] = row["job_type"]
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            tasks = list(self._running.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._executor.shutdown(wait=True)
+
+    def status(self) -> dict:
+        counts = {row["status"]: row["n"] for row in
+                  self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+        return {"workers": self.workers, "running": len(self._running), "jobs": counts,
+                "job_types": {name: {"chunk_size": kind.chunk_size,
+                                     "max_concurrency": self.max_concurrency.get(name, 1)}
+                              for name, kind in job_types.items()}}
+
+
+job_queue = JobQueue(
+    db_path=sqlite_path(settings.database_url),
+    results_path=settings.jobs_results_path,
+    workers=settings.jobs_workers,
+    max_concurrency=settings.jobs_max_concurrency,
+    poll_interval=settings.jobs_poll_interval_seconds,
+)
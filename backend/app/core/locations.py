@@ -0,0 +1,195 @@
+# Free-text location normalization: gazetteer trie plus character n-gram fuzzy matching
+
+import logging
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Abbreviations expanded token by token before matching
+ABBREVIATIONS = {"gr": "greater", "grt": "greater", "sec": "sector", "sect": "sector", "ext": "extension",
+                 "extn": "extension", "nr": "near", "opp": "opposite", "rd": "road"}
+
+_END = ""  # key marking the end of an alias in the trie
+MIN_FUZZY_LENGTH = 4  # shorter inputs ("goa") are too ambiguous to fuzzy-match
+# Zone id of places outside the service area ("!" rows in the gazetteer): they never resolve,
+# and an input naming one is not claimed by a served zone it also mentions
+OUTSIDE = "!"
+
+
+class Zone(NamedTuple):
+    zone_id: str
+    name: str
+    latitude: float
+    longitude: float
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace and expand abbreviations."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    tokens = re.sub(r"[^a-z0-9]+", " ", text).split()
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def _numbers(text: str) -> List[str]:
+    return re.findall(r"\d+", text)
+
+
+def _ngrams(text: str, n: int = 2) -> List[str]:
+    padded = f" {text} "
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+class LocationIndex:
+    """
+    Maps free-text locations to canonical gazetteer zones.
+
+    Resolution first looks for aliases starting at any word of the input
+    via a character trie, so "flat 4, sector 62 noida" finds "noida";
+    aliases inside a longer one are ignored, and the input stays
+    unresolved when the rest name more than one zone or a place outside
+    the service area. Only when no alias occurs
+    at all is the whole input compared by character bigram similarity
+    against every alias (a typo such as "gaziabaad"); the best zone must
+    score above `threshold`, beat every other zone by `margin` and carry
+    the same numbers as its alias. Results, including misses, are kept in
+    an LRU cache keyed by the raw string.
+    """
+
+    def __init__(self, zones: Iterable[Zone], aliases: Dict[str, str], threshold: float, margin: float,
+                 cache_size: int):
+        self.zones = {zone.zone_id: zone for zone in zones}
+        self.threshold = threshold
+        self.margin = margin
+        self._trie: dict = {}
+        self._aliases: List[str] = []
+        self._alias_zone: List[str] = []
+        self._grams: Dict[str, List[int]] = {}
+        normalized = {normalize(alias): zone_id for alias, zone_id in aliases.items()}
+        for alias, zone_id in normalized.items():
+            self._add(alias, zone_id)
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _add(self, alias: str, zone_id: str):
+        if not alias:
+            return
+        node = self._trie
+        for char in alias:
+            node = node.setdefault(char, {})
+        node[_END] = zone_id
+        alias_id = len(self._aliases)
+        self._aliases.append(alias)
+        self._alias_zone.append(zone_id)
+        for gram in set(_ngrams(alias)):
+            self._grams.setdefault(gram, []).append(alias_id)
+
+    @classmethod
+    def from_file(cls, path: str, threshold: float, margin: float, cache_size: int) -> "LocationIndex":
+        """
+        Load a gazetteer TSV: zone_id, name, latitude, longitude, |-separated
+        aliases. A row whose first field is "!" lists, in its second field,
+        places outside the service area.
+        """
+        zones, aliases = [], {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if fields[0] == OUTSIDE:
+                    aliases.update({alias: OUTSIDE for alias in fields[1].split("|")})
+                    continue
+                zone = Zone(fields[0], fields[1], float(fields[2]), float(fields[3]))
+                zones.append(zone)
+                for alias in [zone.zone_id.replace("_", " "), zone.name] + (fields[4].split("|") if len(fields) > 4 else []):
+                    aliases[alias] = zone.zone_id
+        logger.info(f"Loaded {len(zones)} zones and {len(aliases)} aliases from {path}")
+        return cls(zones, aliases, threshold, margin, cache_size)
+
+    def _longest_alias_from(self, text: str, start: int) -> Optional[tuple]:
+        node, best = self._trie, None
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if _END in node and (i + 1 == len(text) or text[i + 1] == " "):
+                best = (i + 1 - start, node[_END])
+        return best
+
+    def _alias_match(self, text: str) -> Optional[str]:
+        spans = []
+        for start in [0] + [m.end() for m in re.finditer(" ", text)]:
+            match = self._longest_alias_from(text, start)
+            if match is not None:
+                spans.append((start, start + match[0], match[1]))
+        # Aliases inside a longer one ("noida" in "greater noida") don't count on their own
+        zone_ids = {zone_id for start, end, zone_id in spans
+                    if not any(s <= start and end <= e and (s, e) != (start, end) for s, e, _ in spans)}
+        if not zone_ids:
+            return None
+        return zone_ids.pop() if len(zone_ids) == 1 else OUTSIDE
+
+    def _fuzzy(self, text: str) -> Optional[str]:
+        if len(text) < MIN_FUZZY_LENGTH:
+            return None
+        grams = set(_ngrams(text))
+        numbers = _numbers(text)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self._grams.get(gram, ()))
+        # Best Dice coefficient over character bigram sets, per zone
+        scores: Dict[str, float] = {}
+        for alias_id, shared in overlap.items():
+            alias = self._aliases[alias_id]
+            if _numbers(alias) != numbers:
+                # Numbers name sectors and blocks; they are not typos of each other
+                continue
+            score = 2 * shared / (len(grams) + len(set(_ngrams(alias))))
+            zone_id = self._alias_zone[alias_id]
+            scores[zone_id] = max(score, scores.get(zone_id, 0.0))
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] < self.threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.margin:
+            return None
+        return ranked[0][0]
+
+    def _resolve(self, text: str) -> Optional[Zone]:
+        key = normalize(text or "")
+        if not key:
+            return None
+        zone_id = self._alias_match(key)
+        if zone_id is None:
+            zone_id = self._fuzzy(key)
+        return self.zones.get(zone_id) if zone_id is not None else None
+
+    def canonical(self, text: Optional[str]) -> Optional[str]:
+        """Canonical zone name for `text`, or the stripped input when it does not resolve."""
+        if text is None:
+            return None
+        zone = self.resolve(text)
+        return zone.name if zone is not None else text.strip()
+
+    def coordinates(self, text: Optional[str]) -> Optional[Tuple[float, float]]:
+        """Zone centre for `text`, or None when it does not resolve."""
+        zone = self.resolve(text) if text else None
+        return (zone.latitude, zone.longitude) if zone is not None else None
+
+    def resolve_many(self, texts: Iterable[str]) -> List[Optional[Zone]]:
+        """Resolve a batch, resolving each distinct string once."""
+        texts = list(texts)
+        resolved = {text: self.resolve(text) for text in set(texts)}
+        return [resolved[text] for text in texts]
+
+    def cache_info(self) -> dict:
+        info = self.resolve.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+
+location_index = LocationIndex.from_file(settings.location_gazetteer_path, settings.location_fuzzy_threshold,
+                                         settings.location_fuzzy_margin, settings.location_cache_size)
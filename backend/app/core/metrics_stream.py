@@ -0,0 +1,132 @@
+# Server-push fan-out of real-time metrics snapshots
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Optional, Set
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def diff(previous: Any, current: Any) -> Any:
+    """Keys of `current` that changed since `previous`; nested dicts are diffed recursively."""
+    if not isinstance(previous, dict) or not isinstance(current, dict):
+        return current
+    changes = {}
+    for key, value in current.items():
+        if key not in previous:
+            changes[key] = value
+        elif previous[key] != value:
+            changes[key] = diff(previous[key], value)
+    removed = [key for key in previous if key not in current]
+    if removed:
+        changes["__removed__"] = removed
+    return changes
+
+
+class Frame:
+    """One encoded message, shared by every subscriber it is delivered to."""
+
+    __slots__ = ("seq", "kind", "text", "sse")
+
+    def __init__(self, seq: int, kind: str, data: Any):
+        self.seq = seq
+        self.kind = kind
+        self.text = json.dumps({"type": kind, "seq": seq, "data": data}, separators=(",", ":"))
+        self.sse = f"id: {seq}\nevent: {kind}\ndata: {self.text}\n\n".encode()
+
+
+class Subscriber:
+    """Bounded per-client frame buffer; overflow replaces the backlog with a full snapshot."""
+
+    __slots__ = ("buffer", "ready", "dropped")
+
+    def __init__(self, max_frames: int):
+        self.buffer: Deque[Frame] = deque(maxlen=max_frames)
+        self.ready = asyncio.Event()
+        self.dropped = 0
+
+    async def next(self) -> Frame:
+        while not self.buffer:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.buffer.popleft()
+
+
+class MetricsBroadcaster:
+    """
+    Compute one metrics snapshot per tick and fan it out to all subscribers.
+
+    Each tick is JSON-encoded once as a delta against the previous snapshot.
+    A full snapshot frame is encoded lazily, only when a client joins or a
+    slow client's buffer overflows and its stale deltas have to be discarded.
+    """
+
+    def __init__(self, build_snapshot: Callable[[], dict], interval: float, max_frames: int):
+        self.build_snapshot = build_snapshot
+        self.interval = interval
+        self.max_frames = max_frames
+        self.subscribers: Set[Subscriber] = set()
+        self.seq = 0
+        self.snapshot: Optional[dict] = None
+        self._keyframe: Optional[Frame] = None
+
+    def _full_frame(self) -> Frame:
+        if self._keyframe is None or self._keyframe.seq != self.seq:
+            self._keyframe = Frame(self.seq, "snapshot", self.snapshot)
+        return self._keyframe
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.max_frames)
+        if self.snapshot is not None:
+            subscriber.buffer.append(self._full_frame())
+            subscriber.ready.set()
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def tick(self):
+        if not self.subscribers:
+            # Nobody listening; the next subscriber will get a fresh snapshot
+            self.snapshot = None
+            return
+        current = self.build_snapshot()
+        previous, self.snapshot = self.snapshot, current
+        self.seq += 1
+        if previous is None:
+            frame = self._full_frame()
+        else:
+            changes = diff(previous, current)
+            if not changes:
+                return
+            frame = Frame(self.seq, "delta", changes)
+
+        for subscriber in self.subscribers:
+            if len(subscriber.buffer) == self.max_frames:
+                subscriber.buffer.clear()
+                subscriber.buffer.append(self._full_frame())
+                subscriber.dropped += 1
+            else:
+                subscriber.buffer.append(frame)
+            subscriber.ready.set()
+
+    async def run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Failed to publish metrics snapshot: {e}")
+            await asyncio.sleep(self.interval)
+
+
+def create_broadcaster(build_snapshot: Callable[[], dict]) -> MetricsBroadcaster:
+    return MetricsBroadcaster(
+        build_snapshot,
+        interval=settings.metrics_stream_interval_seconds,
+        max_frames=settings.metrics_stream_client_buffer,
+    )
@@ -0,0 +1,253 @@
+# Dynamic pricing: surge multipliers per zone x service x time slot from live demand and online supply
+
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.geo_sharding import SERVICE_BITS, SERVICE_TYPES, Cell, cell_of
+from app.core.shared_state import shared_state
+
+logger = logging.getLogger(__name__)
+
+SERVICE_INDEX = {name: i for i, name in enumerate(SERVICE_TYPES)}
+
+
+class PricingEngine:
+    """
+    Surge multipliers for every zone x service x time slot.
+
+    Zones are matching grid cells, numbered densely as they are first seen.
+    Demand is counted into a pending buffer as requests arrive and folded into
+    an exponentially decayed hourly rate on every recompute; supply is the
+    number of online providers offering the service in the zone. A recompute
+    is a handful of whole-table array operations and publishes the new table
+    by swapping one reference, so lookups take no lock and never see a
+    half-written table.
+    """
+
+    def __init__(self, max_zones: int, slot_hours: int, cell_deg: float, half_life: float,
+                 requests_per_provider: float, min_supply: float, sensitivity: float, smoothing: float,
+                 min_multiplier: float, max_multiplier: float, step: float):
+        self.max_zones = max_zones
+        self.slot_hours = slot_hours
+        self.n_slots = 24 // slot_hours
+        self.cell_deg = cell_deg
+        self.half_life = half_life
+        self.requests_per_provider = requests_per_provider
+        self.min_supply = min_supply
+        self.sensitivity = sensitivity
+        self.smoothing = smoothing
+        self.min_multiplier = min_multiplier
+        self.max_multiplier = max_multiplier
+        self.step = step
+
+        shape = (max_zones, len(SERVICE_TYPES), self.n_slots)
+        self._zones: Dict[Cell, int] = {}
+        # Zones are created by request handlers and by supply refreshes in a worker thread
+        self._zones_lock = threading.Lock()
+        self._pending = np.zeros(shape, dtype=np.float32)
+        self._spare = np.zeros(shape, dtype=np.float32)
+        self._demand = np.zeros(shape, dtype=np.float32)
+        # Online providers per zone and service; NaN until supply is known
+        self._supply = np.full(shape[:2], np.nan, dtype=np.float32)
+        self._table = np.ones(shape, dtype=np.float32)
+        self._last_recompute = time.monotonic()
+        # Replaced rather than mutated, so a refresh in the worker thread iterates a stable set
+        self._offline: FrozenSet[str] = frozenset()
+        self._supply_source: Optional[int] = None
+        self.version = 0
+        self.recompute_ms: Optional[float] = None
+
+    def _zone(self, cell: Cell, create: bool) -> Optional[int]:
+        zone = self._zones.get(cell)
+        if zone is None and create:
+            with self._zones_lock:
+                zone = self._zones.get(cell)
+                if zone is None and len(self._zones) < self.max_zones:
+                    zone = self._zones[cell] = len(self._zones)
+        return zone
+
+    def zone_id(self, lat: float, lon: float, create: bool = False) -> Optional[int]:
+        return self._zone(cell_of(lat, lon, self.cell_deg), create)
+
+    def slot_of(self, when: Optional[datetime] = None) -> int:
+        return (when or datetime.now()).hour // self.slot_hours
+
+    def record_demand(self, lat: float, lon: float, service: str, when: Optional[datetime] = None,
+                      weight: float = 1.0):
+        service_index = SERVICE_INDEX.get(service)
+        zone = self.zone_id(lat, lon, create=True)
+        if service_index is not None and zone is not None:
+            self._pending[zone, service_index, self.slot_of(when)] += weight
+
+    def multiplier(self, lat: float, lon: float, service: str, when: Optional[datetime] = None) -> float:
+        """Current surge multiplier; 1.0 for unknown zones and services."""
+        zone = self._zone(cell_of(lat, lon, self.cell_deg), create=False)
+        service_index = SERVICE_INDEX.get(service)
+        if zone is None or service_index is None:
+            return 1.0
+        return float(self._table[zone, service_index, self.slot_of(when)])
+
+    def quote(self, base_price: float, lat: float, lon: float, service: str,
+              when: Optional[datetime] = None) -> int:
+        return int(round(base_price * self.multiplier(lat, lon, service, when)))
+
+    def set_supply(self, lats: np.ndarray, lons: np.ndarray, services: np.ndarray,
+                   online: Optional[np.ndarray] = None):
+        """Count online providers per zone and service from provider columns."""
+        lat_cells = np.floor(np.asarray(lats) / self.cell_deg).astype(np.int64)
+        lon_cells = np.floor(np.asarray(lons) / self.cell_deg).astype(np.int64)
+        keys = lat_cells * (1 << 32) + (lon_cells & 0xFFFFFFFF)
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        lookup = np.empty(len(unique_keys), dtype=np.int64)
+        for i, row in enumerate(first):
+            zone = self._zone((int(lat_cells[row]), int(lon_cells[row])), create=True)
+            lookup[i] = -1 if zone is None else zone
+        zones = lookup[inverse]
+        keep = zones >= 0
+        if online is not None:
+            keep &= online
+        services = np.asarray(services)
+        supply = np.zeros((self.max_zones, len(SERVICE_TYPES)), dtype=np.float32)
+        for name, bit in SERVICE_BITS.items():
+            offered = keep & ((services & bit) != 0)
+            supply[:, SERVICE_INDEX[name]] = np.bincount(zones[offered], minlength=self.max_zones)
+        self._supply = supply
+
+    def set_provider_online(self, provider_id: str, online: bool):
+        if online:
+            self._offline = self._offline - {provider_id}
+        else:
+            self._offline = self._offline | {provider_id}
+        self._supply_source = None
+
+    def refresh_supply(self):
+        """Rebuild supply when a new provider generation is published or availability changed."""
+        state = shared_state.current()
+        if state is None or "provider_services" not in state:
+            return
+        if state.generation == self._supply_source:
+            return
+        online = None
+        if self._offline:
+            online = ~np.isin(state["provider_id"], list(self._offline))
+        self.set_supply(state["provider_lat"], state["provider_lon"], state["provider_services"], online)
+        self._supply_source = state.generation
+
+    def recompute(self):
+        """Fold pending demand into the decayed rates and publish a new multiplier table."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        elapsed = max(now - self._last_recompute, 1e-3)
+        self._last_recompute = now
+        # Double-buffered: requests keep counting into the spare buffer while this one is folded in
+        pending, self._pending = self._pending, self._spare
+        n = max(len(self._zones), 1)
+
+        decay = np.float32(0.5 ** (elapsed / self.half_life))
+        demand = self._demand[:n]
+        demand *= decay
+        demand += pending[:n] * np.float32((1 - decay) * 3600.0 / elapsed)
+        pending[:n] = 0
+        self._spare = pending
+
+        # Supply is floored at min_supply providers, so a zone that briefly has no one online
+        # surges with its demand instead of jumping straight to the maximum; unknown supply
+        # stays NaN through the floor and maps to 1.0
+        capacity = np.maximum(self._supply[:n, :, None], np.float32(self.min_supply))
+        capacity *= np.float32(self.requests_per_provider)
+        with np.errstate(invalid="ignore"):
+            target = demand / capacity
+        target -= 1
+        target *= np.float32(self.sensitivity)
+        target += 1
+        np.clip(target, self.min_multiplier, self.max_multiplier, out=target)
+        np.nan_to_num(target, copy=False, nan=1.0)
+
+        table = self._table.copy()
+        smoothed = table[:n]
+        smoothed += np.float32(self.smoothing) * (target - smoothed)
+        smoothed /= np.float32(self.step)
+        np.round(smoothed, out=smoothed)
+        smoothed *= np.float32(self.step)
+        self._table = table
+        self.version += 1
+        self.recompute_ms = (time.perf_counter() - started) * 1000
+
+    def status(self, top: int = 10) -> dict:
+        table = self._table[:max(len(self._zones), 1)]
+        cells = {zone: cell for cell, zone in self._zones.items()}
+        order = np.argsort(-table, axis=None)[:top]
+        surges = []
+        for flat in order:
+            zone, service, slot = np.unravel_index(flat, table.shape)
+            if table[zone, service, slot] <= 1.0 or zone not in cells:
+                break
+            surges.append({
+                "cell": list(cells[zone]),
+                "service": SERVICE_TYPES[service],
+                "slot": f"{slot * self.slot_hours:02d}:00-{(slot + 1) * self.slot_hours:02d}:00",
+                "multiplier": round(float(table[zone, service, slot]), 2),
+            })
+        return {"zones": len(self._zones), "version": self.version,
+                "recompute_ms": None if self.recompute_ms is None else round(self.recompute_ms, 3),
+                "supply_known": not np.isnan(self._supply).all(), "top_surges": surges}
+
+
+def parse_budget_range(budget_range: Optional[str]) -> Optional[Tuple[float, float]]:
+    """
+    Parse a free-form budget into (low, high) INR.
+
+    Accepts ranges ("1500-3000", "₹1,500 to ₹3,000"), caps ("under 2000",
+    "<2000") and floors ("2000+", "above 2000"). Returns None when no
+    amount can be read, in which case no budget filter applies.
+    """
+    if not budget_range:
+        return None
+    text = budget_range.lower().replace(",", "")
+    amounts = [float(value) * (1000 if suffix == "k" else 1)
+               for value, suffix in re.findall(r"(\d+(?:\.\d+)?)\s*(k?)", text)]
+    if not amounts:
+        return None
+    if len(amounts) >= 2:
+        return min(amounts[:2]), max(amounts[:2])
+    if "+" in text or re.search(r"\b(above|over|min|from|at least)\b|>", text):
+        return amounts[0], math.inf
+    return 0.0, amounts[0]
+
+
+pricing_engine = PricingEngine(
+    max_zones=settings.pricing_max_zones,
+    slot_hours=settings.pricing_slot_hours,
+    cell_deg=settings.matching_cell_degrees,
+    half_life=settings.pricing_demand_half_life_seconds,
+    requests_per_provider=settings.pricing_requests_per_provider,
+    min_supply=settings.pricing_min_supply,
+    sensitivity=settings.pricing_sensitivity,
+    smoothing=settings.pricing_smoothing,
+    min_multiplier=settings.pricing_min_multiplier,
+    max_multiplier=settings.pricing_max_multiplier,
+    step=settings.pricing_step,
+)
+
+
+async def pricing_loop():
+    """Background job recomputing every zone's multipliers each pricing_recompute_interval_seconds."""
+    while True:
+        await asyncio.sleep(settings.pricing_recompute_interval_seconds)
+        if not settings.pricing_enabled:
+            continue
+        try:
+            # Whole-table array work; off the event loop so requests keep being served
+            await asyncio.to_thread(pricing_engine.refresh_supply)
+            await asyncio.to_thread(pricing_engine.recompute)
+        except Exception as e:
+            logger.error(f"Pricing recompute failed: {e}")
@@ -0,0 +1,205 @@
+# Opt-in request profiling: stage timers, Server-Timing headers and a sampling profiler
+
+import contextvars
+import functools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+
+_NULL_STAGE = nullcontext()
+
+
+class RequestTimings:
+    """Stage durations for one sampled request."""
+
+    __slots__ = ("started", "handler_done", "stages")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.handler_done: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def header(self) -> bytes:
+        now = time.perf_counter()
+        stages = dict(self.stages)
+        if self.handler_done is not None:
+            stages["serialization"] = now - self.handler_done
+        stages["total"] = now - self.started
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items()).encode()
+
+
+_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def _timed_stage(timings: RequestTimings, name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+def stage(name: str):
+    """Time a block as a named stage of the current request; a no-op unless the request is sampled."""
+    timings = _timings.get()
+    if timings is None:
+        return _NULL_STAGE
+    return _timed_stage(timings, name)
+
+
+def profiled(handler):
+    """
+    Decorate an async endpoint so sampled requests report a validation stage
+    (routing, body parsing and model validation before the handler runs) and
+    a serialization stage (after it returns).
+    """
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        timings = _timings.get()
+        if timings is None:
+            return await handler(*args, **kwargs)
+        timings.add("validation", time.perf_counter() - timings.started)
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            timings.handler_done = time.perf_counter()
+    return wrapper
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling the event-loop thread's stack.
+
+    The sampler thread only runs while profiling is enabled, and only records
+    while a sampled request is in flight or an explicit capture window is
+    open. Stacks are aggregated in collapsed ("folded") form, ready for
+    flamegraph tools.
+    """
+
+    def __init__(self, enabled: bool, sample_rate: float, interval: float, output_path: str):
+        self.enabled = False
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_path = output_path
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._recording = 0
+        self._capture_until = 0.0
+        self._target_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        if enabled:
+            self.configure(enabled=True)
+
+    def configure(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None):
+        """Switch profiling at runtime."""
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        if enabled is not None:
+            self.enabled = enabled
+            if enabled and (self._thread is None or not self._thread.is_alive()):
+                self._target_thread = threading.main_thread().ident
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+
+    def should_sample(self) -> bool:
+        return self.enabled and random.random() < self.sample_rate
+
+    def begin_request(self):
+        # Sample whichever thread runs the event loop (the main thread under uvicorn)
+        self._target_thread = threading.get_ident()
+        self._recording += 1
+
+    def end_request(self):
+        self._recording -= 1
+
+    def _run(self):
+        while self.enabled:
+            time.sleep(self.interval)
+            if self._recording <= 0 and time.monotonic() >= self._capture_until:
+                continue
+            frame = sys._current_frames().get(self._target_thread)
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            with self._lock:
+                self.stacks[";".join(reversed(names))] += 1
+                self.samples += 1
+
+    def capture(self, seconds: float):
+        """Record every sample (not just sampled requests) for the next `seconds`."""
+        self.configure(enabled=True)
+        self._target_thread = threading.get_ident()
+        self._capture_until = time.monotonic() + seconds
+
+    def dump(self) -> dict:
+        """Write collected stacks as a collapsed-stack file and reset the counters."""
+        with self._lock:
+            stacks, samples = self.stacks, self.samples
+            self.stacks, self.samples = Counter(), 0
+        os.makedirs(self.output_path, exist_ok=True)
+        path = os.path.join(self.output_path, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return {"path": path, "samples": samples, "distinct_stacks": len(stacks)}
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "pending_samples": self.samples,
+        }
+
+
+profiler = SamplingProfiler(
+    enabled=settings.profiling_enabled,
+    sample_rate=settings.profiling_sample_rate,
+    interval=settings.profiling_interval_ms / 1000,
+    output_path=settings.profiling_output_path,
+)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware adding Server-Timing to sampled requests; one flag check when disabled."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.should_sample():
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler.begin_request()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            profiler.end_request()
+            _timings.reset(token)
@@ -0,0 +1,512 @@
+# Background retraining: resource-limited worker process, holdout validation and atomic publishing
+
+import asyncio
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.churn_model import HOLDOUT_EVERY, ChurnModel, log_loss, train_churn_model
+from app.core.config import settings
+from app.core.geo_sharding import SERVICE_TYPES
+from app.core.simulator import COMPLEXITY_LEVELS, LOCATION_NAMES
+
+logger = logging.getLogger(__name__)
+
+# Recommendations are served from the candidate table (app.core.candidates), rebuilt and patched on its own
+MODELS = ("churn", "duration", "demand")
+
+# Settings forwarded to the worker process so runtime overrides reach it
+_WORKER_SETTINGS = ("model_storage_path", "churn_training_data_path", "churn_training_chunk_size",
+                    "churn_training_epochs", "retrain_data_path", "retrain_chunk_size",
+                    "retrain_holdout_rows", "retrain_demand_holdout_days", "retrain_max_regression",
+                    "retrain_cpu_seconds_limit", "retrain_memory_limit_mb", "retrain_niceness")
+
+
+class _Stages:
+    """Wall-clock duration of every named stage of one model's retrain."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def __call__(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = round(self.seconds.get(name, 0.0) + time.perf_counter() - started, 3)
+
+
+# Artifacts: <model_storage_path>/<name>/<name>-<version>.npz + .json, with an atomic LATEST pointer
+
+def save_artifact(name: str, version: str, arrays: Dict[str, np.ndarray], meta: dict) -> str:
+    model_dir = os.path.join(settings.model_storage_path, name)
+    os.makedirs(model_dir, exist_ok=True)
+    base = os.path.join(model_dir, f"{name}-{version}")
+    np.savez(base + ".npz", **arrays)
+    with open(base + ".json", "w") as f:
+        json.dump({"version": version, **meta}, f)
+    tmp = os.path.join(model_dir, "LATEST.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(model_dir, "LATEST"))
+    return base + ".npz"
+
+
+def load_artifact(name: str) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+    """Arrays and metadata of the published version of `name`, if any."""
+    model_dir = os.path.join(settings.model_storage_path, name)
+    try:
+        with open(os.path.join(model_dir, "LATEST")) as f:
+            version = f.read().strip()
+        base = os.path.join(model_dir, f"{name}-{version}")
+        with np.load(base + ".npz") as data:
+            arrays = {key: data[key] for key in data.files}
+        with open(base + ".json") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    return arrays, meta
+
+
+# Serving side: the published booking models, reloaded when LATEST moves
+
+_published: Dict[str, Tuple[Optional[int], Optional[Tuple[Dict[str, np.ndarray], dict]]]] = {}
+_next_checks: Dict[str, float] = {}
+
+
+def get_published_model(name: str) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+    """
+    Arrays and metadata of the served version of a booking model, or None
+    until one is published. Like get_churn_model, LATEST is re-checked at
+    most every model_reload_interval_seconds.
+    """
+    now = time.monotonic()
+    if now >= _next_checks.get(name, 0.0):
+        _next_checks[name] = now + settings.model_reload_interval_seconds
+        try:
+            stamp = os.stat(os.path.join(settings.model_storage_path, name, "LATEST")).st_mtime_ns
+        except FileNotFoundError:
+            stamp = None
+        if name not in _published or _published[name][0] != stamp:
+            _published[name] = (stamp, load_artifact(name) if stamp is not None else None)
+    return _published[name][1]
+
+
+def published_version(name: str) -> Optional[str]:
+    published = get_published_model(name)
+    return published[1]["version"] if published is not None else None
+
+
+def _new_version() -> str:
+    return datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+
+
+# Booking data written by the marketplace simulator (per-column .npy files)
+
+class BookingData:
+    """Memory-mapped booking columns with provider experience joined in per chunk."""
+
+    COLUMNS = ("booking_id", "timestamp", "service", "location", "complexity", "provider_id", "duration_minutes")
+
+    def __init__(self, root: str):
+        bookings = os.path.join(root, "bookings")
+        self.columns = {name: np.load(os.path.join(bookings, f"{name}.npy"), mmap_mode="r") for name in self.COLUMNS}
+        self.provider_experience = np.load(os.path.join(root, "providers", "provider_experience.npy"))
+        self.rows = len(self.columns["booking_id"])
+
+    def fingerprint(self, rows: int) -> str:
+        """Digest of the head and of the tail of the first `rows` rows, to detect rewritten history."""
+        timestamps = self.columns["timestamp"]
+        digest = hashlib.sha1(str(rows).encode())
+        digest.update(np.ascontiguousarray(timestamps[:min(rows, 4096)]).tobytes())
+        digest.update(np.ascontiguousarray(timestamps[max(0, rows - 4096):rows]).tobytes())
+        return digest.hexdigest()
+
+    def chunks(self, start: int, end: int, chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        for begin in range(start, end, chunk_size):
+            chunk = {name: np.asarray(col[begin:min(begin + chunk_size, end)]) for name, col in self.columns.items()}
+            chunk["provider_experience"] = self.provider_experience[chunk["provider_id"]]
+            yield chunk
+
+    def holdout(self) -> Dict[str, np.ndarray]:
+        """Held-out rows among the most recent retrain_holdout_rows bookings."""
+        start = max(0, self.rows - settings.retrain_holdout_rows)
+        parts = []
+        for chunk in self.chunks(start, self.rows, settings.retrain_chunk_size):
+            held_out = chunk["booking_id"] % HOLDOUT_EVERY == 0
+            parts.append({name: values[held_out] for name, values in chunk.items()})
+        return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def _train_rows(chunk: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    keep = chunk["booking_id"] % HOLDOUT_EVERY != 0
+    return {name: values[keep] for name, values in chunk.items()}
+
+
+class DurationTrainer:
+    """Log-linear duration model fit from accumulated normal equations."""
+
+    name = "duration"
+    metric = "holdout_rmse_minutes"
+
+    def features(self, chunk: Dict[str, np.ndarray]) -> np.ndarray:
+        n = len(chunk["service"])
+        experience = chunk["provider_experience"].astype(np.float64)
+        X = np.zeros((n, len(SERVICE_TYPES) + 4))
+        X[np.arange(n), chunk["service"]] = 1.0
+        X[:, len(SERVICE_TYPES)] = chunk["complexity"] == COMPLEXITY_LEVELS.index("low")
+        X[:, len(SERVICE_TYPES) + 1] = chunk["complexity"] == COMPLEXITY_LEVELS.index("high")
+        X[:, len(SERVICE_TYPES) + 2] = experience / 10
+        X[:, len(SERVICE_TYPES) + 3] = (experience / 10) ** 2
+        return X
+
+    def empty_state(self) -> Dict[str, np.ndarray]:
+        d = len(SERVICE_TYPES) + 4
+        return {"xtx": np.zeros((d, d)), "xty": np.zeros(d)}
+
+    def accumulate(self, state: Dict[str, np.ndarray], chunk: Dict[str, np.ndarray]):
+        chunk = _train_rows(chunk)
+        X = self.features(chunk)
+        state["xtx"] += X.T @ X
+        state["xty"] += X.T @ np.log(chunk["duration_minutes"].astype(np.float64))
+
+    def fit(self, state: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        ridge = 1e-6 * np.eye(len(state["xty"]))
+        return {"coefficients": np.linalg.solve(state["xtx"] + ridge, state["xty"])}
+
+    def evaluate(self, params: Dict[str, np.ndarray], state: Dict[str, np.ndarray], holdout: dict) -> float:
+        predicted = np.exp(self.features(holdout) @ params["coefficients"])
+        return float(np.sqrt(np.mean((predicted - holdout["duration_minutes"]) ** 2)))
+
+
+class DemandTrainer:
+    """Expected daily bookings per weekday, location and service; the latest days are held out."""
+
+    name = "demand"
+    metric = "holdout_mae_bookings_per_day"
+
+    def empty_state(self) -> Dict[str, np.ndarray]:
+        return {"first_day": np.array(-1), "daily": np.zeros((0, len(LOCATION_NAMES), len(SERVICE_TYPES)), dtype=np.int64)}
+
+    def accumulate(self, state: Dict[str, np.ndarray], chunk: Dict[str, np.ndarray]):
+        day = chunk["timestamp"] // 86400
+        first_day = int(state["first_day"]) if int(state["first_day"]) >= 0 else int(day.min())
+        if day.min() < first_day:
+            pad = np.zeros((first_day - int(day.min()),) + state["daily"].shape[1:], dtype=np.int64)
+            state["daily"] = np.concatenate([pad, state["daily"]])
+            first_day = int(day.min())
+        needed = int(day.max()) - first_day + 1
+        if needed > len(state["daily"]):
+            pad = np.zeros((needed - len(state["daily"]),) + state["daily"].shape[1:], dtype=np.int64)
+            state["daily"] = np.concatenate([state["daily"], pad])
+        daily = state["daily"]
+        flat = ((day - first_day) * daily.shape[1] + chunk["location"]) * daily.shape[2] + chunk["service"]
+        daily += np.bincount(flat, minlength=daily.size).reshape(daily.shape)
+        state["first_day"] = np.array(first_day)
+
+    def _split(self, state: Dict[str, np.ndarray]) -> int:
+        return max(0, len(state["daily"]) - settings.retrain_demand_holdout_days)
+
+    def fit(self, state: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        train = state["daily"][:self._split(state)]
+        weekday = (int(state["first_day"]) + np.arange(len(train)) + 3) % 7  # 1970-01-01 was a Thursday
+        table = np.zeros((7,) + train.shape[1:])
+        for d in range(7):
+            if (weekday == d).any():
+                table[d] = train[weekday == d].mean(axis=0)
+        return {"weekday_demand": table}
+
+    def evaluate(self, params: Dict[str, np.ndarray], state: Dict[str, np.ndarray], holdout: dict) -> float:
+        split = self._split(state)
+        actual = state["daily"][split:]
+        if not len(actual):
+            return float("nan")
+        weekday = (int(state["first_day"]) + split + np.arange(len(actual)) + 3) % 7
+        return float(np.abs(params["weekday_demand"][weekday] - actual).mean())
+
+
+BOOKING_TRAINERS = {trainer.name: trainer for trainer in (DurationTrainer(), DemandTrainer())}
+
+
+def _accepted(candidate: float, previous: Optional[float]) -> bool:
+    if not np.isfinite(candidate):
+        return False
+    return previous is None or not np.isfinite(previous) or \
+        candidate <= previous * (1 + settings.retrain_max_regression)
+
+
+def retrain_booking_model(trainer, data: Optional[BookingData]) -> dict:
+    """
+    Retrain one booking-based model and publish it if it validates.
+
+    Model state (sufficient statistics) is stored with each artifact, so when
+    bookings were only appended since the published version, just the new
+    rows are folded in instead of re-reading the whole history.
+    """
+    report = {"model": trainer.name}
+    stages = _Stages()
+    if data is None:
+        return {**report, "status": "skipped", "reason": "no booking data"}
+
+    with stages("detect"):
+        published = load_artifact(trainer.name)
+        previous_state = previous_params = None
+        start = 0
+        if published is not None:
+            arrays, meta = published
+            rows_seen = meta.get("rows", 0)
+            if rows_seen <= data.rows and meta.get("fingerprint") == data.fingerprint(rows_seen):
+                start = rows_seen
+                previous_state = {key[6:]: value for key, value in arrays.items() if key.startswith("state_")}
+            previous_params = {key: value for key, value in arrays.items() if not key.startswith("state_")}
+    if start == data.rows:
+        return {**report, "status": "unchanged", "rows": data.rows, "stages": stages.seconds}
+    report["mode"] = "incremental" if start else "full"
+    report["new_rows"] = data.rows - start
+
+    with stages("accumulate"):
+        state = {key: value.copy() for key, value in previous_state.items()} if previous_state else trainer.empty_state()
+        for chunk in data.chunks(start, data.rows, settings.retrain_chunk_size):
+            trainer.accumulate(state, chunk)
+    with stages("fit"):
+        params = trainer.fit(state)
+    with stages("validate"):
+        holdout = data.holdout()
+        candidate = trainer.evaluate(params, state, holdout)
+        previous = trainer.evaluate(previous_params, state, holdout) if previous_params else None
+    report.update({"metric": trainer.metric, "candidate": round(candidate, 4),
+                   "published": None if previous is None else round(previous, 4), "rows": data.rows})
+    if not _accepted(candidate, previous):
+        return {**report, "status": "rejected", "stages": stages.seconds}
+
+    with stages("publish"):
+        version = _new_version()
+        arrays = {**params, **{f"state_{key}": value for key, value in state.items()}}
+        save_artifact(trainer.name, version, arrays, {
+            "rows": data.rows, "fingerprint": data.fingerprint(data.rows),
+            "metrics": {trainer.metric: candidate},
+            "services": SERVICE_TYPES, "locations": LOCATION_NAMES,
+        })
+    return {**report, "status": "published", "version": version, "stages": stages.seconds}
+
+
+def retrain_churn(data_path: str) -> dict:
+    """Retrain the churn model, warm-starting from the published one, and publish it if it validates."""
+    report = {"model": "churn"}
+    stages = _Stages()
+    label_file = os.path.join(data_path, "churned.npy")
+    if not os.path.exists(label_file):
+        return {**report, "status": "skipped", "reason": f"no churn data at {data_path}"}
+
+    with stages("detect"):
+        stat = os.stat(label_file)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        previous = ChurnModel.load_latest(settings.model_storage_path)
+        if previous is not None and previous.metrics.get("data_stamp") == stamp:
+            return {**report, "status": "unchanged", "stages": stages.seconds}
+    report["mode"] = "incremental" if previous is not None else "full"
+
+    with stages("fit"):
+        model = train_churn_model(
+            data_path,
+            chunk_size=settings.churn_training_chunk_size,
+            epochs=1 if previous is not None else settings.churn_training_epochs,
+            l2=settings.churn_l2_penalty,
+            learning_rate=settings.churn_learning_rate,
+            split="train",
+            initial=previous,
+        )
+    with stages("validate"):
+        candidate = log_loss(model, data_path, settings.churn_training_chunk_size, split="holdout")
+        published = (log_loss(previous, data_path, settings.churn_training_chunk_size, split="holdout")
+                     if previous is not None else None)
+    report.update({"metric": "holdout_log_loss", "candidate": round(candidate, 4),
+                   "published": None if published is None else round(published, 4)})
+    if not _accepted(candidate, published):
+        return {**report, "status": "rejected", "stages": stages.seconds}
+
+    with stages("publish"):
+        model.version = _new_version()
+        model.metrics.update({"holdout_log_loss": candidate, "data_stamp": stamp})
+        model.save(settings.model_storage_path)
+    return {**report, "status": "published", "version": model.version, "stages": stages.seconds}
+
+
+def run_retraining(models: Optional[List[str]] = None) -> List[dict]:
+    """Retrain the given models (all by default) in this process, one after another."""
+    models = models or list(MODELS)
+    data = None
+    if any(name in BOOKING_TRAINERS for name in models):
+        try:
+            data = BookingData(settings.retrain_data_path)
+        except FileNotFoundError:
+            logger.info(f"No booking data at {settings.retrain_data_path}")
+    reports = []
+    for name in models:
+        started = time.perf_counter()
+        try:
+            if name == "churn":
+                report = retrain_churn(settings.churn_training_data_path)
+            else:
+                report = retrain_booking_model(BOOKING_TRAINERS[name], data)
+        except Exception as e:
+            logger.error(f"Retraining {name} failed: {e}")
+            report = {"model": name, "status": "failed", "error": str(e)}
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Retrain {name}: {report['status']} in {report['seconds']}s")
+        reports.append(report)
+    return reports
+
+
+def _limit_resources():
+    """Cap the worker's CPU time and address space and lower its scheduling priority."""
+    import resource
+
+    os.nice(settings.retrain_niceness)
+    cpu = settings.retrain_cpu_seconds_limit
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 10))
+    memory = settings.retrain_memory_limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _try_lock(name: str) -> Optional[int]:
+    """Non-blocking exclusive flock on retraining/<name>; the descriptor to close to release it, or None."""
+    path = os.path.join(settings.model_storage_path, "retraining")
+    os.makedirs(path, exist_ok=True)
+    fd = os.open(os.path.join(path, name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class RetrainScheduler:
+    """
+    Runs retraining in a separate, resource-limited Python process.
+
+    Serving workers never train: they only notice newly published
+    artifacts. Every uvicorn worker has a scheduler, so two file locks keep
+    them from training at once: the first worker to take scheduler.lock is
+    the only one running scheduled retrains, and every run, scheduled or
+    manual, holds run.lock while its worker process is alive. Every run's
+    per-model reports and per-stage durations are kept in memory and
+    appended to retraining/history.jsonl.
+    """
+
+    def __init__(self, history: int = 50):
+        self.running = False
+        self.history: Deque[dict] = deque(maxlen=history)
+        self._run_lock: Optional[int] = None
+        self._leader_lock: Optional[int] = None
+
+    def _claim(self):
+        if self.running:
+            raise RuntimeError("A retrain is already running")
+        self._run_lock = _try_lock("run.lock")
+        if self._run_lock is None:
+            raise RuntimeError("A retrain is already running in another worker")
+        self.running = True
+
+    def _release(self):
+        self.running = False
+        if self._run_lock is not None:
+            os.close(self._run_lock)
+            self._run_lock = None
+
+    @property
+    def leader(self) -> bool:
+        """Whether this process runs the scheduled retrains; taken by the first worker to ask."""
+        if self._leader_lock is None:
+            self._leader_lock = _try_lock("scheduler.lock")
+        return self._leader_lock is not None
+
+    async def run_once(self, models: Optional[List[str]] = None) -> dict:
+        """Run one retrain in the worker process and wait for its reports."""
+        self._claim()
+        return await self._run(models)
+
+    def start(self, models: Optional[List[str]] = None) -> asyncio.Task:
+        """Start a retrain without waiting for it."""
+        self._claim()
+        try:
+            return asyncio.create_task(self._run(models))
+        except BaseException:
+            self._release()
+            raise
+
+    async def _run(self, models: Optional[List[str]]) -> dict:
+        started = time.time()
+        # Single-threaded BLAS keeps the worker to one core
+        env = {**os.environ, "OMP_NUM_THREADS": "1", "OPENBLAS_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
+        env.update({name.upper(): str(getattr(settings, name)) for name in _WORKER_SETTINGS})
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "app.core.retraining", *(models or []),
+                stdout=asyncio.subprocess.PIPE, env=env,
+            )
+            try:
+                stdout, _ = await process.communicate()
+            except asyncio.CancelledError:
+                # Shutting down: don't leave an orphaned worker writing to a closed pipe
+                process.kill()
+                await process.wait()
+                raise
+        finally:
+            self._release()
+        lines = stdout.decode().strip().splitlines()
+        if process.returncode != 0 or not lines:
+            logger.error(f"Retraining worker exited with code {process.returncode}")
+        run = {"started_at": datetime.utcfromtimestamp(started).isoformat(),
+               "seconds": round(time.time() - started, 3), "exit_code": process.returncode,
+               "models": json.loads(lines[-1]) if process.returncode == 0 and lines else []}
+        self.history.append(run)
+        self._append_history(run)
+        return run
+
+    def _append_history(self, run: dict):
+        path = os.path.join(settings.model_storage_path, "retraining")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "history.jsonl"), "a") as f:
+            f.write(json.dumps(run) + "\n")
+
+    def status(self) -> dict:
+        return {"running": self.running, "leader": self._leader_lock is not None,
+                "interval_hours": settings.retrain_interval_hours, "runs": list(self.history)}
+
+    async def loop(self):
+        """
+        Background job retraining every retrain_interval_hours in the leader
+        worker. The first run waits a full interval: a restart (or N workers
+        starting together) does not trigger a retrain.
+        """
+        while True:
+            await asyncio.sleep(settings.retrain_interval_hours * 3600)
+            if settings.retrain_enabled and not self.running and self.leader:
+                try:
+                    await self.run_once()
+                except RuntimeError as e:
+                    logger.info(f"Skipping scheduled retraining: {e}")
+                except Exception as e:
+                    logger.error(f"Scheduled retraining failed: {e}")
+
+
+retrain_scheduler = RetrainScheduler()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.log_level, stream=sys.stderr)
+    _limit_resources()
+    print(json.dumps(run_retraining(sys.argv[1:] or None)))
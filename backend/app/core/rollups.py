@@ -0,0 +1,443 @@
+# Pre-aggregated booking rollups per location x service x period
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.event_log import EventLog, Record
+
+logger = logging.getLogger(__name__)
+
+DAY, WEEK, MONTH = "day", "week", "month"
+TIERS = (DAY, WEEK, MONTH)
+
+# Aggregate slots: bookings, rating_sum, rating_count, revenue
+COUNT, RATING_SUM, RATING_COUNT, REVENUE = range(4)
+
+_EPOCH = date(1970, 1, 1)
+
+# Every tier and the log offset they cover, replaced as one file
+SNAPSHOT_FILE = "rollups.npz"
+# Event types that update rollups: bookings count, ratings only add to the rating slots
+EVENT_TYPES = {"booking", "rating"}
+
+# Shared by every store, so a replaced store never reuses an earlier version
+_versions = itertools.count(1)
+
+
+def day_index(d: date) -> int:
+    return (d - _EPOCH).days
+
+
+def week_index(day: int) -> int:
+    # 1970-01-01 was a Thursday; shift so weeks start on Monday
+    return (day + 3) // 7
+
+
+def month_index(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+class RollupStore:
+    """
+    Incrementally maintained booking aggregates.
+
+    Each booking updates one daily, one weekly and one monthly cell for its
+    (location, service), so reads are dictionary lookups rather than scans
+    over raw bookings. Daily cells older than the retention window are
+    dropped on flush; the coarser tiers keep the long history. `version`
+    changes on every update, so responses can be tagged without hashing.
+    `log_offset` is the event log position the aggregates cover; it is
+    saved in the same file as every tier, so replay after a restart
+    resumes exactly there.
+    """
+
+    def __init__(self):
+        self.tiers: Dict[str, Dict[Tuple[str, str, int], List[float]]] = {tier: {} for tier in TIERS}
+        self.services_by_location: Dict[str, Set[str]] = {}
+        self.log_offset = 0
+        self._lock = threading.Lock()
+        self.version = next(_versions)
+
+    def __getstate__(self):
+        return {"tiers": self.tiers, "services_by_location": self.services_by_location,
+                "log_offset": self.log_offset}
+
+    def __setstate__(self, state):
+        self.log_offset = 0
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self.version = next(_versions)
+
+    def _add(self, location: str, service: str, when: datetime, price: Optional[float],
+             rating: Optional[float], bookings: int):
+        d = when.date()
+        day = day_index(d)
+        self.services_by_location.setdefault(location, set()).add(service)
+        for tier, period in ((DAY, day), (WEEK, week_index(day)), (MONTH, month_index(d))):
+            cell = self.tiers[tier].get((location, service, period))
+            if cell is None:
+                cell = self.tiers[tier][(location, service, period)] = [0, 0.0, 0, 0.0]
+            cell[COUNT] += bookings
+            if rating is not None:
+                cell[RATING_SUM] += rating
+                cell[RATING_COUNT] += 1
+            if price is not None:
+                cell[REVENUE] += price
+
+    def record(self, location: str, service: str, when: datetime,
+               price: Optional[float] = None, rating: Optional[float] = None):
+        with self._lock:
+            self._add(location, service, when, price, rating, 1)
+            self.version = next(_versions)
+
+    def record_batch(self, items: Iterable[Tuple[str, str, datetime, Optional[float], Optional[float], int]],
+                     log_offset: int):
+        """
+        Apply (location, service, when, price, rating, bookings) items read
+        from the event log up to `log_offset`, atomically with respect to
+        save(), so a snapshot never holds part of a batch.
+        """
+        with self._lock:
+            for item in items:
+                self._add(*item)
+            self.log_offset = log_offset
+            self.version = next(_versions)
+
+    def cell(self, tier: str, location: str, service: str, period: int) -> Optional[List[float]]:
+        return self.tiers[tier].get((location, service, period))
+
+    def services(self, location: str) -> Set[str]:
+        return self.services_by_location.get(location, set())
+
+    def merge(self, other: "RollupStore"):
+        with self._lock:
+            for location, services in other.services_by_location.items():
+                self.services_by_location.setdefault(location, set()).update(services)
+            for tier in TIERS:
+                cells = self.tiers[tier]
+                for key, values in other.tiers[tier].items():
+                    cell = cells.get(key)
+                    if cell is None:
+                        cells[key] = list(values)
+                    else:
+                        for i, value in enumerate(values):
+                            cell[i] += value
+            self.version = next(_versions)
+
+    def prune_days(self, before_day: int):
+        with self._lock:
+            daily = self.tiers[DAY]
+            expired = [key for key in daily if key[2] < before_day]
+            for key in expired:
+                del daily[key]
+            if expired:
+                self.version = next(_versions)
+
+    # Persistence: one columnar .npz holding every tier, with dictionary-encoded strings
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            snapshot = {tier: list(cells.items()) for tier, cells in self.tiers.items()}
+            log_offset = self.log_offset
+        locations = sorted({key[0] for items in snapshot.values() for key, _ in items})
+        services = sorted({key[1] for items in snapshot.values() for key, _ in items})
+        location_codes = {name: i for i, name in enumerate(locations)}
+        service_codes = {name: i for i, name in enumerate(services)}
+        columns = {"locations": np.array(json.dumps(locations)), "services": np.array(json.dumps(services)),
+                   "log_offset": np.int64(log_offset)}
+        for tier, items in snapshot.items():
+            values = np.array([cell for _, cell in items], dtype=np.float64).reshape(-1, 4)
+            columns.update({
+                f"{tier}_location": np.array([location_codes[key[0]] for key, _ in items], dtype=np.int32),
+                f"{tier}_service": np.array([service_codes[key[1]] for key, _ in items], dtype=np.int16),
+                f"{tier}_period": np.array([key[2] for key, _ in items], dtype=np.int32),
+                f"{tier}_count": values[:, COUNT].astype(np.int64),
+                f"{tier}_rating_sum": values[:, RATING_SUM],
+                f"{tier}_rating_count": values[:, RATING_COUNT].astype(np.int64),
+                f"{tier}_revenue": values[:, REVENUE],
+            })
+        # A crash leaves either the previous snapshot or this one, never tiers from both
+        tmp = os.path.join(path, "rollups.tmp.npz")
+        np.savez_compressed(tmp, **columns)
+        os.replace(tmp, os.path.join(path, SNAPSHOT_FILE))
+        for tier in TIERS:
+            legacy = os.path.join(path, f"{tier}.npz")
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+    def _load_cells(self, tier: str, data, prefix: str):
+        locations = json.loads(str(data["locations"]))
+        services = json.loads(str(data["services"]))
+        rows = zip(data[prefix + "location"].tolist(), data[prefix + "service"].tolist(),
+                   data[prefix + "period"].tolist(), data[prefix + "count"].tolist(),
+                   data[prefix + "rating_sum"].tolist(), data[prefix + "rating_count"].tolist(),
+                   data[prefix + "revenue"].tolist())
+        cells = self.tiers[tier]
+        for loc, svc, period, count, rating_sum, rating_count, revenue in rows:
+            location, service = locations[loc], services[svc]
+            cells[(location, service, period)] = [count, rating_sum, rating_count, revenue]
+            self.services_by_location.setdefault(location, set()).add(service)
+
+    @classmethod
+    def load(cls, path: str) -> "RollupStore":
+        store = cls()
+        snapshot = os.path.join(path, SNAPSHOT_FILE)
+        if os.path.exists(snapshot):
+            with np.load(snapshot) as data:
+                for tier in TIERS:
+                    store._load_cells(tier, data, f"{tier}_")
+                store.log_offset = int(data["log_offset"])
+            return store
+        # Snapshots from before the single file: one .npz per tier, resumed from the oldest offset
+        log_offsets = []
+        for tier in TIERS:
+            file_path = os.path.join(path, f"{tier}.npz")
+            if not os.path.exists(file_path):
+                continue
+            with np.load(file_path) as data:
+                if "log_offset" in data:
+                    log_offsets.append(int(data["log_offset"]))
+                store._load_cells(tier, data, "")
+        store.log_offset = min(log_offsets, default=0)
+        return store
+
+
+def rollup_items(records: Iterable[Record]) -> List[Tuple[str, str, datetime, Optional[float], Optional[float], int]]:
+    """record_batch items for booking and rating events that carry a location."""
+    return [(event["location"], event["service"], datetime.fromisoformat(event["timestamp"]),
+             event.get("price"), event.get("rating"), 1 if event["type"] == "booking" else 0)
+            for _, event in records if event["type"] in EVENT_TYPES and event.get("location")]
+
+
+def _rollup_log_range(log_path: str, start: int, stop: int) -> RollupStore:
+    """Build a partial rollup from event log offsets [start, stop)."""
+    log = EventLog(log_path, segment_bytes=settings.event_log_segment_bytes, fsync_bytes=0,
+                   index_interval=settings.event_log_index_interval, read_only=True)
+    store = RollupStore()
+    try:
+        offset = start
+        while offset < stop:
+            records, offset = log.read(offset, min(settings.ingestion_batch_size, stop - offset))
+            store.record_batch(rollup_items(records), offset)
+    finally:
+        log.close()
+    return store
+
+
+def backfill(log_path: str, workers: Optional[int] = None) -> RollupStore:
+    """
+    Rebuild rollups by replaying the event log, one segment per task across
+    worker processes. The log is opened read-only, so this can run beside
+    the live server; the result covers every record present when it started.
+    """
+    log = EventLog(log_path, segment_bytes=settings.event_log_segment_bytes, fsync_bytes=0,
+                   index_interval=settings.event_log_index_interval, read_only=True)
+    try:
+        ranges = [(start, stop) for start, stop in log.segment_ranges() if stop > start]
+    finally:
+        log.close()
+    store = RollupStore()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = pool.map(_rollup_log_range, [log_path] * len(ranges),
+                            [start for start, _ in ranges], [stop for _, stop in ranges])
+        for partial in partials:
+            store.merge(partial)
+    store.log_offset = ranges[-1][1] if ranges else 0
+    return store
+
+
+def rebuild_rollups(log_path: str, workers: Optional[int] = None) -> RollupStore:
+    """Backfill from the event log at log_path and persist the result."""
+    store = backfill(log_path, workers=workers)
+    store.save(settings.rollup_storage_path)
+    logger.info(f"Rebuilt booking rollups from {log_path} up to offset {store.log_offset}")
+    return store
+
+
+# Queries used by the location endpoints
+
+def _sum_cells(cells: Iterable[Optional[List[float]]]) -> List[float]:
+    total = [0, 0.0, 0, 0.0]
+    for cell in cells:
+        if cell is not None:
+            for i, value in enumerate(cell):
+                total[i] += value
+    return total
+
+
+def _recent_months(today: date, n: int) -> List[int]:
+    current = month_index(today)
+    return list(range(current - n + 1, current + 1))
+
+
+def popular_services(store: RollupStore, location: str, today: date, months: int = 3,
+                     limit: int = 3) -> Tuple[List[dict], int]:
+    """Most booked services in a location over the last `months` monthly cells."""
+    periods = _recent_months(today, months)
+    totals = {service: _sum_cells(store.cell(MONTH, location, service, p) for p in periods)
+              for service in store.services(location)}
+    total_bookings = int(sum(cell[COUNT] for cell in totals.values()))
+    top_count = max((cell[COUNT] for cell in totals.values()), default=0)
+    ranked = sorted(totals.items(), key=lambda item: item[1][COUNT], reverse=True)[:limit]
+    services = [
+        {
+            "service": service,
+            "popularity": round(cell[COUNT] / top_count, 2),
+            "avg_rating": round(cell[RATING_SUM] / cell[RATING_COUNT], 1) if cell[RATING_COUNT] else None,
+        }
+        for service, cell in ranked if cell[COUNT] > 0
+    ]
+    return services, total_bookings
+
+
+def _growth(current: float, previous: float) -> Optional[float]:
+    return (current - previous) / previous if previous else None
+
+
+def market_trends(store: RollupStore, location: str, today: date) -> dict:
+    """Year-over-year growth, growing services, saturation and seasonality for a location."""
+    this_year = _recent_months(today, 12)
+    last_year = [p - 12 for p in this_year]
+    recent_quarter, previous_quarter = this_year[-3:], this_year[-6:-3]
+
+    location_services = store.services(location)
+    yearly, service_growth, share = {}, [], {}
+    month_of_year = [0] * 12
+    for service in location_services:
+        current = _sum_cells(store.cell(MONTH, location, service, p) for p in this_year)
+        previous = _sum_cells(store.cell(MONTH, location, service, p) for p in last_year)
+        yearly[service] = (current[COUNT], previous[COUNT])
+        recent = _sum_cells(store.cell(MONTH, location, service, p) for p in recent_quarter)[COUNT]
+        before = _sum_cells(store.cell(MONTH, location, service, p) for p in previous_quarter)[COUNT]
+        growth = _growth(recent, before)
+        if growth is not None:
+            service_growth.append((service, growth))
+        for p in this_year + last_year:
+            cell = store.cell(MONTH, location, service, p)
+            if cell is not None:
+                month_of_year[p % 12] += cell[COUNT]
+
+    total_current = sum(current for current, _ in yearly.values())
+    total_previous = sum(previous for _, previous in yearly.values())
+    for service, (current, _) in yearly.items():
+        share[service] = current / total_current if total_current else 0.0
+
+    overall = _growth(total_current, total_previous)
+    service_growth.sort(key=lambda item: item[1], reverse=True)
+    month_names = [date(2000, m + 1, 1).strftime("%B") for m in range(12)]
+    ranked_months = sorted(range(12), key=lambda m: month_of_year[m], reverse=True)
+    has_history = any(month_of_year)
+
+    return {
+        "location": location,
+        "overall_growth": f"{overall * 100:.0f}% YoY" if overall is not None else "n/a",
+        "top_growing_services": [
+            {"service": service, "growth": f"{growth * 100:.0f}%"} for service, growth in service_growth[:3]
+        ],
+        "market_saturation": {
+            service: "High" if s >= 0.25 else "Medium" if s >= 0.1 else "Low"
+            for service, s in sorted(share.items(), key=lambda item: item[1], reverse=True)
+        },
+        "seasonal_patterns": {
+            "peak_months": [month_names[m] for m in ranked_months[:4]] if has_history else [],
+            "low_months": [month_names[m] for m in ranked_months[-2:]] if has_history else [],
+        },
+        "total_bookings_last_12_months": int(total_current),
+    }
+
+
+def period_of(tier: str, d: date) -> int:
+    day = day_index(d)
+    return day if tier == DAY else week_index(day) if tier == WEEK else month_index(d)
+
+
+def period_starts(tier: str, periods: np.ndarray) -> np.ndarray:
+    """First day of each period as datetime64[D]."""
+    periods = np.asarray(periods, dtype=np.int64)
+    if tier == MONTH:
+        return (np.datetime64("1970-01", "M") + (periods - 1970 * 12)).astype("datetime64[D]")
+    days = periods if tier == DAY else periods * 7 - 3
+    return np.datetime64("1970-01-01", "D") + days
+
+
+def rollup_columns(store: RollupStore, tier: str, locations: Optional[Set[str]] = None,
+                   services: Optional[Set[str]] = None, start: Optional[date] = None,
+                   end: Optional[date] = None) -> dict:
+    """
+    One tier's cells as columns, filtered while scanning. Locations and
+    services come back as codes into sorted name lists; `values` holds the
+    (bookings, rating_sum, rating_count, revenue) slots.
+    """
+    first = period_of(tier, start) if start is not None else None
+    last = period_of(tier, end) if end is not None else None
+    with store._lock:
+        items = [(key, cell) for key, cell in store.tiers[tier].items()
+                 if (locations is None or key[0] in locations) and (services is None or key[1] in services)
+                 and (first is None or key[2] >= first) and (last is None or key[2] <= last)]
+        values = np.array([cell for _, cell in items], dtype=np.float64).reshape(-1, 4)
+    location_names = sorted({key[0] for key, _ in items})
+    service_names = sorted({key[1] for key, _ in items})
+    location_codes = {name: i for i, name in enumerate(location_names)}
+    service_codes = {name: i for i, name in enumerate(service_names)}
+    return {
+        "location": np.array([location_codes[key[0]] for key, _ in items], dtype=np.int32),
+        "locations": location_names,
+        "service": np.array([service_codes[key[1]] for key, _ in items], dtype=np.int32),
+        "services": service_names,
+        "period": np.array([key[2] for key, _ in items], dtype=np.int64),
+        "values": values,
+    }
+
+
+rollup_store = RollupStore()
+
+
+def load_rollups():
+    global rollup_store
+    if os.path.isdir(settings.rollup_storage_path):
+        rollup_store = RollupStore.load(settings.rollup_storage_path)
+        logger.info(f"Loaded booking rollups from {settings.rollup_storage_path}")
+    return rollup_store
+
+
+def get_rollup_store() -> RollupStore:
+    return rollup_store
+
+
+def flush_rollups():
+    """Drop expired daily cells and persist all tiers."""
+    cutoff = day_index(date.today() - timedelta(days=settings.rollup_daily_retention_days))
+    rollup_store.prune_days(cutoff)
+    rollup_store.save(settings.rollup_storage_path)
+
+
+async def rollup_flush_loop():
+    """Background job persisting rollups every rollup_flush_interval_seconds."""
+    while True:
+        await asyncio.sleep(settings.rollup_flush_interval_seconds)
+        try:
+            await asyncio.to_thread(flush_rollups)
+        except Exception as e:
+            logger.error(f"Failed to flush booking rollups: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild booking rollups by replaying the event log")
+    parser.add_argument("log_path", nargs="?", default=settings.event_log_path)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=settings.log_level)
+    rebuild_rollups(args.log_path, workers=args.workers)
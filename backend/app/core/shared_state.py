@@ -0,0 +1,134 @@
+# Read-only NumPy state shared across uvicorn workers via memory-mapped files
+
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+
+
+def _generation_dir(root: str, generation: int) -> str:
+    return os.path.join(root, f"gen-{generation:08d}")
+
+
+def read_current_generation(root: str) -> Optional[int]:
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def publish(arrays: Dict[str, np.ndarray], root: Optional[str] = None,
+            metadata: Optional[dict] = None, keep_generations: int = 2) -> int:
+    """
+    Publish a new generation of read-only arrays.
+
+    Arrays are written as .npy files into a fresh generation directory, then
+    CURRENT is atomically repointed at it. Workers never see a partially
+    written generation. Older generations beyond `keep_generations` are
+    removed; workers still mapping them keep their pages until they switch.
+    """
+    root = root or settings.shared_state_path
+    os.makedirs(root, exist_ok=True)
+    generation = (read_current_generation(root) or 0) + 1
+    target = _generation_dir(root, generation)
+    staging = target + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, array in arrays.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array))
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump({"generation": generation, "arrays": sorted(arrays), "metadata": metadata or {},
+                   "published_at": time.time()}, f)
+    os.replace(staging, target)
+
+    pointer = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(pointer, "w") as f:
+        f.write(str(generation))
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+    for name in sorted(os.listdir(root)):
+        if name.startswith("gen-") and not name.endswith(".tmp"):
+            if int(name[4:]) <= generation - keep_generations:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    logger.info(f"Published shared state generation {generation} with {len(arrays)} arrays")
+    return generation
+
+
+class SharedState:
+    """One attached generation: read-only memory-mapped arrays plus metadata."""
+
+    def __init__(self, generation: int, arrays: Dict[str, np.ndarray], metadata: dict):
+        self.generation = generation
+        self.arrays = arrays
+        self.metadata = metadata
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.arrays
+
+
+class SharedStateReader:
+    """
+    Worker-side view of the published state.
+
+    Arrays are memory-mapped read-only, so every worker shares the same page
+    cache copy instead of holding its own. `current()` checks the CURRENT
+    pointer at most every `check_interval` seconds and swaps to a new
+    generation with a single reference assignment; callers holding the old
+    SharedState keep a consistent view until they drop it.
+    """
+
+    def __init__(self, root: Optional[str] = None, check_interval: Optional[float] = None):
+        self.root = root or settings.shared_state_path
+        self.check_interval = (settings.shared_state_check_interval_seconds
+                               if check_interval is None else check_interval)
+        self._state: Optional[SharedState] = None
+        self._next_check = 0.0
+
+    def _attach(self, generation: int) -> SharedState:
+        directory = _generation_dir(self.root, generation)
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                  for name in manifest["arrays"]}
+        return SharedState(generation, arrays, manifest.get("metadata", {}))
+
+    def current(self) -> Optional[SharedState]:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            generation = read_current_generation(self.root)
+            if generation is not None and (self._state is None or generation != self._state.generation):
+                try:
+                    self._state = self._attach(generation)
+                    logger.info(f"Attached shared state generation {generation}")
+                except FileNotFoundError:
+                    # Superseded and cleaned up between reading CURRENT and attaching
+                    self._next_check = 0.0
+        return self._state
+
+
+shared_state = SharedStateReader()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish .npy arrays as a new shared state generation")
+    parser.add_argument("arrays", nargs="+", help="name=path/to/array.npy")
+    args = parser.parse_args()
+    logging.basicConfig(level=settings.log_level)
+    publish({spec.split("=", 1)[0]: np.load(spec.split("=", 1)[1]) for spec in args.arrays})
@@ -0,0 +1,327 @@
+# Deterministic synthetic marketplace: customers, providers and bookings for benchmarks and training
+
+import logging
+import os
+import time
+from datetime import date
+from typing import Dict, Iterator
+
+import numpy as np
+
+from app.core.catalog import (BASE_DEMAND, BASE_DURATIONS, BASE_PRICES, COMPLEXITY_MULTIPLIERS as CATALOG_COMPLEXITY,
+                              WEEKEND_DEMAND_SURGE)
+from app.core.churn_model import LABEL_COLUMN, RAW_COLUMNS, ChurnModel, build_features
+from app.core.geo_sharding import SERVICE_BITS, SERVICE_TYPES
+from app.core.locations import location_index
+
+logger = logging.getLogger(__name__)
+
+# Relative share of customers and providers per gazetteer zone; zones not listed get DEFAULT_ZONE_SHARE
+ZONE_SHARES = {
+    "greater_noida": 0.17,
+    "noida": 0.22,
+    "delhi": 0.30,
+    "gurgaon": 0.15,
+    "ghaziabad": 0.09,
+    "faridabad": 0.07,
+}
+DEFAULT_ZONE_SHARE = 0.05
+_zone_weights = {zone_id: ZONE_SHARES.get(zone_id, DEFAULT_ZONE_SHARE) for zone_id in location_index.zones}
+# (name, latitude, longitude, share of customers and providers), in gazetteer order
+LOCATIONS = [(zone.name, zone.latitude, zone.longitude, _zone_weights[zone_id] / sum(_zone_weights.values()))
+             for zone_id, zone in location_index.zones.items()]
+LOCATION_NAMES = [name for name, _, _, _ in LOCATIONS]
+
+# Month of peak demand and peak-to-mean amplitude; e.g. HVAC in summer, painting before the festival season
+SERVICE_SEASONALITY = {
+    "House Cleaning": (10, 0.15),
+    "Plumbing Repair": (1, 0.10),
+    "Electrical Services": (6, 0.10),
+    "Interior Painting": (10, 0.35),
+    "Lawn Care": (3, 0.30),
+    "HVAC Services": (6, 0.45),
+    "Security System": (11, 0.10),
+    "Custom Furniture": (11, 0.20),
+}
+# Prices, durations, demand and complexity multipliers come from the serving catalog
+COMPLEXITY_LEVELS = list(CATALOG_COMPLEXITY)
+COMPLEXITY_MULTIPLIERS = np.array([CATALOG_COMPLEXITY[level] for level in COMPLEXITY_LEVELS])
+COMPLEXITY_SHARES = np.array([0.3, 0.5, 0.2])
+
+WEEKEND_PRICE_SURGE = 1.1
+# Share of bookings starting in each hour of the day: morning and afternoon peaks, quiet nights
+HOURLY_SHARE = np.array([0.2, 0.1, 0.1, 0.1, 0.1, 0.3, 1.0, 2.5, 4.5, 6.5, 7.5, 7.0,
+                         5.5, 5.5, 6.5, 7.0, 6.5, 5.5, 5.0, 4.0, 2.5, 1.5, 0.8, 0.4])
+
+# Stream ids so every table and chunk draws from its own independent generator
+_CUSTOMERS, _PROVIDERS, _BOOKINGS = 1, 2, 3
+
+BOOKING_COLUMNS = ("booking_id", "timestamp", "customer_id", "provider_id", "service", "location",
+                   "complexity", "price", "rating", "duration_minutes")
+
+
+def _cdf(weights: np.ndarray) -> np.ndarray:
+    cdf = np.cumsum(weights, axis=-1, dtype=np.float64)
+    cdf /= cdf[..., -1:]
+    return cdf
+
+
+class MarketplaceSimulator:
+    """
+    Reproducible synthetic marketplace.
+
+    Every table is generated in fixed-size chunks, each from its own
+    generator seeded by (seed, table, chunk), so output depends only on the
+    seed, the sizes and the chunk size, and any chunk can be regenerated on
+    its own. Generation is vectorized per chunk and only one chunk of a table
+    is held in memory at a time.
+
+    Booking demand follows the assumptions of the prediction endpoints:
+    per-service base demand with its own seasonal peak, a 1.3x weekend surge
+    and morning/afternoon hour peaks. Customer churn labels are drawn from the
+    churn model prior, so training on them reproduces its risk directions.
+    """
+
+    def __init__(self, seed: int = 42, n_customers: int = 1_000_000, n_providers: int = 50_000,
+                 start: date = date(2024, 1, 1), days: int = 365, chunk_size: int = 1_000_000):
+        self.seed = seed
+        self.n_customers = n_customers
+        self.n_providers = n_providers
+        self.start = start
+        self.days = days
+        self.chunk_size = chunk_size
+
+        # Customer activity: heavy-tailed, fixed per customer so bookings concentrate on regulars
+        activity = self._rng(_CUSTOMERS, -1).pareto(1.5, n_customers) + 1.0
+        self._customer_cdf = _cdf(activity)
+        self._customer_location = self._rng(_CUSTOMERS, -2).choice(
+            len(LOCATIONS), n_customers, p=np.array([share for *_, share in LOCATIONS])
+        ).astype(np.int8)
+
+        # Providers are laid out grouped by location, so a location's providers are a contiguous range
+        counts = np.floor(np.array([share for *_, share in LOCATIONS]) * n_providers).astype(np.int64)
+        counts[0] += n_providers - counts.sum()
+        self._provider_offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self._provider_counts = counts
+
+        # Day-of-year x service demand, with the weekend surge applied to the day weights
+        day_index = np.arange(days)
+        epoch_day = np.datetime64(start.isoformat(), "D").astype(np.int64) + day_index
+        weekday = (epoch_day + 3) % 7  # 1970-01-01 was a Thursday
+        months = np.datetime64(start.isoformat(), "D") + day_index
+        month = months.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        base = np.array([BASE_DEMAND[s] for s in SERVICE_TYPES], dtype=np.float64)
+        peaks = np.array([SERVICE_SEASONALITY[s][0] for s in SERVICE_TYPES])
+        amplitude = np.array([SERVICE_SEASONALITY[s][1] for s in SERVICE_TYPES])
+        seasonal = 1.0 + amplitude * np.cos(2 * np.pi * (month[:, None] - peaks) / 12)
+        demand = base * seasonal * np.where(weekday >= 5, WEEKEND_DEMAND_SURGE, 1.0)[:, None]
+        self._day_cdf = _cdf(demand.sum(axis=1))
+        self._service_cdf = _cdf(demand)
+        self._hour_cdf = _cdf(HOURLY_SHARE)
+        self._epoch_day = epoch_day
+        self._weekend = weekday >= 5
+
+    def _rng(self, table: int, chunk: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, table, chunk + 2])
+
+    def _chunks(self, n: int) -> Iterator[tuple]:
+        for index, begin in enumerate(range(0, n, self.chunk_size)):
+            yield index, begin, min(begin + self.chunk_size, n)
+
+    def iter_customer_chunks(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Customer aggregates in the raw churn training layout, plus a churned label."""
+        prior = ChurnModel.default()
+        for index, begin, end in self._chunks(self.n_customers):
+            rng = self._rng(_CUSTOMERS, index)
+            n = end - begin
+            bookings = rng.negative_binomial(2, 0.25, n)
+            rating = np.clip(rng.normal(4.2, 0.5, n), 1.0, 5.0).round(1)
+            recency = np.minimum(rng.exponential(30.0, n) * (1 + 2 * (bookings < 2)), self.days).astype(np.int32)
+            spent = (bookings * rng.lognormal(np.log(1800), 0.5, n)).round(2)
+            complaints = rng.poisson(0.2 + 0.8 * (rating < 3.5))
+            preferred = np.minimum(rng.binomial(3, np.minimum(bookings / 10, 0.9)), bookings)
+            columns = {
+                "customer_id": np.arange(begin, end, dtype=np.int64),
+                "location": self._customer_location[begin:end],
+                "bookings_count": bookings.astype(np.int32),
+                "avg_rating_given": rating.astype(np.float32),
+                "days_since_last_booking": recency,
+                "total_spent": spent,
+                "complaint_count": complaints.astype(np.int16),
+                "preferred_services_count": preferred.astype(np.int8),
+            }
+            p_churn = prior.predict_proba(build_features({name: columns[name] for name in RAW_COLUMNS}))
+            columns[LABEL_COLUMN] = rng.random(n) < p_churn
+            yield columns
+
+    def providers(self) -> Dict[str, np.ndarray]:
+        """Provider table in the shared-state layout used by the geo-sharded matching index."""
+        rng = self._rng(_PROVIDERS, 0)
+        n = self.n_providers
+        location = np.repeat(np.arange(len(LOCATIONS), dtype=np.int8), self._provider_counts)
+        centroids = np.array([(lat, lon) for _, lat, lon, _ in LOCATIONS])
+        # Each provider offers one to three services
+        offered = np.zeros(n, dtype=np.int16)
+        for _ in range(3):
+            pick = rng.integers(0, len(SERVICE_TYPES), n)
+            keep = (offered == 0) | (rng.random(n) < 0.4)
+            offered |= np.where(keep, np.array([SERVICE_BITS[s] for s in SERVICE_TYPES])[pick], 0).astype(np.int16)
+        return {
+            "provider_id": np.char.add("prov_", np.char.zfill(np.arange(n).astype(str), 7)),
+            "provider_name": np.char.add("Provider ", np.arange(n).astype(str)),
+            "provider_lat": centroids[location, 0] + rng.normal(0, 0.05, n),
+            "provider_lon": centroids[location, 1] + rng.normal(0, 0.05, n),
+            "provider_rating": np.clip(rng.normal(4.4, 0.35, n), 3.0, 5.0).round(1).astype(np.float32),
+            "provider_experience": np.minimum(rng.gamma(2.0, 3.0, n), 30).astype(np.int16),
+            "provider_services": offered,
+            "provider_price": (rng.lognormal(np.log(1500), 0.4, n)).astype(np.int32),
+            "provider_location": location,
+        }
+
+    def iter_booking_chunks(self, n_bookings: int) -> Iterator[Dict[str, np.ndarray]]:
+        """Booking events; rows within a chunk are not time-ordered."""
+        service_base_price = np.array([BASE_PRICES[s] for s in SERVICE_TYPES], dtype=np.float64)
+        service_duration = np.array([BASE_DURATIONS[s] for s in SERVICE_TYPES], dtype=np.float64)
+        provider_experience = self.providers()["provider_experience"] if self.n_providers else None
+        for index, begin, end in self._chunks(n_bookings):
+            rng = self._rng(_BOOKINGS, index)
+            n = end - begin
+            day = np.searchsorted(self._day_cdf, rng.random(n), side="right")
+            service_cdf = self._service_cdf[day]
+            service = (service_cdf < rng.random(n)[:, None]).sum(axis=1).astype(np.int8)
+            hour = np.searchsorted(self._hour_cdf, rng.random(n), side="right")
+            timestamp = (self._epoch_day[day] * 86400 + hour * 3600 + rng.integers(0, 3600, n)).astype(np.int64)
+
+            customer = np.searchsorted(self._customer_cdf, rng.random(n), side="right")
+            location = self._customer_location[customer]
+            provider = (self._provider_offsets[location]
+                        + (rng.random(n) * self._provider_counts[location]).astype(np.int64))
+
+            complexity = np.searchsorted(_cdf(COMPLEXITY_SHARES), rng.random(n), side="right").astype(np.int8)
+            weekend = self._weekend[day]
+            price = (service_base_price[service] * COMPLEXITY_MULTIPLIERS[complexity]
+                     * np.where(weekend, WEEKEND_PRICE_SURGE, 1.0) * rng.lognormal(0.0, 0.15, n))
+            experience = provider_experience[provider] if provider_experience is not None else 5
+            duration = (service_duration[service] * COMPLEXITY_MULTIPLIERS[complexity]
+                        * np.maximum(0.7, 1.2 - experience * 0.03) * rng.lognormal(0.0, 0.12, n))
+            yield {
+                "booking_id": np.arange(begin, end, dtype=np.int64),
+                "timestamp": timestamp,
+                "customer_id": customer.astype(np.int64),
+                "provider_id": provider.astype(np.int32),
+                "service": service,
+                "location": location,
+                "complexity": complexity,
+                "price": price.round(2).astype(np.float32),
+                "rating": np.clip(rng.normal(4.3, 0.6, n), 1.0, 5.0).round(1).astype(np.float32),
+                "duration_minutes": np.clip(duration, 30, 480).astype(np.int16),
+            }
+
+
+def write_npy(chunks: Iterator[Dict[str, np.ndarray]], directory: str, n_rows: int) -> int:
+    """
+    Stream chunks into one .npy file per column.
+
+    Each file gets a header for its final length up front and chunks are
+    appended as raw bytes, so memory use stays at one chunk however large
+    the table is.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    written = 0
+    try:
+        for chunk in chunks:
+            n = len(next(iter(chunk.values())))
+            for name, values in chunk.items():
+                if name not in files:
+                    files[name] = open(os.path.join(directory, f"{name}.npy"), "wb")
+                    header = np.lib.format.header_data_from_array_1_0(values)
+                    header["shape"] = (n_rows,) + values.shape[1:]
+                    np.lib.format.write_array_header_2_0(files[name], header)
+                files[name].write(np.ascontiguousarray(values).tobytes())
+            written += n
+    finally:
+        for f in files.values():
+            f.close()
+    if written != n_rows:
+        raise ValueError(f"Expected {n_rows} rows in {directory}, got {written}")
+    return written
+
+
+def write_parquet(chunks: Iterator[Dict[str, np.ndarray]], path: str) -> int:
+    """Stream chunks into a Parquet file, one row group per chunk (requires pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet output requires pyarrow; install it or use the npy format") from e
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    writer = None
+    written = 0
+    try:
+        for chunk in chunks:
+            table = pa.table(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+            writer.write_table(table)
+            written += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def generate(output_dir: str, n_bookings: int = 10_000_000, n_customers: int = 1_000_000,
+             n_providers: int = 50_000, seed: int = 42, output_format: str = "npy",
+             chunk_size: int = 1_000_000, start: date = date(2024, 1, 1), days: int = 365) -> dict:
+    """
+    Write a full synthetic marketplace under output_dir.
+
+    customers/ holds per-column .npy files in the layout train_churn_model
+    reads; providers/ holds the provider arrays the matching index publishes;
+    bookings/ (npy) or bookings.parquet holds the booking events.
+    """
+    simulator = MarketplaceSimulator(seed=seed, n_customers=n_customers, n_providers=n_providers,
+                                     start=start, days=days, chunk_size=chunk_size)
+    durations = {}
+    started = time.perf_counter()
+    write_npy(simulator.iter_customer_chunks(), os.path.join(output_dir, "customers"), n_customers)
+    durations["customers"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    providers = simulator.providers()
+    write_npy(iter([providers]), os.path.join(output_dir, "providers"), n_providers)
+    durations["providers"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if output_format == "parquet":
+        write_parquet(simulator.iter_booking_chunks(n_bookings), os.path.join(output_dir, "bookings.parquet"))
+    else:
+        write_npy(simulator.iter_booking_chunks(n_bookings), os.path.join(output_dir, "bookings"), n_bookings)
+    durations["bookings"] = time.perf_counter() - started
+
+    logger.info(f"Generated {n_customers:,} customers, {n_providers:,} providers and "
+                f"{n_bookings:,} bookings in {output_dir}")
+    return {"customers": n_customers, "providers": n_providers, "bookings": n_bookings,
+            "seconds": {stage: round(seconds, 2) for stage, seconds in durations.items()}}
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic marketplace dataset")
+    parser.add_argument("output_dir")
+    parser.add_argument("--bookings", type=int, default=10_000_000)
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--providers", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    args = parser.parse_args()
+    logging.basicConfig(level=settings.log_level)
+    print(json.dumps(generate(args.output_dir, args.bookings, args.customers, args.providers, args.seed,
+                              args.format, args.chunk_size)))
@@ -0,0 +1,190 @@
+# Streaming trending-services detection over rolling time windows
+
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter counter with a stream-summary layout.
+
+    Keeps at most `capacity` keys. Counts are grouped into buckets so that
+    incrementing a key and evicting the minimum are both O(1).
+    """
+
+    __slots__ = ("capacity", "counts", "buckets", "min_count", "total")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.buckets: Dict[int, set] = {}
+        self.min_count = 0
+        self.total = 0
+
+    def _move(self, key: str, old: int, new: int):
+        bucket = self.buckets[old]
+        bucket.discard(key)
+        if not bucket:
+            del self.buckets[old]
+            if old == self.min_count:
+                self.min_count = new
+        self.buckets.setdefault(new, set()).add(key)
+        self.counts[key] = new
+
+    def add(self, key: str):
+        self.total += 1
+        count = self.counts.get(key)
+        if count is not None:
+            self._move(key, count, count + 1)
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = 1
+            self.buckets.setdefault(1, set()).add(key)
+            self.min_count = 1
+        else:
+            # Replace a minimum key; its count becomes the new key's error bound
+            victim = next(iter(self.buckets[self.min_count]))
+            count = self.counts.pop(victim)
+            self.buckets[count].discard(victim)
+            self.counts[key] = count
+            self._move(key, count, count + 1)
+
+    def reset(self):
+        self.counts.clear()
+        self.buckets.clear()
+        self.min_count = 0
+        self.total = 0
+
+
+class _WindowedCounter:
+    """Ring of per-bucket Space-Saving counters for one scope (global or a location)."""
+
+    __slots__ = ("bucket_ids", "counters")
+
+    def __init__(self, num_buckets: int, capacity: int):
+        self.bucket_ids = [-1] * num_buckets
+        self.counters = [SpaceSaving(capacity) for _ in range(num_buckets)]
+
+    def add(self, bucket_id: int, key: str):
+        slot = bucket_id % len(self.counters)
+        if self.bucket_ids[slot] != bucket_id:
+            self.counters[slot].reset()
+            self.bucket_ids[slot] = bucket_id
+        self.counters[slot].add(key)
+
+    def merge(self, first_bucket: int, last_bucket: int, decay: float) -> Tuple[Dict[str, float], float]:
+        """Decayed counts and total over buckets in [first_bucket, last_bucket]."""
+        merged: Dict[str, float] = {}
+        total = 0.0
+        for bucket_id, counter in zip(self.bucket_ids, self.counters):
+            if not first_bucket <= bucket_id <= last_bucket:
+                continue
+            weight = decay ** (last_bucket - bucket_id)
+            total += counter.total * weight
+            for key, count in counter.counts.items():
+                merged[key] = merged.get(key, 0.0) + count * weight
+        return merged, total
+
+
+class TrendTracker:
+    """
+    Rolling-window trend detection over the booking stream.
+
+    Every booking is counted in a per-bucket sketch for its location and for
+    the global scope. A service's trend compares its share of the current
+    window with its share of the preceding baseline window, smoothed with
+    add-k pseudo-counts; with no baseline bookings at all nothing trends.
+    """
+
+    def __init__(self, bucket_seconds: int, window_buckets: int, baseline_buckets: int,
+                 capacity: int, decay: float, max_locations: int, cache_seconds: float,
+                 baseline_smoothing: float = 1.0):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.baseline_buckets = baseline_buckets
+        self.capacity = capacity
+        self.decay = decay
+        self.max_locations = max_locations
+        self.cache_seconds = cache_seconds
+        self.baseline_smoothing = baseline_smoothing
+        self._scopes: Dict[Optional[str], _WindowedCounter] = {None: self._new_scope()}
+        self._cache: Dict[Tuple[Optional[str], int], Tuple[float, List[dict], int]] = {}
+        self._lock = threading.Lock()
+
+    def _new_scope(self) -> _WindowedCounter:
+        return _WindowedCounter(self.window_buckets + self.baseline_buckets, self.capacity)
+
+    def record(self, service: str, location: Optional[str] = None, timestamp: Optional[float] = None):
+        """Count one booking. O(1) per event."""
+        bucket_id = int((timestamp if timestamp is not None else time.time()) // self.bucket_seconds)
+        with self._lock:
+            self._scopes[None].add(bucket_id, service)
+            if location:
+                scope = self._scopes.get(location)
+                if scope is None and len(self._scopes) <= self.max_locations:
+                    scope = self._scopes[location] = self._new_scope()
+                if scope is not None:
+                    scope.add(bucket_id, service)
+
+    def record_many(self, events: Iterable[Tuple[str, Optional[str], Optional[float]]]):
+        for service, location, timestamp in events:
+            self.record(service, location, timestamp)
+
+    def trending(self, location: Optional[str] = None, limit: int = 5,
+                 now: Optional[float] = None) -> Tuple[List[dict], int]:
+        """Top trending services and the number of bookings in the current window."""
+        now = now if now is not None else time.time()
+        key = (location, limit)
+        cached = self._cache.get(key)
+        if cached is not None and now - cached[0] < self.cache_seconds:
+            return cached[1], cached[2]
+
+        current_bucket = int(now // self.bucket_seconds)
+        window_start = current_bucket - self.window_buckets + 1
+        with self._lock:
+            scope = self._scopes.get(location)
+            if scope is None:
+                return [], 0
+            current, current_total = scope.merge(window_start, current_bucket, self.decay)
+            baseline, baseline_total = scope.merge(
+                window_start - self.baseline_buckets, window_start - 1, 1.0)
+
+        # No baseline yet (fresh start, new location): nothing to compare against, so nothing trends
+        if not baseline_total:
+            self._cache[key] = (now, [], int(current_total))
+            return [], int(current_total)
+
+        # Add-k smoothing keeps services absent from the baseline from reading as infinite growth
+        k = self.baseline_smoothing
+        vocabulary = len(current.keys() | baseline.keys())
+        results = []
+        for service, count in current.items():
+            share = count / current_total
+            baseline_share = (baseline.get(service, 0.0) + k) / (baseline_total + k * vocabulary)
+            increase = (share - baseline_share) / baseline_share
+            score = share / (share + baseline_share)
+            results.append((score, count, {
+                "service_name": service,
+                "trend_score": round(score, 2),
+                "booking_increase": f"{increase * 100:+.0f}%",
+                "reason": f"{share * 100:.0f}% of recent bookings vs {baseline_share * 100:.0f}% in the baseline period",
+            }))
+        results.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        results = [r[2] for r in results[:limit]]
+        data_points = int(current_total)
+        self._cache[key] = (now, results, data_points)
+        return results, data_points
+
+
+trend_tracker = TrendTracker(
+    bucket_seconds=settings.trending_bucket_seconds,
+    window_buckets=settings.trending_window_buckets,
+    baseline_buckets=settings.trending_baseline_buckets,
+    capacity=settings.trending_sketch_capacity,
+    decay=settings.trending_decay,
+    max_locations=settings.trending_max_locations,
+    cache_seconds=settings.trending_cache_seconds,
+    baseline_smoothing=settings.trending_baseline_smoothing,
+)
@@ -0,0 +1,68 @@
+# Admin API: runtime profiling, retraining and recommendation candidate controls
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
+from pydantic import BaseModel
+import asyncio
+
+from app.core.candidates import candidate_store
+from app.core.profiling import profiler
+from app.core.retraining import MODELS, retrain_scheduler
+
+router = APIRouter()
+
+class ProfilingUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = None
+
+@router.get("/profiling")
+async def get_profiling_status():
+    """Current profiling switches and the number of samples not yet dumped."""
+    return profiler.status()
+
+@router.put("/profiling")
+async def update_profiling(update: ProfilingUpdate):
+    """Enable, disable or re-tune request sampling without a restart."""
+    profiler.configure(enabled=update.enabled, sample_rate=update.sample_rate)
+    return profiler.status()
+
+@router.post("/profiling/capture")
+async def capture_profile(seconds: float = Query(10.0, gt=0, le=300)):
+    """Sample every request for a time window and write a collapsed-stack (flamegraph) file."""
+    was_enabled = profiler.enabled
+    profiler.capture(seconds)
+    await asyncio.sleep(seconds)
+    result = profiler.dump()
+    if not was_enabled:
+        profiler.configure(enabled=False)
+    return result
+
+@router.get("/retraining")
+async def get_retraining_status():
+    """Whether a retrain is running, plus per-model reports and stage durations of recent runs."""
+    return retrain_scheduler.status()
+
+@router.post("/retraining/run", status_code=202)
+async def run_retraining(models: Optional[List[str]] = Query(None)):
+    """Start a retrain in the background worker process now."""
+    unknown = [name for name in models or [] if name not in MODELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown models: {', '.join(unknown)}")
+    try:
+        retrain_scheduler.start(models)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "models": models or list(MODELS)}
+
+@router.get("/candidates")
+async def get_candidates_status():
+    """Current candidate table generation, its size and the users waiting for a refresh."""
+    return {**candidate_store.status(), "building": candidate_store.building}
+
+@router.post("/candidates/build")
+async def build_candidates(workers: Optional[int] = Query(None, ge=1)):
+    """Rebuild the per-user candidate table over a process pool; returns stage timings and table size."""
+    try:
+        return await asyncio.to_thread(candidate_store.rebuild, workers=workers)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -1,11 +1,20 @@
-from fastapi import APIRouter
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime
+from typing import List, Optional
 import random
 
-router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
+import numpy as np
 
-@router.get("/real-time-metrics")
-async def get_real_time_metrics():
+from app.core.etags import ConditionalRoute, conditional
+from app.core.exports import Categorical, export_response, project
+from app.core.locations import location_index
+from app.core.metrics_stream import create_broadcaster
+from app.core.rollups import COUNT, RATING_COUNT, RATING_SUM, REVENUE, get_rollup_store, period_starts, rollup_columns
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"], route_class=ConditionalRoute)
+
+def build_real_time_metrics():
     return {
         "active_bookings": random.randint(45, 85),
         "revenue_today": random.randint(15000, 45000),
@@ -30,4 +39,79 @@ async def get_real_time_metrics():
                 "timestamp": datetime.now().isoformat()
             }
         ]
-    }
\ No newline at end of file
+    }
+# One snapshot per tick, shared by every streaming client
+metrics_broadcaster = create_broadcaster(build_real_time_metrics)
+
+@router.get("/real-time-metrics")
+async def get_real_time_metrics():
+    return build_real_time_metrics()
+
+@router.get("/real-time-metrics/stream")
+async def stream_real_time_metrics(request: Request):
+    """Server-Sent Events stream: a full snapshot, then per-tick deltas."""
+    subscriber = metrics_broadcaster.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                frame = await subscriber.next()
+                yield frame.sse
+        finally:
+            metrics_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/real-time-metrics/ws")
+async def websocket_real_time_metrics(websocket: WebSocket):
+    """WebSocket stream carrying the same snapshot and delta frames as the SSE endpoint."""
+    await websocket.accept()
+    subscriber = metrics_broadcaster.subscribe()
+    try:
+        while True:
+            frame = await subscriber.next()
+            await websocket.send_text(frame.text)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        metrics_broadcaster.unsubscribe(subscriber)
+
+ROLLUP_EXPORT_COLUMNS = ("location", "service", "period_start", "bookings", "avg_rating", "revenue")
+
+@router.get("/rollups/export")
+@conditional(lambda: get_rollup_store().version)
+async def export_location_rollups(
+    tier: str = Query("month", pattern="^(day|week|month)$"),
+    fmt: str = Query("arrow", alias="format", pattern="^(arrow|parquet)$"),
+    columns: Optional[str] = None,
+    location: Optional[List[str]] = Query(None),
+    service: Optional[List[str]] = Query(None),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """
+    Booking rollups of one tier as Arrow IPC or Parquet, one row per
+    location x service x period. Filters are applied while scanning the
+    rollup cells; `columns` is a comma-separated projection.
+    """
+    try:
+        projection = project(columns, ROLLUP_EXPORT_COLUMNS)
+        locations = {location_index.canonical(name) for name in location} if location else None
+        cells = rollup_columns(get_rollup_store(), tier, locations, set(service) if service else None, start, end)
+        values = cells["values"]
+        builders = {
+            "location": lambda: Categorical(cells["location"], cells["locations"]),
+            "service": lambda: Categorical(cells["service"], cells["services"]),
+            "period_start": lambda: period_starts(tier, cells["period"]),
+            "bookings": lambda: values[:, COUNT].astype(np.int64),
+            "avg_rating": lambda: np.divide(values[:, RATING_SUM], values[:, RATING_COUNT],
+                                            out=np.full(len(values), np.nan), where=values[:, RATING_COUNT] > 0),
+            "revenue": lambda: values[:, REVENUE],
+        }
+        batch = {name: builders[name]() for name in projection}
+        return export_response(iter([batch]), fmt, f"rollups_{tier}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
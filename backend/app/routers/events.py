@@ -0,0 +1,88 @@
+# Events API: append to the event log, replay it from any offset and track consumer offsets
+
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Literal, Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+from app.core.event_log import EVENT_TYPES, event_log
+from app.core.ingestion import REQUIRED_FIELDS, consumer_status, ingest
+from app.core.locations import location_index
+
+router = APIRouter()
+
+class LogEvent(BaseModel):
+    type: Literal["booking", "rating", "complaint", "provider_status"]
+    timestamp: Optional[datetime] = None
+    service: Optional[str] = None
+    location: Optional[str] = None
+    customer_id: Optional[str] = None
+    provider_id: Optional[str] = None
+    price: Optional[float] = None
+    rating: Optional[float] = None
+    status: Optional[str] = None
+    reason: Optional[str] = None
+
+class OffsetCommit(BaseModel):
+    offset: int
+
+def log_record(event: LogEvent) -> tuple:
+    """(type, fields) as stored in the log: canonical location, ISO timestamp, unset fields dropped."""
+    fields = event.model_dump(exclude={"type"}, exclude_none=True)
+    missing = [name for name in REQUIRED_FIELDS[event.type] if name not in fields]
+    if missing:
+        raise ValueError(f"{event.type} events need {', '.join(missing)}")
+    if "location" in fields:
+        fields["location"] = location_index.canonical(fields["location"]) or fields["location"]
+    fields["timestamp"] = (event.timestamp or datetime.now()).isoformat()
+    return event.type, fields
+
+@router.post("")
+async def append_events(events: List[LogEvent]):
+    """Append events; returns once they are fsynced and applied to rollups, trends and pricing."""
+    try:
+        records = [log_record(event) for event in events]
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    offsets = await ingest(records)
+    return {"appended": len(offsets), "first_offset": offsets[0] if offsets else None,
+            "next_offset": offsets[-1] + 1 if offsets else event_log.end_offset}
+
+@router.get("")
+async def read_events(offset: int = Query(0, ge=0), limit: int = Query(1000, ge=1, le=10_000),
+                      types: Optional[str] = None):
+    """
+    Replay events from `offset`. Pass next_offset back to continue; types
+    is a comma-separated filter over booking, rating, complaint and
+    provider_status.
+    """
+    wanted = None
+    if types:
+        wanted = {name.strip() for name in types.split(",") if name.strip()}
+        unknown = wanted - set(EVENT_TYPES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown event types: {', '.join(sorted(unknown))}")
+    records, next_offset = event_log.read(offset, limit, wanted)
+    return {"events": [{"offset": record_offset, **event} for record_offset, event in records],
+            "next_offset": next_offset}
+
+@router.get("/status")
+async def get_event_log_status():
+    """Offsets, segments and size of the log, and each consumer's position and lag."""
+    return {**event_log.status(), "consumers": consumer_status()}
+
+@router.get("/consumers/{consumer}")
+async def get_consumer_offset(consumer: str):
+    """The offset an external consumer last committed."""
+    offset = event_log.committed_offset(consumer)
+    if offset is None:
+        raise HTTPException(status_code=404, detail=f"No committed offset for {consumer}")
+    return {"consumer": consumer, "offset": offset}
+
+@router.put("/consumers/{consumer}")
+async def commit_consumer_offset(consumer: str, commit: OffsetCommit):
+    """Commit an external consumer's offset: the next record it has not yet processed."""
+    if not 0 <= commit.offset <= event_log.end_offset:
+        raise HTTPException(status_code=400, detail=f"Offset must be between 0 and {event_log.end_offset}")
+    event_log.commit_offset(consumer, commit.offset)
+    return {"consumer": consumer, "offset": commit.offset}
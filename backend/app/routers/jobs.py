@@ -0,0 +1,92 @@
+# Jobs API: submit, track and fetch long-running forecasts and bulk scoring
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from pydantic import BaseModel, ValidationError
+import asyncio
+
+from app.core.jobs import FINISHED, job_queue, job_types
+
+router = APIRouter()
+
+class JobSubmission(BaseModel):
+    job_type: str
+    params: dict
+
+def _job_or_404(job_id: str) -> dict:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@router.post("", status_code=202)
+async def submit_job(submission: JobSubmission):
+    """Queue a job and return its id; poll GET /jobs/{job_id} for progress."""
+    if submission.job_type not in job_types:
+        raise HTTPException(status_code=400, detail=(
+            f"Unknown job type {submission.job_type}; expected one of {', '.join(job_types)}"))
+    try:
+        return job_queue.submit(submission.job_type, submission.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+@router.get("")
+async def list_jobs(status: Optional[str] = None, job_type: Optional[str] = None,
+                    limit: int = Query(100, ge=1, le=1000)):
+    """Most recent jobs first."""
+    return job_queue.list(status=status, job_type=job_type, limit=limit)
+
+@router.get("/status")
+async def get_job_queue_status():
+    """Worker pool size, jobs per status and per-type limits."""
+    return job_queue.status()
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of a job."""
+    return _job_or_404(job_id)
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; chunks already written stay readable."""
+    _job_or_404(job_id)
+    return job_queue.cancel(job_id)
+
+@router.get("/{job_id}/results/{chunk}")
+async def get_job_result_chunk(job_id: str, chunk: int):
+    """One result chunk, a JSON array, as soon as it is written."""
+    job = _job_or_404(job_id)
+    if not 0 <= chunk < job["chunks"]:
+        raise HTTPException(status_code=404, detail=f"Chunk {chunk} of job {job_id} is not ready")
+    with open(job_queue.chunk_path(job_id, chunk), "rb") as f:
+        return Response(content=f.read(), media_type="application/json")
+
+@router.get("/{job_id}/results")
+async def stream_job_results(job_id: str, follow: bool = False):
+    """
+    All results as one JSON array, streamed chunk by chunk.
+
+    With follow=true the stream stays open and picks up new chunks until the
+    job finishes; otherwise it ends with the chunks written so far.
+    """
+    _job_or_404(job_id)
+
+    async def body():
+        yield b"["
+        written, separator = 0, b""
+        while True:
+            for chunk in job_queue.iter_chunks(job_id, start=written):
+                # Splice chunk arrays into one array: drop their brackets and join with commas
+                items = chunk.strip()[1:-1]
+                if items:
+                    yield separator + items
+                    separator = b","
+                written += 1
+            job = job_queue.get(job_id)
+            if not follow or (job["status"] in FINISHED and job["chunks"] <= written):
+                break
+            await asyncio.sleep(job_queue.poll_interval)
+        yield b"]"
+
+    return StreamingResponse(body(), media_type="application/json")
@@ -1,11 +1,30 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
-from pydantic import BaseModel
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import Dict, Iterator, List, Optional
+from pydantic import BaseModel, Field
+from datetime import date, datetime, timedelta
+import json
 import logging
+import math
+import os
+import random
+import numpy as np
+
+from app.core.catalog import BASE_DEMAND, BASE_DURATIONS, COMPLEXITY_MULTIPLIERS, WEEKEND_DEMAND_SURGE
+from app.core.churn_model import (FACTOR_LABELS, FEATURE_NAMES, MAX_KEY_FACTORS, MIN_FACTOR_CONTRIBUTION,
+                                  RAW_COLUMNS, build_features, get_churn_model, top_factors)
+from app.core.config import settings
+from app.core.etags import ConditionalRoute, conditional, today
+from app.core.exports import Batch, Categorical, export_response, project
+from app.core.fast_validation import BatchDecoder, encode_records
+from app.core.jobs import register_job_type
+from app.core.locations import location_index
+from app.core.profiling import profiled, stage
+from app.core.retraining import get_published_model, published_version
+from app.core.rollups import get_rollup_store, market_trends
+from app.core.simulator import LOCATION_NAMES
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=ConditionalRoute)
 
 # Pydantic models
 class DurationPredictionRequest(BaseModel):
@@ -21,6 +40,7 @@ class DurationPredictionResponse(BaseModel):
     confidence_score: float
     factors_considered: List[str]
     duration_range: dict  # min, max
+    factor_contributions: Optional[Dict[str, float]] = None  # log-minutes, top factors only
 
 class ChurnPredictionRequest(BaseModel):
     customer_id: str
@@ -37,12 +57,13 @@ class ChurnPredictionResponse(BaseModel):
     risk_level: str  # low, medium, high
     key_factors: List[str]
     recommended_actions: List[str]
+    factor_contributions: Optional[Dict[str, float]] = None  # log-odds, top factors only
 
 class DemandPredictionRequest(BaseModel):
     service_type: str
     location: str
     prediction_date: datetime
-    time_horizon_days: Optional[int] = 7
+    time_horizon_days: int = Field(7, ge=1)
 
 class DemandPredictionResponse(BaseModel):
     service_type: str
@@ -51,271 +72,550 @@ class DemandPredictionResponse(BaseModel):
     peak_times: List[str]
     seasonal_factors: dict
 
+def _request_columns(requests: list) -> dict:
+    """Struct-of-arrays view of already-validated request models."""
+    return {name: [getattr(r, name) for r in requests] for name in type(requests[0]).model_fields}
+
+TIME_OF_DAY_FACTORS = {"morning": 1.0, "afternoon": 1.1, "evening": 0.9}
+AREA_BASED_SERVICES = ("House Cleaning", "Interior Painting")
+DEFAULT_BASE_DURATION = 120
+DURATION_FACTORS = ["service_type", "complexity", "provider_experience", "area_sqft", "time_of_day"]
+MIN_DURATION_CONTRIBUTION = 0.01  # in log-minutes, about 1%
+DURATION_RESPONSE_FIELDS = list(DurationPredictionResponse.model_fields)
+_duration_batch_decoder = BatchDecoder(DurationPredictionRequest)
+
+def _describe_duration_factor(name: str, value, contribution: float) -> str:
+    change = f"{math.expm1(contribution):+.0%}"
+    if name == "provider_experience":
+        return f"Provider experience: {value} years ({change})"
+    if name == "area_sqft":
+        return f"Area: {value} sq ft ({change})"
+    return f"{name.replace('_', ' ').capitalize()}: {value} ({change})"
+
+def _explain(names: List[str], contributions: np.ndarray, top_n: int, by_magnitude: bool = False):
+    """Top-N (feature indices, contributions) per row, and their {feature: contribution} dicts."""
+    idx, values = top_factors(np.abs(contributions) if by_magnitude else contributions, top_n)
+    if by_magnitude:
+        values = np.take_along_axis(contributions, idx, axis=1)
+    idx, values = idx.tolist(), np.round(values, 3).tolist()
+    return idx, values, [{names[j]: value for j, value in zip(row_idx, row_values)}
+                         for row_idx, row_values in zip(idx, values)]
+
+def _duration_factors(service_types: list, complexities: list, experience: np.ndarray):
+    """
+    Service, complexity and experience multipliers. From the published
+    log-linear duration model when there is one (service durations for
+    unknown services stay at the default), otherwise the catalog rules.
+    """
+    published = get_published_model("duration")
+    if published is None:
+        base = np.array([BASE_DURATIONS.get(s, DEFAULT_BASE_DURATION) for s in service_types], dtype=np.float64)
+        complexity = np.array([COMPLEXITY_MULTIPLIERS[c] for c in complexities], dtype=np.float64)
+        return base, complexity, np.maximum(0.7, 1.2 - (experience * 0.03))
+    arrays, meta = published
+    # Features: one-hot service, low, high, experience / 10 and its square (see DurationTrainer)
+    coefficients = arrays["coefficients"]
+    services = {name: i for i, name in enumerate(meta["services"])}
+    n_services = len(services)
+    base = np.array([math.exp(coefficients[services[s]]) if s in services else DEFAULT_BASE_DURATION
+                     for s in service_types], dtype=np.float64)
+    by_complexity = {"low": math.exp(coefficients[n_services]), "medium": 1.0,
+                     "high": math.exp(coefficients[n_services + 1])}
+    complexity = np.array([by_complexity[c] for c in complexities], dtype=np.float64)
+    scaled = experience / 10
+    experience_factor = np.exp(coefficients[n_services + 2] * scaled + coefficients[n_services + 3] * scaled ** 2)
+    return base, complexity, experience_factor
+
+def _estimate_durations(columns: dict, explain: bool = False, top_n: int = MAX_KEY_FACTORS) -> dict:
+    """
+    Duration estimate for a batch of requests (request columns), vectorized over rows.
+
+    The estimate is a product of per-factor multipliers, so each factor's
+    contribution is its log multiplier (relative to a 120 minute medium
+    job). Service, complexity and experience come from the retrained
+    model once one is published; area and time of day are not in the
+    booking data and stay rule-based. With explain, factors_considered
+    names the top_n factors moving the estimate most and
+    factor_contributions carries their values.
+    """
+    service_types = columns["service_type"]
+    complexities = columns["complexity"]
+    experiences = columns["provider_experience"]
+    areas = columns["area_sqft"]
+    n = len(service_types)
+
+    # Per-factor multipliers, one column each
+    experience = np.array(experiences, dtype=np.float64)
+    base, complexity, experience_factor = _duration_factors(service_types, complexities, experience)
+    # Area factor (normalized to an average 1200 sq ft, bounded) for area-based services only
+    uses_area = np.array([bool(a) and s in AREA_BASED_SERVICES for a, s in zip(areas, service_types)], dtype=bool)
+    area_factor = np.ones(n)
+    if uses_area.any():
+        area = np.array([a if used else 0.0 for a, used in zip(areas, uses_area)], dtype=np.float64)
+        area_factor[uses_area] = 0.8 + (area[uses_area] / 1200) * 0.4
+    time_factor = np.array([TIME_OF_DAY_FACTORS[t] for t in columns["time_of_day"]], dtype=np.float64)
+
+    duration = base * complexity
+    duration *= experience_factor
+    duration[uses_area] *= area_factor[uses_area]
+    duration *= time_factor
+
+    # Ensure reasonable bounds: 30 min to 8 hours
+    minutes = np.clip(np.trunc(duration), 30, 480).astype(np.int64)
+    range_min = np.maximum(30, np.trunc(minutes * 0.8).astype(np.int64)).tolist()
+    range_max = np.minimum(480, np.trunc(minutes * 1.3).astype(np.int64)).tolist()
+
+    # Confidence reflects data quality
+    high_complexity = np.array([c == "high" for c in complexities], dtype=bool)
+    confidence = 0.85 - np.where(experience < 2, 0.1, 0) - np.where(high_complexity, 0.05, 0)
+
+    estimated = {
+        "estimated_duration_minutes": minutes.tolist(),
+        "confidence_score": np.round(confidence, 2).tolist(),
+        "factors_considered": [[] for _ in range(n)],
+        "duration_range": [{"min": lo, "max": hi} for lo, hi in zip(range_min, range_max)],
+    }
+    if explain:
+        contributions = np.log(np.column_stack(
+            [base / DEFAULT_BASE_DURATION, complexity, experience_factor, area_factor, time_factor]))
+        idx, values, estimated["factor_contributions"] = _explain(DURATION_FACTORS, contributions, top_n,
+                                                                  by_magnitude=True)
+        # Strings only for the top factors of each row; most repeat, so each is rendered once
+        rendered = {}
+        factors = []
+        for row, (row_idx, row_values) in enumerate(zip(idx, values)):
+            described = []
+            for j, value in zip(row_idx, row_values):
+                if abs(value) >= MIN_DURATION_CONTRIBUTION:
+                    key = (j, columns[DURATION_FACTORS[j]][row], value)
+                    text = rendered.get(key)
+                    if text is None:
+                        text = rendered[key] = _describe_duration_factor(DURATION_FACTORS[j], key[1], value)
+                    described.append(text)
+            factors.append(described)
+        estimated["factors_considered"] = factors
+    return estimated
+
 @router.post("/duration", response_model=DurationPredictionResponse)
-async def predict_service_duration(request: DurationPredictionRequest):
+@profiled
+async def predict_service_duration(request: DurationPredictionRequest, explain: bool = True,
+                                   top_factors: int = Query(MAX_KEY_FACTORS, ge=1, le=len(DURATION_FACTORS))):
     """
     Predict how long a service will take based on various factors.
     
     Uses machine learning to analyze historical data and predict
-    service duration with confidence intervals.
+    service duration with confidence intervals. With explain=false the
+    factor breakdown is skipped.
     """
     try:
-        # Mock ML prediction logic
-        base_durations = {
-            "House Cleaning": 120,
-            "Plumbing Repair": 90,
-            "Electrical Services": 100,
-            "Interior Painting": 240,
-            "Lawn Care": 80,
-            "Custom Furniture": 300,
-            "HVAC Services": 150,
-            "Security System": 180
-        }
-        
-        base_duration = base_durations.get(request.service_type, 120)
-        
-        # Apply complexity multiplier
-        complexity_multipliers = {"low": 0.8, "medium": 1.0, "high": 1.5}
-        duration = base_duration * complexity_multipliers[request.complexity]
-        
-        # Apply experience factor
-        experience_factor = max(0.7, 1.2 - (request.provider_experience * 0.03))
-        duration *= experience_factor
-        
-        # Apply area factor
-        if request.area_sqft and request.service_type in ["House Cleaning", "Interior Painting"]:
-            area_factor = request.area_sqft / 1200  # Normalize to average
-            duration *= (0.8 + area_factor * 0.4)  # Bounded factor
-        
-        # Time of day factor
-        time_factors = {"morning": 1.0, "afternoon": 1.1, "evening": 0.9}
-        duration *= time_factors[request.time_of_day]
-        
-        # Ensure reasonable bounds
-        duration = max(30, min(480, int(duration)))  # 30 min to 8 hours
-        
-        # Calculate confidence based on data quality
-        confidence = 0.85 - (0.1 if request.provider_experience < 2 else 0) - \
-                    (0.05 if request.complexity == "high" else 0)
-        
-        factors_considered = [
-            f"Service type: {request.service_type}",
-            f"Complexity: {request.complexity}",
-            f"Provider experience: {request.provider_experience} years",
-            f"Time of day: {request.time_of_day}"
-        ]
-        
-        if request.area_sqft:
-            factors_considered.append(f"Area: {request.area_sqft} sq ft")
-        
-        duration_range = {
-            "min": max(30, int(duration * 0.8)),
-            "max": min(480, int(duration * 1.3))
-        }
-        
-        return DurationPredictionResponse(
-            estimated_duration_minutes=duration,
-            confidence_score=round(confidence, 2),
-            factors_considered=factors_considered,
-            duration_range=duration_range
-        )
+        estimated = _estimate_durations(_request_columns([request]), explain, top_factors)
+        return DurationPredictionResponse(**{name: estimated[name][0] for name in DURATION_RESPONSE_FIELDS
+                                             if name in estimated})
         
     except Exception as e:
         logger.error(f"Error predicting service duration: {e}")
         raise HTTPException(status_code=500, detail="Failed to predict duration")
 
+@router.post("/duration/batch", response_model=List[DurationPredictionResponse])
+@conditional(lambda: published_version("duration"))
+@profiled
+async def predict_service_duration_batch(request: Request, explain: bool = False,
+                                         top_factors: int = Query(MAX_KEY_FACTORS, ge=1, le=len(DURATION_FACTORS))):
+    """
+    Predict durations for a JSON array of duration requests.
+    
+    Same estimates as /duration, validated into columns and encoded from
+    columns without per-record models. Factor attributions are computed
+    and rendered only with explain=true.
+    """
+    with stage("validation"):
+        columns = _duration_batch_decoder.decode(await request.body())
+    try:
+        if not columns["service_type"]:
+            return Response(content=b"[]", media_type="application/json")
+        with stage("model"):
+            estimated = _estimate_durations(columns, explain, top_factors)
+        with stage("serialization"):
+            body = encode_records(estimated, [name for name in DURATION_RESPONSE_FIELDS if name in estimated])
+        return Response(content=body, media_type="application/json")
+        
+    except Exception as e:
+        logger.error(f"Error predicting duration batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to predict duration")
+
+CHURN_RESPONSE_FIELDS = list(ChurnPredictionResponse.model_fields)
+_churn_batch_decoder = BatchDecoder(ChurnPredictionRequest)
+RISK_LEVELS = ["low", "medium", "high"]
+
+# Recommended actions for medium and high risk, indexed by a bitmask of
+# (long since last booking, low ratings, has preferred services)
+_ACTION_RULES = ("Send re-engagement campaign", "Proactive customer service outreach",
+                 "Offer discount on preferred services")
+_ACTIONS_BY_MASK = [[action for bit, action in enumerate(_ACTION_RULES) if mask >> bit & 1]
+                    + ["Personalized service recommendations"] for mask in range(1 << len(_ACTION_RULES))]
+_LOW_RISK_ACTIONS = ["Continue regular service"]
+
+def _score_churn(columns: dict, explain: bool = False, top_n: int = MAX_KEY_FACTORS) -> dict:
+    """
+    Score a batch of customers (request columns) with one pass through the churn model.
+
+    With explain, per-feature log-odds contributions come from the same
+    pass; only each row's top_n factors are kept and rendered as strings.
+    """
+    model = get_churn_model()
+    preferred_counts = np.array([len(services or []) for services in columns["preferred_services"]], dtype=np.float64)
+    with stage("features"):
+        X = build_features({
+            "bookings_count": np.asarray(columns["bookings_count"], dtype=np.float64),
+            "avg_rating_given": np.asarray(columns["avg_rating_given"], dtype=np.float64),
+            "days_since_last_booking": np.asarray(columns["days_since_last_booking"], dtype=np.float64),
+            "total_spent": np.asarray(columns["total_spent"], dtype=np.float64),
+            "complaint_count": np.asarray(columns["complaint_count"], dtype=np.float64),
+            "preferred_services_count": preferred_counts,
+        })
+    with stage("model"):
+        probabilities = model.predict_proba(X)
+    risk = (probabilities >= 0.3).astype(np.int8) + (probabilities >= 0.6)
+    n = len(probabilities)
+
+    scored = {
+        "customer_id": columns["customer_id"],
+        "churn_probability": np.round(probabilities, 2).tolist(),
+        "risk_level": [RISK_LEVELS[level] for level in risk.tolist()],
+        "key_factors": [[] for _ in range(n)],
+        "recommended_actions": [[] for _ in range(n)],
+    }
+    if explain:
+        with stage("explain"):
+            idx, values, scored["factor_contributions"] = _explain(FEATURE_NAMES, model.contributions(X), top_n)
+            factors = [[FACTOR_LABELS[FEATURE_NAMES[j]] for j, value in zip(row_idx, row_values)
+                        if value > MIN_FACTOR_CONTRIBUTION] for row_idx, row_values in zip(idx, values)]
+            rules = np.column_stack([np.asarray(columns["days_since_last_booking"]) > 45,
+                                     np.asarray(columns["avg_rating_given"]) < 4.0,
+                                     preferred_counts > 0])
+            masks = rules.astype(np.int8) @ (1 << np.arange(len(_ACTION_RULES), dtype=np.int8))
+            scored["key_factors"] = [f if f else ["Customer appears to be engaged"] for f in factors]
+            scored["recommended_actions"] = [_ACTIONS_BY_MASK[mask] if level else _LOW_RISK_ACTIONS
+                                             for mask, level in zip(masks.tolist(), risk.tolist())]
+    return scored
+
 @router.post("/churn", response_model=ChurnPredictionResponse)
-async def predict_customer_churn(request: ChurnPredictionRequest):
+@conditional(lambda: get_churn_model().version)
+@profiled
+async def predict_customer_churn(request: ChurnPredictionRequest, explain: bool = True,
+                                 top_factors: int = Query(MAX_KEY_FACTORS, ge=1, le=len(FEATURE_NAMES))):
     """
     Predict the likelihood of a customer churning (not booking again).
     
-    Analyzes customer behavior patterns and provides actionable insights
-    to improve retention.
+    Scores the customer with the trained logistic churn model; key factors
+    are the features contributing most to the predicted risk. With
+    explain=false only the score and risk level are returned.
     """
     try:
-        # Mock churn prediction logic
-        churn_score = 0.1  # Base probability
-        
-        # Factor in booking frequency
-        if request.bookings_count < 3:
-            churn_score += 0.3
-        elif request.bookings_count > 10:
-            churn_score -= 0.1
-        
-        # Factor in rating patterns
-        if request.avg_rating_given < 3.5:
-            churn_score += 0.4
-        elif request.avg_rating_given > 4.5:
-            churn_score -= 0.2
-        
-        # Factor in recency
-        if request.days_since_last_booking > 90:
-            churn_score += 0.5
-        elif request.days_since_last_booking < 30:
-            churn_score -= 0.1
-        
-        # Factor in complaints
-        churn_score += request.complaint_count * 0.2
-        
-        # Factor in spending
-        if request.total_spent < 5000:  # Low value customer
-            churn_score += 0.2
-        elif request.total_spent > 20000:  # High value customer
-            churn_score -= 0.15
-        
-        # Bound the score
-        churn_score = max(0.05, min(0.95, churn_score))
-        
-        # Determine risk level
-        if churn_score < 0.3:
-            risk_level = "low"
-        elif churn_score < 0.6:
-            risk_level = "medium" 
-        else:
-            risk_level = "high"
-        
-        # Generate key factors
-        key_factors = []
-        if request.days_since_last_booking > 60:
-            key_factors.append("Long time since last booking")
-        if request.avg_rating_given < 4.0:
-            key_factors.append("Below average satisfaction ratings")
-        if request.complaint_count > 0:
-            key_factors.append("Previous complaints filed")
-        if request.bookings_count < 5:
-            key_factors.append("Low engagement history")
-        
-        # Generate recommendations
-        recommended_actions = []
-        if risk_level != "low":
-            if request.days_since_last_booking > 45:
-                recommended_actions.append("Send re-engagement campaign")
-            if request.avg_rating_given < 4.0:
-                recommended_actions.append("Proactive customer service outreach")
-            if len(request.preferred_services) > 0:
-                recommended_actions.append("Offer discount on preferred services")
-            recommended_actions.append("Personalized service recommendations")
-        
-        return ChurnPredictionResponse(
-            customer_id=request.customer_id,
-            churn_probability=round(churn_score, 2),
-            risk_level=risk_level,
-            key_factors=key_factors if key_factors else ["Customer appears to be engaged"],
-            recommended_actions=recommended_actions if recommended_actions else ["Continue regular service"]
-        )
+        scored = _score_churn(_request_columns([request]), explain, top_factors)
+        return ChurnPredictionResponse(**{name: scored[name][0] for name in CHURN_RESPONSE_FIELDS if name in scored})
         
     except Exception as e:
         logger.error(f"Error predicting customer churn: {e}")
         raise HTTPException(status_code=500, detail="Failed to predict churn")
 
+@router.post("/churn/batch", response_model=List[ChurnPredictionResponse])
+@conditional(lambda: get_churn_model().version)
+@profiled
+async def predict_customer_churn_batch(request: Request, explain: bool = False,
+                                       top_factors: int = Query(MAX_KEY_FACTORS, ge=1, le=len(FEATURE_NAMES))):
+    """
+    Predict churn for many customers with a single vectorized model pass.
+    
+    Takes a JSON array of churn requests. The body is validated straight
+    into columns and the response is encoded from columns, so no per-record
+    request or response models are built. Key factors, actions and factor
+    contributions are filled in only with explain=true.
+    """
+    with stage("validation"):
+        columns = _churn_batch_decoder.decode(await request.body())
+    try:
+        if not columns["customer_id"]:
+            return Response(content=b"[]", media_type="application/json")
+        scored = _score_churn(columns, explain, top_factors)
+        with stage("serialization"):
+            body = encode_records(scored, [name for name in CHURN_RESPONSE_FIELDS if name in scored])
+        return Response(content=body, media_type="application/json")
+        
+    except Exception as e:
+        logger.error(f"Error predicting churn batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to predict churn")
+
+CHURN_EXPORT_COLUMNS = ("customer_id", "location", "bookings_count", "avg_rating_given", "days_since_last_booking",
+                        "total_spent", "complaint_count", "churn_probability", "risk_level")
+
+def _churn_export_batches(data_path: str, columns: List[str], location_codes: Optional[List[int]],
+                          risk_levels: Optional[List[str]], min_probability: Optional[float],
+                          chunk_size: int = 1 << 18) -> Iterator[Batch]:
+    """Score the customer table chunk by chunk; location filters apply before scoring, risk filters after."""
+    table = {name: np.load(os.path.join(data_path, f"{name}.npy"), mmap_mode="r")
+             for name in ("customer_id", "location", *RAW_COLUMNS)}
+    model = get_churn_model()
+    wanted_risks = [RISK_LEVELS.index(level) for level in risk_levels] if risk_levels else None
+    yielded = False
+    n = len(table["customer_id"])
+    # An empty table still yields one (empty) batch, which carries the schema
+    for begin in range(0, max(n, 1), chunk_size):
+        rows = np.arange(begin, min(begin + chunk_size, n))
+        if location_codes is not None:
+            rows = rows[np.isin(table["location"][begin:begin + chunk_size], location_codes)]
+        probability = model.predict_proba(build_features({name: table[name][rows] for name in RAW_COLUMNS}))
+        risk = (probability >= 0.3).astype(np.int8) + (probability >= 0.6)
+        keep = np.ones(len(rows), dtype=bool)
+        if wanted_risks is not None:
+            keep &= np.isin(risk, wanted_risks)
+        if min_probability is not None:
+            keep &= probability >= min_probability
+        if not keep.any() and (yielded or begin + chunk_size < n):
+            continue
+        rows, probability, risk = rows[keep], probability[keep], risk[keep]
+        builders = {
+            "location": lambda: Categorical(table["location"][rows], LOCATION_NAMES),
+            "churn_probability": lambda: np.round(probability, 2).astype(np.float32),
+            "risk_level": lambda: Categorical(risk, RISK_LEVELS),
+        }
+        yield {name: builders[name]() if name in builders else np.asarray(table[name][rows]) for name in columns}
+        yielded = True
+
+def _customer_table_stamp() -> int:
+    """Changes whenever the simulated customer table is rewritten."""
+    try:
+        return os.stat(os.path.join(settings.retrain_data_path, "customers", "customer_id.npy")).st_mtime_ns
+    except OSError:
+        return 0
+
+@router.get("/churn/export")
+@conditional(lambda: get_churn_model().version, _customer_table_stamp)
+async def export_churn_scores(
+    fmt: str = Query("arrow", alias="format", pattern="^(arrow|parquet)$"),
+    columns: Optional[str] = None,
+    location: Optional[List[str]] = Query(None),
+    risk_level: Optional[List[str]] = Query(None),
+    min_probability: Optional[float] = Query(None, ge=0, le=1),
+):
+    """
+    Churn scores for the whole customer table as Arrow IPC or Parquet.
+    
+    Scores are computed per column batch, never per row. `columns` is a
+    comma-separated projection; location filters drop customers before
+    they are scored.
+    """
+    data_path = os.path.join(settings.retrain_data_path, "customers")
+    if not os.path.exists(os.path.join(data_path, "customer_id.npy")):
+        raise HTTPException(status_code=404, detail=f"No customer table at {data_path}")
+    unknown = [level for level in risk_level or [] if level not in RISK_LEVELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown risk levels: {', '.join(unknown)}")
+    try:
+        projection = project(columns, CHURN_EXPORT_COLUMNS)
+        location_codes = None
+        if location:
+            names = {location_index.canonical(name) for name in location}
+            location_codes = [i for i, name in enumerate(LOCATION_NAMES) if name in names]
+        batches = _churn_export_batches(data_path, projection, location_codes, risk_level, min_probability)
+        return export_response(batches, fmt, "churn_scores")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+def _daily_demand(service_type: str, locations: List[str], weekdays: np.ndarray,
+                  variation: np.ndarray) -> np.ndarray:
+    """
+    (locations, days) expected bookings. Locations the published demand
+    model was trained on get its weekday x location x service means;
+    others (or everything, before a model is published) get the catalog
+    base demand with the weekend surge and day-level variation.
+    """
+    service_base = BASE_DEMAND.get(service_type, 8)
+    fallback = np.trunc(np.where(weekdays >= 5, service_base * WEEKEND_DEMAND_SURGE, float(service_base))
+                        * variation).astype(np.int32)
+    demand = np.tile(fallback, (len(locations), 1))
+    published = get_published_model("demand")
+    if published is not None and service_type in published[1]["services"]:
+        arrays, meta = published
+        table = arrays["weekday_demand"][:, :, meta["services"].index(service_type)]
+        for row, location in enumerate(locations):
+            if location in meta["locations"]:
+                demand[row] = np.rint(table[weekdays, meta["locations"].index(location)])
+    return demand
+
+def _forecast_demand(service_type: str, location: str, prediction_date: datetime,
+                     time_horizon_days: int) -> DemandPredictionResponse:
+    """Demand forecast for one service and location over the horizon."""
+    with stage("model"):
+        days = [prediction_date + timedelta(days=i) for i in range(time_horizon_days)]
+        # Day-level variation from a private generator: jobs forecast from worker threads
+        variation = np.array([random.Random(int(day.timestamp())).uniform(0.8, 1.4) for day in days])
+        demand = _daily_demand(service_type, [location_index.canonical(location)],
+                               np.array([day.weekday() for day in days], dtype=np.int64), variation)[0]
+        
+        # Confidence is higher for near-term predictions
+        predictions = [{"date": day.isoformat(), "demand": value,
+                        "confidence": round(max(0.6, 0.95 - (i * 0.05)), 2)}
+                       for i, (day, value) in enumerate(zip(days, demand.tolist()))]
+    
+    # Determine peak times
+    peak_times = ["Saturday Morning", "Sunday Afternoon"]
+    if service_type == "House Cleaning":
+        peak_times.extend(["Friday Evening", "Monday Morning"])
+    elif service_type == "HVAC Services":
+        peak_times.extend(["Summer Months", "Winter Start"])
+    
+    # Seasonal factors
+    seasonal_factors = {
+        "current_season_multiplier": 1.1,
+        "upcoming_events": ["Festival Season", "Wedding Season"],
+        "weather_impact": "Moderate"
+    }
+    
+    return DemandPredictionResponse(
+        service_type=service_type,
+        location=location_index.canonical(location),
+        predicted_demand=predictions,
+        peak_times=peak_times,
+        seasonal_factors=seasonal_factors
+    )
+
 @router.post("/demand", response_model=DemandPredictionResponse)
+@conditional(lambda: published_version("demand"))
+@profiled
 async def predict_service_demand(request: DemandPredictionRequest):
     """
     Predict demand for a specific service in a location over time.
     
     Uses historical patterns, seasonal trends, and external factors
-    to forecast demand.
+    to forecast demand. Horizons beyond demand_max_inline_horizon_days
+    must be submitted as a demand_forecast job.
     """
+    if request.time_horizon_days > settings.demand_max_inline_horizon_days:
+        raise HTTPException(status_code=400, detail=(
+            f"Forecasts over {settings.demand_max_inline_horizon_days} days run as background jobs: "
+            "POST /api/v1/jobs with job_type demand_forecast"))
     try:
-        # Mock demand prediction logic
-        base_demand = {
-            "House Cleaning": 15,
-            "Plumbing Repair": 8, 
-            "Electrical Services": 12,
-            "Interior Painting": 5,
-            "Lawn Care": 10,
-            "HVAC Services": 7,
-            "Security System": 4,
-            "Custom Furniture": 3
-        }
-        
-        service_base = base_demand.get(request.service_type, 8)
-        
-        # Generate predictions for the time horizon
-        predictions = []
-        current_date = request.prediction_date
-        
-        for i in range(request.time_horizon_days):
-            date = current_date + timedelta(days=i)
-            day_of_week = date.weekday()
-            
-            # Apply day-of-week pattern
-            daily_demand = service_base
-            if day_of_week >= 5:  # Weekend
-                daily_demand *= 1.3
-            
-            # Add some realistic variation
-            import random
-            random.seed(int(date.timestamp()))
-            variation = random.uniform(0.8, 1.4)
-            daily_demand = int(daily_demand * variation)
-            
-            # Calculate confidence (higher for near-term predictions)
-            confidence = max(0.6, 0.95 - (i * 0.05))
-            
-            predictions.append({
-                "date": date.isoformat(),
-                "demand": daily_demand,
-                "confidence": round(confidence, 2)
-            })
-        
-        # Determine peak times
-        peak_times = ["Saturday Morning", "Sunday Afternoon"]
-        if request.service_type == "House Cleaning":
-            peak_times.extend(["Friday Evening", "Monday Morning"])
-        elif request.service_type == "HVAC Services":
-            peak_times.extend(["Summer Months", "Winter Start"])
-        
-        # Seasonal factors
-        seasonal_factors = {
-            "current_season_multiplier": 1.1,
-            "upcoming_events": ["Festival Season", "Wedding Season"],
-            "weather_impact": "Moderate"
-        }
-        
-        return DemandPredictionResponse(
-            service_type=request.service_type,
-            location=request.location,
-            predicted_demand=predictions,
-            peak_times=peak_times,
-            seasonal_factors=seasonal_factors
-        )
+        return _forecast_demand(request.service_type, request.location,
+                                request.prediction_date, request.time_horizon_days)
         
     except Exception as e:
         logger.error(f"Error predicting demand: {e}")
         raise HTTPException(status_code=500, detail="Failed to predict demand")
 
+DEMAND_EXPORT_COLUMNS = ("service_type", "location", "date", "demand", "confidence")
+
+def _demand_export_batches(service_types: List[str], locations: List[str], start: date, days: int,
+                           columns: List[str]) -> Iterator[Batch]:
+    """
+    The /demand forecasts (for prediction_date = start) for every service x
+    location x day, one batch per service. Day-level factors are computed
+    once and broadcast across services and locations.
+    """
+    dates = np.datetime64(start, "D") + np.arange(days)
+    day_list = [start + timedelta(days=i) for i in range(days)]
+    weekdays = np.array([d.weekday() for d in day_list], dtype=np.int64)
+    variation = np.array([random.Random(int(datetime.combine(d, datetime.min.time()).timestamp())).uniform(0.8, 1.4)
+                          for d in day_list])
+    confidence = np.array([round(max(0.6, 0.95 - (i * 0.05)), 2) for i in range(days)])
+    location_codes = np.repeat(np.arange(len(locations), dtype=np.int32), days)
+    for service_type in service_types:
+        builders = {
+            "service_type": lambda: Categorical(np.zeros(len(location_codes), dtype=np.int32), [service_type]),
+            "location": lambda: Categorical(location_codes, locations),
+            "date": lambda: np.tile(dates, len(locations)),
+            "demand": lambda: _daily_demand(service_type, locations, weekdays, variation).reshape(-1),
+            "confidence": lambda: np.tile(confidence, len(locations)),
+        }
+        yield {name: builders[name]() for name in columns}
+
+@router.get("/demand/export")
+@conditional(today, lambda: published_version("demand"))
+async def export_demand_forecasts(
+    fmt: str = Query("arrow", alias="format", pattern="^(arrow|parquet)$"),
+    columns: Optional[str] = None,
+    service: Optional[List[str]] = Query(None),
+    location: Optional[List[str]] = Query(None),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """
+    Daily demand forecasts as Arrow IPC or Parquet.
+    
+    Defaults to every service and gazetteer zone for the 30 days from
+    today. Filters limit what is generated rather than what is returned;
+    `columns` is a comma-separated projection.
+    """
+    start = start or date.today()
+    end = end or start + timedelta(days=29)
+    days = (end - start).days + 1
+    if not 1 <= days <= 3650:
+        raise HTTPException(status_code=400, detail="end must be on or after start and within 3650 days")
+    service_types = list(dict.fromkeys(service)) if service else list(BASE_DEMAND)
+    locations = list(dict.fromkeys(location_index.canonical(name) for name in location)) if location \
+        else [zone.name for zone in location_index.zones.values()]
+    try:
+        batches = _demand_export_batches(service_types, locations, start, days,
+                                         project(columns, DEMAND_EXPORT_COLUMNS))
+        return export_response(batches, fmt, "demand_forecasts")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
 @router.get("/market-trends/{location}")
+@conditional(lambda: get_rollup_store().version, today)
 async def get_market_trends(location: str):
     """Get overall market trends and insights for a location."""
     try:
-        # Mock market analysis
-        trends = {
-            "location": location,
-            "overall_growth": "12% YoY",
-            "top_growing_services": [
-                {"service": "Security System", "growth": "35%"},
-                {"service": "HVAC Services", "growth": "28%"},
-                {"service": "Electrical Services", "growth": "22%"}
-            ],
-            "market_saturation": {
-                "House Cleaning": "High",
-                "Plumbing Repair": "Medium", 
-                "Security System": "Low"
-            },
-            "seasonal_patterns": {
-                "peak_months": ["March", "April", "October", "November"],
-                "low_months": ["July", "August"]
-            },
-            "competitive_landscape": {
-                "market_leaders": ["Hyphomz", "Urban Company", "Local Providers"],
-                "market_share_hyphomz": "15%",
-                "opportunity_score": 8.5
-            }
+        location = location_index.canonical(location)
+        trends = market_trends(get_rollup_store(), location, date.today())
+        trends["competitive_landscape"] = {
+            "market_leaders": ["Hyphomz", "Urban Company", "Local Providers"],
+            "market_share_hyphomz": "15%",
+            "opportunity_score": 8.5
         }
         
         return trends
         
     except Exception as e:
         logger.error(f"Error fetching market trends for {location}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch market trends") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch market trends") 
+
+# Background job types: the same models over inputs too large for one request
+class DemandForecastJob(BaseModel):
+    service_types: List[str] = Field(min_length=1)
+    locations: List[str] = Field(min_length=1)
+    prediction_date: datetime
+    time_horizon_days: int = Field(365, ge=1, le=3650)
+
+class ChurnScoringJob(BaseModel):
+    customers: List[ChurnPredictionRequest]
+    explain: bool = False
+
+class DurationScoringJob(BaseModel):
+    requests: List[DurationPredictionRequest]
+    explain: bool = False
+
+def _forecast_chunk(params: DemandForecastJob, start: int, stop: int) -> bytes:
+    series = [(service_type, location) for service_type in params.service_types for location in params.locations]
+    forecasts = [_forecast_demand(service_type, location, params.prediction_date, params.time_horizon_days)
+                 for service_type, location in series[start:stop]]
+    return json.dumps([forecast.model_dump(mode="json") for forecast in forecasts]).encode()
+
+def _churn_chunk(params: ChurnScoringJob, start: int, stop: int) -> bytes:
+    scored = _score_churn(_request_columns(params.customers[start:stop]), params.explain)
+    return encode_records(scored, [name for name in CHURN_RESPONSE_FIELDS if name in scored])
+
+def _duration_chunk(params: DurationScoringJob, start: int, stop: int) -> bytes:
+    estimated = _estimate_durations(_request_columns(params.requests[start:stop]), params.explain)
+    return encode_records(estimated, [name for name in DURATION_RESPONSE_FIELDS if name in estimated])
+
+register_job_type("demand_forecast", DemandForecastJob,
+                  lambda params: len(params.service_types) * len(params.locations), _forecast_chunk, chunk_size=8)
+register_job_type("churn_scoring", ChurnScoringJob, lambda params: len(params.customers), _churn_chunk,
+                  chunk_size=5000)
+register_job_type("duration_scoring", DurationScoringJob, lambda params: len(params.requests), _duration_chunk,
+                  chunk_size=5000)
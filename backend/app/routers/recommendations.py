@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional
 from pydantic import BaseModel
+from datetime import date, datetime
 import logging
 
+from app.core.candidates import candidate_store
+from app.core.catalog import SERVICE_CATALOG
+from app.core.config import settings
+from app.core.etags import ConditionalRoute, conditional, today
+from app.core.ingestion import ingest
+from app.core.locations import location_index
+from app.core.pricing import pricing_engine
+from app.core.rollups import get_rollup_store, popular_services
+from app.core.trending import trend_tracker
+
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=ConditionalRoute)
 
 # Pydantic models for API
 class RecommendationRequest(BaseModel):
@@ -26,58 +37,56 @@ class ServiceRecommendation(BaseModel):
     estimated_price: int  # in INR
     estimated_duration: int  # in minutes
 
+class BookingEvent(BaseModel):
+    service_name: str
+    customer_id: Optional[str] = None
+    location: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    price: Optional[float] = None
+    rating: Optional[float] = None
+
+def _reason(booked: bool, has_history: bool) -> str:
+    if booked:
+        return "Based on your previous bookings and similar users' preferences"
+    if has_history:
+        return "Recommended due to complementary service usage"
+    return "Popular service in your area with high satisfaction rates"
+
 @router.post("/user/{user_id}", response_model=List[ServiceRecommendation])
 async def get_user_recommendations(
     user_id: str,
-    request: RecommendationRequest
+    response: Response,
+    request: Optional[RecommendationRequest] = None
 ):
     """
     Get personalized service recommendations for a user.
     
-    This endpoint uses collaborative filtering and user behavior analysis
-    to recommend the most relevant services.
+    Active users are served from the precomputed candidate table: their own
+    booking mix, services co-booked with it and local popularity. Users
+    with bookings newer than the table, unknown users and requests for more
+    than the precomputed top-N are scored live; X-Recommendation-Source
+    says which path answered.
     """
     try:
-        # Mock ML model response for now
-        # In production, this would call the ML model manager
+        request = request or RecommendationRequest(user_id=user_id)
+        location = location_index.canonical(request.location)
+        n = max(1, min(request.num_recommendations or 5, len(SERVICE_CATALOG)))
+        result = candidate_store.recommend(user_id, location, n)
+        response.headers["X-Recommendation-Source"] = result.source
         
-        # Simulate intelligent recommendations based on user patterns
-        all_services = [
-            {"name": "House Cleaning", "base_price": 1200, "base_duration": 120},
-            {"name": "Plumbing Repair", "base_price": 2000, "base_duration": 90},
-            {"name": "Electrical Services", "base_price": 2300, "base_duration": 100},
-            {"name": "Interior Painting", "base_price": 3200, "base_duration": 240},
-            {"name": "Lawn Care", "base_price": 1000, "base_duration": 80},
-            {"name": "HVAC Services", "base_price": 2500, "base_duration": 150},
-            {"name": "Security System", "base_price": 2950, "base_duration": 180},
-            {"name": "Custom Furniture", "base_price": 4000, "base_duration": 300}
-        ]
-        
-        # Simulate ML-based recommendations with confidence scores
-        import random
-        random.seed(hash(user_id) % 1000)  # Consistent results per user
-        
-        # Select top services based on "ML analysis"
-        selected_services = random.sample(all_services, min(request.num_recommendations, len(all_services)))
+        # Quote current surge prices for the user's zone
+        coordinates = location_index.coordinates(request.location)
+        has_history = result.bookings > 0
         
         recommendations = []
-        for i, service in enumerate(selected_services):
-            confidence = 0.95 - (i * 0.1)  # Decreasing confidence
-            
-            # Generate intelligent reasoning
-            reasons = [
-                f"Based on your previous bookings and similar users' preferences",
-                f"Popular service in your area with high satisfaction rates",
-                f"Seasonal recommendation - high demand period",
-                f"Matches your service frequency patterns",
-                f"Recommended due to complementary service usage"
-            ]
-            
+        for service_name, score, booked in zip(result.services, result.scores, result.booked):
+            service = SERVICE_CATALOG[service_name]
             recommendation = ServiceRecommendation(
-                service_name=service["name"],
-                confidence_score=round(confidence, 2),
-                reason=reasons[i % len(reasons)],
-                estimated_price=service["base_price"],
+                service_name=service_name,
+                confidence_score=round(score, 2),
+                reason=_reason(booked, has_history),
+                estimated_price=(pricing_engine.quote(service["base_price"], *coordinates, service_name)
+                                 if coordinates else service["base_price"]),
                 estimated_duration=service["base_duration"]
             )
             recommendations.append(recommendation)
@@ -89,41 +98,37 @@ async def get_user_recommendations(
         raise HTTPException(status_code=500, detail="Failed to generate recommendations")
 
 @router.get("/trending")
-async def get_trending_services():
+async def get_trending_services(location: Optional[str] = None, limit: int = Query(3, ge=1, le=20)):
     """Get currently trending services based on booking patterns."""
     try:
-        # Mock trending analysis
-        trending_services = [
-            {
-                "service_name": "House Cleaning",
-                "trend_score": 0.85,
-                "booking_increase": "25%",
-                "reason": "Post-festival cleaning surge"
-            },
-            {
-                "service_name": "HVAC Services", 
-                "trend_score": 0.78,
-                "booking_increase": "15%",
-                "reason": "Summer season preparation"
-            },
-            {
-                "service_name": "Electrical Services",
-                "trend_score": 0.72,
-                "booking_increase": "12%", 
-                "reason": "Home automation installations"
-            }
-        ]
+        location = location_index.canonical(location)
+        trending_services, data_points = trend_tracker.trending(location=location, limit=limit)
+        window_hours = settings.trending_window_buckets * settings.trending_bucket_seconds // 3600
         
         return {
             "trending_services": trending_services,
-            "analysis_period": "Last 30 days",
-            "data_points": 1500
+            "location": location,
+            "analysis_period": f"Last {window_hours} hours",
+            "data_points": data_points
         }
         
     except Exception as e:
         logger.error(f"Error fetching trending services: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch trending data")
 
+@router.post("/events/bookings")
+async def record_booking_events(events: List[BookingEvent]):
+    """Append booking events to the event log; trending sketches, location rollups and candidates tail it."""
+    offsets = await ingest([("booking", {
+        "service": event.service_name,
+        "customer_id": event.customer_id,
+        "location": location_index.canonical(event.location) or None,
+        "timestamp": (event.timestamp or datetime.now()).isoformat(),
+        "price": event.price,
+        "rating": event.rating,
+    }) for event in events])
+    return {"recorded": len(offsets)}
+
 @router.post("/similar-users/{user_id}")
 async def get_similar_users_recommendations(user_id: str):
     """Get recommendations based on similar users' preferences."""
@@ -156,30 +161,18 @@ async def get_similar_users_recommendations(user_id: str):
         raise HTTPException(status_code=500, detail="Failed to analyze similar users")
 
 @router.get("/popular/{location}")
+@conditional(lambda: get_rollup_store().version, today)
 async def get_location_popular_services(location: str):
     """Get popular services in a specific location."""
     try:
-        # Mock location-based popularity
-        location_services = {
-            "Greater Noida": [
-                {"service": "House Cleaning", "popularity": 0.92, "avg_rating": 4.8},
-                {"service": "Security System", "popularity": 0.87, "avg_rating": 4.7},
-                {"service": "HVAC Services", "popularity": 0.83, "avg_rating": 4.6}
-            ],
-            "Delhi": [
-                {"service": "Electrical Services", "popularity": 0.89, "avg_rating": 4.7},
-                {"service": "Plumbing Repair", "popularity": 0.85, "avg_rating": 4.6},
-                {"service": "House Cleaning", "popularity": 0.82, "avg_rating": 4.8}
-            ]
-        }
-        
-        services = location_services.get(location, location_services["Greater Noida"])
+        location = location_index.canonical(location)
+        services, total_bookings = popular_services(get_rollup_store(), location, date.today())
         
         return {
             "location": location,
             "popular_services": services,
-            "data_source": "Last 90 days booking data",
-            "total_bookings": 2500
+            "data_source": "Last 3 months booking data",
+            "total_bookings": total_bookings
         }
         
     except Exception as e:
@@ -0,0 +1,947 @@
+#!/usr/bin/env python3
+"""
+Hyphomz AI/ML Backend Benchmarks
+Micro-benchmarks for the ML core. Run all of them or pick some by name:
+
+    python benchmark.py [name ...]
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+
+def bench_trending_ingest():
+    """Benchmark: booking events/sec into the trending sketches and query latency"""
+    from app.core.trending import TrendTracker
+
+    print("\n📈 TRENDING SKETCH INGEST")
+    print("=" * 50)
+
+    services = ["House Cleaning", "Plumbing Repair", "Electrical Services", "Interior Painting",
+                "Lawn Care", "HVAC Services", "Security System", "Custom Furniture"]
+    locations = [f"zone_{i}" for i in range(200)]
+    n_events = 500_000
+    start_ts = time.time() - 3600 * 24 * 8
+    rng = random.Random(42)
+    events = [(rng.choice(services), rng.choice(locations), start_ts + i * (3600 * 24 * 8 / n_events))
+              for i in range(n_events)]
+
+    tracker = TrendTracker(bucket_seconds=3600, window_buckets=24, baseline_buckets=168,
+                           capacity=64, decay=0.97, max_locations=500, cache_seconds=1.0)
+    started = time.perf_counter()
+    tracker.record_many(events)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Ingested {n_events:,} events in {elapsed:.2f}s ({n_events / elapsed:,.0f} events/sec, target 100,000)")
+
+    now = start_ts + 3600 * 24 * 8
+    started = time.perf_counter()
+    tracker.trending(now=now)
+    cold = time.perf_counter() - started
+    n_queries = 100_000
+    started = time.perf_counter()
+    for _ in range(n_queries):
+        tracker.trending(now=now)
+    warm = (time.perf_counter() - started) / n_queries
+    print(f"✅ Trending query: {cold * 1e3:.2f}ms cold, {warm * 1e6:.2f}µs cached")
+
+
+def bench_admission_overload():
+    """Load test: urgent p99 with and without admission control on an oversubscribed server"""
+    from app.core.admission import AdmissionController, AdmissionMiddleware
+
+    print("\n🚦 ADMISSION CONTROL UNDER OVERLOAD")
+    print("=" * 50)
+
+    capacity, service_time = 8, 0.01  # 8 workers, 10ms per request => 800 req/s
+    duration, arrival_rate = 3.0, 1600  # 2x oversubscribed
+    mix = [("urgent", 0.1), ("normal", 0.3), ("analytics", 0.6)]
+
+    def make_server():
+        workers = asyncio.Semaphore(capacity)
+
+        async def app(scope, receive, send):
+            async with workers:
+                await asyncio.sleep(service_time)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+        return app
+
+    async def run(with_admission: bool):
+        app = make_server()
+        if with_admission:
+            controller = AdmissionController(
+                max_concurrency=capacity,
+                class_limits={"urgent": capacity, "normal": capacity, "analytics": 2, "batch": 1},
+                queue_timeouts_ms={"urgent": 5000, "normal": 2000, "analytics": 100, "batch": 0},
+                max_queue={"urgent": 1000, "normal": 500, "analytics": 16, "batch": 0},
+                retry_after=2,
+            )
+            app = AdmissionMiddleware(app, controller)
+        latencies = {name: [] for name, _ in mix}
+        shed = {name: 0 for name, _ in mix}
+
+        async def one(kind: str):
+            path = "/api/v1/analytics/real-time-metrics" if kind == "analytics" else "/api/v1/matching/find-best-provider"
+            body = json.dumps({"service_type": "Plumbing Repair", "location": "Delhi", "urgency": kind}).encode()
+            scope = {"type": "http", "method": "GET" if kind == "analytics" else "POST", "path": path}
+            status = {}
+
+            async def receive():
+                return {"type": "http.request", "body": body, "more_body": False}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status["code"] = message["status"]
+
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            if status["code"] == 503:
+                shed[kind] += 1
+            else:
+                latencies[kind].append(time.perf_counter() - started)
+
+        rng = random.Random(7)
+        tasks = []
+        deadline = time.perf_counter() + duration
+        tick = 0.01
+        while time.perf_counter() < deadline:
+            # Arrivals are released in 10ms ticks; sub-millisecond sleeps are not reliable
+            for kind in rng.choices([name for name, _ in mix], weights=[w for _, w in mix],
+                                    k=int(arrival_rate * tick)):
+                tasks.append(asyncio.create_task(one(kind)))
+            await asyncio.sleep(tick)
+        await asyncio.gather(*tasks)
+        return latencies, shed
+
+    for with_admission in (False, True):
+        latencies, shed = asyncio.run(run(with_admission))
+        label = "with admission   " if with_admission else "without admission"
+        for kind, samples in latencies.items():
+            samples.sort()
+            p99 = samples[int(0.99 * (len(samples) - 1))] * 1000 if samples else float("nan")
+            print(f"  {label} {kind:<10} p99 {p99:8.1f}ms  served {len(samples):5d}  shed {shed[kind]:5d}")
+
+
+def bench_matching_coalescing():
+    """Concurrency check: identical matching requests share computations"""
+    from app.core.coalescing import RequestCoalescer
+
+    print("\n🔗 PROVIDER MATCHING COALESCING")
+    print("=" * 50)
+
+    async def run():
+        coalescer = RequestCoalescer(ttl=0.05, idempotency_ttl=60, max_entries=10_000)
+        computations = 0
+
+        async def compute():
+            nonlocal computations
+            computations += 1
+            await asyncio.sleep(0.02)
+            return ["prov_001", "prov_002"]
+
+        keys = [("plumbing repair", f"zone_{i}", "normal", None) for i in range(10)]
+        rng = random.Random(3)
+        n_requests = 20_000
+        started = time.perf_counter()
+        await asyncio.gather(*(coalescer.get(rng.choice(keys), compute) for _ in range(n_requests)))
+        elapsed = time.perf_counter() - started
+        assert computations == len(keys), computations
+
+        # Retries with an idempotency key replay the first answer even after invalidation
+        first = await coalescer.get(keys[0], compute, idempotency_key="retry-1")
+        coalescer.invalidate()
+        assert await coalescer.get(keys[0], compute, idempotency_key="retry-1") is first
+        return coalescer.metrics(), n_requests, elapsed
+
+    metrics, n_requests, elapsed = asyncio.run(run())
+    print(f"✅ {n_requests:,} concurrent requests over 10 keys in {elapsed * 1e3:.0f}ms")
+    print(f"✅ Metrics: {json.dumps(metrics)}")
+
+
+def bench_metrics_fanout():
+    """Benchmark: CPU cost of 1,000 streaming clients vs the same clients polling"""
+    from app.core.metrics_stream import MetricsBroadcaster
+    from app.routers.analytics import build_real_time_metrics
+
+    print("\n📡 REAL-TIME METRICS FAN-OUT")
+    print("=" * 50)
+
+    n_clients, n_ticks = 1000, 50
+
+    async def streaming():
+        broadcaster = MetricsBroadcaster(build_real_time_metrics, interval=0, max_frames=16)
+        subscribers = [broadcaster.subscribe() for _ in range(n_clients)]
+        sent = 0
+        for _ in range(n_ticks):
+            broadcaster.tick()
+            for subscriber in subscribers:
+                while subscriber.buffer:
+                    sent += len((await subscriber.next()).sse)
+        return sent
+
+    started = time.process_time()
+    sent = asyncio.run(streaming())
+    stream_cpu = time.process_time() - started
+
+    started = time.process_time()
+    polled = 0
+    for _ in range(n_ticks):
+        for _ in range(n_clients):
+            polled += len(json.dumps(build_real_time_metrics()).encode())
+    poll_cpu = time.process_time() - started
+
+    print(f"✅ {n_clients:,} clients x {n_ticks} ticks")
+    print(f"   streaming: {stream_cpu * 1e3 / n_ticks:7.2f}ms CPU per tick, {sent / n_ticks / 1024:7.1f} KiB/tick")
+    print(f"   polling:   {poll_cpu * 1e3 / n_ticks:7.2f}ms CPU per tick, {polled / n_ticks / 1024:7.1f} KiB/tick")
+
+
+def _memory_kib():
+    """(RSS, PSS) of the current process in KiB, from /proc (Linux only)."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1])
+    return values["Rss:"], values["Pss:"]
+
+
+def _shared_state_worker(root, mode, results):
+    import numpy as np
+    from app.core.shared_state import SharedStateReader, read_current_generation, _generation_dir
+
+    if mode == "private":
+        directory = _generation_dir(root, read_current_generation(root))
+        arrays = {name[:-4]: np.load(os.path.join(directory, name))
+                  for name in os.listdir(directory) if name.endswith(".npy")}
+    else:
+        arrays = SharedStateReader(root, check_interval=0).current().arrays
+    checksum = sum(float(array.sum()) for array in arrays.values())  # touch every page
+    results.put((mode, checksum) + _memory_kib())
+    time.sleep(1)
+
+
+def bench_shared_state_rss():
+    """Benchmark: per-worker RSS/PSS with private copies vs memory-mapped shared state"""
+    import multiprocessing
+    import tempfile
+    import numpy as np
+    from app.core.shared_state import publish
+
+    print("\n🧠 SHARED STATE ACROSS WORKERS")
+    print("=" * 50)
+
+    n_workers = 4
+    rng = np.random.default_rng(0)
+    arrays = {
+        "provider_lat": rng.uniform(28.4, 28.8, 2_000_000),
+        "provider_lon": rng.uniform(77.0, 77.6, 2_000_000),
+        "provider_rating": rng.uniform(3.5, 5.0, 2_000_000).astype(np.float32),
+        "service_embeddings": rng.standard_normal((200_000, 64)).astype(np.float32),
+    }
+    total_mib = sum(array.nbytes for array in arrays.values()) / 2**20
+    with tempfile.TemporaryDirectory() as root:
+        publish(arrays, root=root)
+        del arrays
+        for mode in ("private", "shared"):
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=_shared_state_worker, args=(root, mode, results))
+                       for _ in range(n_workers)]
+            for worker in workers:
+                worker.start()
+            samples = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            rss = sum(sample[2] for sample in samples) / len(samples) / 1024
+            pss = sum(sample[3] for sample in samples) / len(samples) / 1024
+            print(f"  {mode:<8} {n_workers} workers, {total_mib:.0f} MiB state: "
+                  f"RSS {rss:7.1f} MiB/worker, PSS {pss:7.1f} MiB/worker, total PSS {pss * n_workers:7.1f} MiB")
+
+
+def _publish_synthetic_providers(root, n_providers):
+    from app.core.shared_state import publish
+    from app.core.simulator import MarketplaceSimulator
+
+    publish(MarketplaceSimulator(seed=1, n_customers=1, n_providers=n_providers).providers(), root=root)
+
+
+def bench_geo_sharding():
+    """Benchmark: matching throughput through the shard router with 1..N local shard processes"""
+    import subprocess
+    import tempfile
+    import httpx
+    from app.core.geo_sharding import ShardRouter
+
+    print("\n🗺️  GEO-SHARDED PROVIDER MATCHING")
+    print("=" * 50)
+
+    n_providers, duration, concurrency = 500_000, 5.0, 32
+    base_port = 8700
+
+    async def drive(nodes):
+        router = ShardRouter(nodes, timeout=2.0)
+        rng = random.Random(5)
+        done, partial = 0, 0
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            nonlocal done, partial
+            while time.perf_counter() < deadline:
+                _, failed = await router.search(rng.uniform(28.4, 28.8), rng.uniform(77.0, 77.6), 8.0,
+                                                "Plumbing Repair", 5)
+                done += 1
+                partial += bool(failed)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        await router._http().aclose()
+        return done / duration, partial
+
+    with tempfile.TemporaryDirectory() as root:
+        _publish_synthetic_providers(root, n_providers)
+        for n_shards in (1, 2, 4):
+            nodes = [f"http://127.0.0.1:{base_port + i}" for i in range(n_shards)]
+            env = dict(os.environ, SHARED_STATE_PATH=root, MATCHING_SHARD_NODES=json.dumps(nodes),
+                       ADMISSION_ENABLED="false")
+            processes = [
+                subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(base_port + i),
+                                  "--log-level", "warning"],
+                                 env=dict(env, MATCHING_SHARD_INDEX=str(i)))
+                for i in range(n_shards)
+            ]
+            try:
+                for node in nodes:
+                    for _ in range(100):
+                        try:
+                            httpx.get(f"{node}/health")
+                            break
+                        except httpx.TransportError:
+                            time.sleep(0.1)
+                throughput, partial = asyncio.run(drive(nodes))
+                print(f"  {n_shards} shard(s): {throughput:8.0f} searches/sec, {partial} partial "
+                      f"({os.cpu_count()} CPU(s) available)")
+            finally:
+                for process in processes:
+                    process.terminate()
+                    process.wait()
+
+
+def _measure(fn, repeat=5):
+    """(best seconds per call, peak traced KiB during one call)."""
+    import tracemalloc
+
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+        del result
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1024
+
+
+def bench_validation_fast_path():
+    """Benchmark: µs and allocations per record, pydantic models vs the columnar fast path"""
+    from typing import List
+
+    from pydantic import TypeAdapter
+
+    from app.core.fast_validation import BatchDecoder, encode_records
+    from app.routers import predictions as p
+
+    print("\n⚡ BATCH VALIDATION FAST PATH")
+    print("=" * 50)
+
+    n = 10_000
+    rng = random.Random(42)
+    churn = json.dumps([
+        {"customer_id": f"cust_{i}", "bookings_count": rng.randint(0, 40),
+         "avg_rating_given": round(rng.uniform(1, 5), 1), "days_since_last_booking": rng.randint(0, 200),
+         "total_spent": round(rng.uniform(0, 20000), 2), "complaint_count": rng.randint(0, 5),
+         "preferred_services": rng.sample(["House Cleaning", "Plumbing Repair", "Lawn Care"], rng.randint(0, 2))}
+        for i in range(n)
+    ]).encode()
+    duration = json.dumps([
+        {"service_type": rng.choice(list(p.BASE_DURATIONS)), "area_sqft": rng.randint(400, 4000),
+         "complexity": rng.choice(["low", "medium", "high"]), "provider_experience": rng.randint(0, 20),
+         "time_of_day": rng.choice(["morning", "afternoon", "evening"])}
+        for _ in range(n)
+    ]).encode()
+
+    cases = [
+        ("churn", churn, p.ChurnPredictionRequest, p.ChurnPredictionResponse, p._score_churn),
+        ("duration", duration, p.DurationPredictionRequest, p.DurationPredictionResponse, p._estimate_durations),
+    ]
+    for name, body, request_model, response_model, compute in cases:
+        requests_in = TypeAdapter(List[request_model])
+        responses_out = TypeAdapter(List[response_model])
+        fields = list(response_model.model_fields)
+        decoder = BatchDecoder(request_model)
+
+        def model_path():
+            # What a List[model] endpoint with a response_model does
+            columns = p._request_columns(requests_in.validate_json(body))
+            out = compute(columns)
+            responses = [response_model(**dict(zip(fields, row))) for row in zip(*(out[f] for f in fields))]
+            return responses_out.dump_json(responses)
+
+        def fast_path():
+            return encode_records(compute(decoder.decode(body)), fields)
+
+        assert json.loads(model_path()) == json.loads(fast_path())
+        print(f"{name} ({n:,} records):")
+        for label, fn in (("models", model_path), ("fast path", fast_path)):
+            seconds, peak_kib = _measure(fn)
+            print(f"  {label:10s} {seconds / n * 1e6:6.2f} µs/record, peak allocations {peak_kib / n * 1024:6.0f} B/record")
+
+
+def bench_simulator():
+    """Benchmark: synthetic marketplace generation, 10M bookings streamed to disk"""
+    import resource
+    import tempfile
+
+    from app.core.simulator import generate
+
+    print("\n🏙️  SYNTHETIC MARKETPLACE SIMULATOR")
+    print("=" * 50)
+
+    n_bookings = 10_000_000
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        summary = generate(root, n_bookings=n_bookings)
+        elapsed = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"✅ {summary['customers']:,} customers, {summary['providers']:,} providers, {n_bookings:,} bookings "
+          f"in {elapsed:.1f}s (target 60s), {n_bookings / summary['seconds']['bookings']:,.0f} bookings/sec")
+    print(f"  stages: {summary['seconds']}")
+    print(f"  {size / 2**20:,.0f} MiB written, peak RSS {peak_mib:,.0f} MiB "
+          f"(was {rss_before / 1024:,.0f} MiB before generating)")
+
+
+def bench_retraining_isolation():
+    """Load test: serving p99 while models retrain in-process vs in the isolated worker process"""
+    import tempfile
+
+    from app.core.config import settings
+    from app.core.retraining import RetrainScheduler, run_retraining
+    from app.core.simulator import generate
+    from app.routers.predictions import _score_churn
+
+    print("\n🔁 RETRAINING ISOLATION")
+    print("=" * 50)
+
+    rng = random.Random(7)
+    columns = {
+        "customer_id": [f"cust_{i}" for i in range(100)],
+        "bookings_count": [rng.randint(0, 40) for _ in range(100)],
+        "avg_rating_given": [rng.uniform(1, 5) for _ in range(100)],
+        "days_since_last_booking": [rng.randint(0, 200) for _ in range(100)],
+        "total_spent": [rng.uniform(0, 20000) for _ in range(100)],
+        "complaint_count": [rng.randint(0, 5) for _ in range(100)],
+        "preferred_services": [[] for _ in range(100)],
+    }
+
+    async def probe(until_done):
+        """
+        A request for a 100-customer churn batch arrives every 2ms until the
+        retrain finishes. Latency runs from arrival to completion, so event
+        loop stalls (e.g. waiting for the GIL) count.
+        """
+        latencies = []
+        arrival = time.perf_counter()
+        while not until_done():
+            arrival += 0.002
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            _score_churn(columns)
+            latencies.append(time.perf_counter() - arrival)
+        return sorted(latencies)
+
+    def report(label, latencies, seconds):
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        print(f"  {label:22s} p50 {p50:6.2f}ms  p99 {p99:7.2f}ms  ({len(latencies):,} requests, retrain {seconds:.1f}s)")
+
+    with tempfile.TemporaryDirectory() as root:
+        generate(os.path.join(root, "data"), n_bookings=10_000_000, n_customers=1_000_000)
+        settings.retrain_data_path = os.path.join(root, "data")
+        settings.churn_training_data_path = os.path.join(root, "data", "customers")
+
+        async def idle():
+            deadline = time.perf_counter() + 3
+            return await probe(lambda: time.perf_counter() > deadline), 0.0
+
+        async def in_process():
+            settings.model_storage_path = os.path.join(root, "models-thread")
+            started = time.perf_counter()
+            task = asyncio.ensure_future(asyncio.to_thread(run_retraining))
+            latencies = await probe(task.done)
+            await task
+            return latencies, time.perf_counter() - started
+
+        async def worker_process():
+            settings.model_storage_path = os.path.join(root, "models-worker")
+            started = time.perf_counter()
+            task = asyncio.ensure_future(RetrainScheduler().run_once())
+            latencies = await probe(task.done)
+            run = await task
+            print(f"  worker stages: " + ", ".join(
+                f"{m['model']}={m.get('stages')}" for m in run["models"]))
+            return latencies, time.perf_counter() - started
+
+        for label, phase in (("no retrain", idle), ("in-process thread", in_process),
+                             ("isolated worker", worker_process)):
+            latencies, seconds = asyncio.run(phase())
+            report(label, latencies, seconds)
+
+
+def bench_pricing_recompute():
+    """Benchmark: surge table recompute at 10k zones and O(1) price lookups"""
+    import numpy as np
+
+    from app.core.pricing import PricingEngine
+    from app.core.simulator import MarketplaceSimulator
+
+    print("\n💸 DYNAMIC PRICING")
+    print("=" * 50)
+
+    n_zones = 10_000
+    engine = PricingEngine(max_zones=16_384, slot_hours=3, cell_deg=0.05, half_life=300.0,
+                           requests_per_provider=2.0, min_supply=1.0, sensitivity=0.5, smoothing=0.5,
+                           min_multiplier=0.9, max_multiplier=2.5, step=0.05)
+    # A 100 x 100 grid of zones with providers scattered over it
+    rng = np.random.default_rng(3)
+    providers = MarketplaceSimulator(seed=3, n_customers=1, n_providers=500_000).providers()
+    lats = 20.0 + rng.uniform(0, 5.0, len(providers["provider_id"]))
+    lons = 75.0 + rng.uniform(0, 5.0, len(providers["provider_id"]))
+    started = time.perf_counter()
+    engine.set_supply(lats, lons, providers["provider_services"])
+    print(f"✅ Supply from {len(lats):,} providers over {len(engine._zones):,} zones in "
+          f"{(time.perf_counter() - started) * 1000:.1f}ms")
+
+    services = ["House Cleaning", "Plumbing Repair", "Lawn Care", "HVAC Services"]
+    points = [(20.0 + rng.uniform(0, 5.0), 75.0 + rng.uniform(0, 5.0), services[i % 4]) for i in range(200_000)]
+    for lat, lon, service in points:
+        engine.record_demand(lat, lon, service)
+    timings = []
+    for _ in range(20):
+        for lat, lon, service in points[:5_000]:
+            engine.record_demand(lat, lon, service)
+        started = time.perf_counter()
+        engine.recompute()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"✅ Recompute {len(engine._zones):,} zones x 8 services x {engine.n_slots} slots: "
+          f"p50 {timings[len(timings) // 2] * 1000:.2f}ms, max {timings[-1] * 1000:.2f}ms")
+
+    n_lookups = 200_000
+    started = time.perf_counter()
+    for lat, lon, service in points[:n_lookups]:
+        engine.quote(2000, lat, lon, service)
+    elapsed = time.perf_counter() - started
+    print(f"✅ {n_lookups:,} price lookups: {elapsed / n_lookups * 1e6:.2f}µs each")
+    table = engine._table[:len(engine._zones)]
+    print(f"  multipliers: min {table.min():.2f}, median {np.median(table):.2f}, max {table.max():.2f}")
+
+
+def bench_location_resolution():
+    """Benchmark: free-text location resolution, cold (trie + fuzzy) and through the LRU cache"""
+    import numpy as np
+
+    from app.core.config import settings
+    from app.core.locations import LocationIndex
+
+    print("\n📍 LOCATION RESOLUTION")
+    print("=" * 50)
+
+    def fresh_index():
+        return LocationIndex.from_file(settings.location_gazetteer_path, settings.location_fuzzy_threshold,
+                                       settings.location_fuzzy_margin, settings.location_cache_size)
+
+    # Spelling, casing and address variants of every alias, plus some places outside the gazetteer
+    index = fresh_index()
+    rng = np.random.default_rng(11)
+    variants = set()
+    for alias in index._aliases:
+        variants.add(alias.upper())
+        for template in ("{}", "{} ", "Flat {n}, {}", "H.No {n}, Block B, {}", "{}, India"):
+            variants.add(template.format(alias.title(), n=rng.integers(1, 500)))
+        typo = rng.integers(1, len(alias) - 1)
+        variants.add(alias[:typo] + alias[typo + 1:])
+        variants.add(alias[:typo] + alias[typo + 1] + alias[typo] + alias[typo + 2:])
+    variants |= {"Mumbai", "Bengaluru", "Pune", "Chennai", "Kolkata", "Lucknow", "Jaipur"}
+    variants = sorted(variants)
+
+    started = time.perf_counter()
+    resolved = [index.resolve(text) for text in variants]
+    elapsed = time.perf_counter() - started
+    print(f"✅ {len(variants):,} distinct strings resolved cold: {elapsed / len(variants) * 1e6:.1f}µs each, "
+          f"{sum(zone is not None for zone in resolved):,} matched a zone")
+
+    # Zipf-skewed traffic over the distinct strings, as free text from real requests would be
+    n_lookups = 1_000_000
+    ranks = np.minimum(rng.zipf(1.2, n_lookups), len(variants)) - 1
+    texts = [variants[i] for i in ranks]
+    resolve = index.resolve
+    started = time.perf_counter()
+    for text in texts:
+        resolve(text)
+    elapsed = time.perf_counter() - started
+    print(f"✅ {n_lookups:,} cached lookups: {n_lookups / elapsed / 1e6:.2f}M/s ({elapsed / n_lookups * 1e9:.0f}ns each)")
+
+    for name, index in (("cold", fresh_index()), ("warm", index)):
+        started = time.perf_counter()
+        index.resolve_many(texts)
+        elapsed = time.perf_counter() - started
+        print(f"✅ resolve_many over {n_lookups:,} ({name} cache): {n_lookups / elapsed / 1e6:.2f}M/s")
+    print(f"  cache: {index.cache_info()}")
+
+
+def bench_columnar_export():
+    """Benchmark: bytes on the wire and end-to-end export time, paged JSON vs Arrow IPC and Parquet"""
+    import io
+    import tempfile
+    from datetime import date
+
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from fastapi.testclient import TestClient
+
+    from app.core.config import settings
+    from app.core.simulator import generate
+    from main import app
+
+    print("\n📦 COLUMNAR EXPORT")
+    print("=" * 50)
+
+    def run(label, fetch):
+        started = time.perf_counter()
+        n_bytes, n_rows = fetch()
+        elapsed = time.perf_counter() - started
+        print(f"  {label:8s} {n_rows:>9,} rows  {n_bytes / 1e6:8.2f} MB  {elapsed:6.2f}s")
+
+    def read_arrow(response):
+        return len(response.content), pa.ipc.open_stream(response.content).read_all().num_rows
+
+    def read_parquet(response):
+        return len(response.content), pq.read_table(io.BytesIO(response.content)).num_rows
+
+    with tempfile.TemporaryDirectory() as root, TestClient(app) as client:
+        settings.retrain_data_path = root
+        n_customers = 500_000
+        generate(root, n_bookings=1_000, n_customers=n_customers, n_providers=100)
+
+        # Demand: every service x zone for a year; the JSON endpoint serves one series, 90 days per call
+        services = ["House Cleaning", "Plumbing Repair", "Electrical Services", "Interior Painting",
+                    "Lawn Care", "HVAC Services", "Security System", "Custom Furniture"]
+        zones = ["Greater Noida", "Noida", "Delhi", "Gurgaon", "Ghaziabad", "Faridabad"]
+
+        def demand_json():
+            n_bytes = n_rows = 0
+            for service in services:
+                for zone in zones:
+                    for offset in range(0, 365, 90):
+                        response = client.post("/api/v1/predictions/demand", json={
+                            "service_type": service, "location": zone, "time_horizon_days": min(90, 365 - offset),
+                            "prediction_date": f"{date.fromordinal(date(2025, 1, 1).toordinal() + offset)}T00:00:00"})
+                        n_bytes += len(response.content)
+                        n_rows += len(response.json()["predicted_demand"])
+            return n_bytes, n_rows
+
+        params = {"start": "2025-01-01", "end": "2025-12-31"}
+        print(f"demand forecasts ({len(services)} services x {len(zones)} zones x 365 days):")
+        run("json", demand_json)
+        run("arrow", lambda: read_arrow(client.get("/api/v1/predictions/demand/export", params=params)))
+        run("parquet", lambda: read_parquet(client.get("/api/v1/predictions/demand/export",
+                                                       params={**params, "format": "parquet"})))
+
+        # Churn: the JSON path posts customer pages to /churn/batch and counts both directions
+        columns = {name: np.load(os.path.join(root, "customers", f"{name}.npy"))
+                   for name in ("customer_id", "bookings_count", "avg_rating_given", "days_since_last_booking",
+                                "total_spent", "complaint_count", "preferred_services_count")}
+
+        def churn_json(page=10_000):
+            n_bytes = n_rows = 0
+            for begin in range(0, n_customers, page):
+                body = json.dumps([
+                    {"customer_id": str(customer_id), "bookings_count": int(bookings),
+                     "avg_rating_given": float(rating), "days_since_last_booking": int(days),
+                     "total_spent": float(spent), "complaint_count": int(complaints),
+                     "preferred_services": ["House Cleaning"] * int(preferred)}
+                    for customer_id, bookings, rating, days, spent, complaints, preferred in zip(
+                        *(column[begin:begin + page].tolist() for column in columns.values()))
+                ]).encode()
+                response = client.post("/api/v1/predictions/churn/batch", content=body,
+                                       headers={"Content-Type": "application/json"})
+                n_bytes += len(body) + len(response.content)
+                n_rows += len(response.json())
+            return n_bytes, n_rows
+
+        print(f"churn scores ({n_customers:,} customers):")
+        run("json", churn_json)
+        run("arrow", lambda: read_arrow(client.get("/api/v1/predictions/churn/export")))
+        run("parquet", lambda: read_parquet(client.get("/api/v1/predictions/churn/export",
+                                                       params={"format": "parquet"})))
+        projected = {"columns": "customer_id,churn_probability", "location": "Noida", "risk_level": "high"}
+        run("arrow*", lambda: read_arrow(client.get("/api/v1/predictions/churn/export", params=projected)))
+        print("  (* two columns, Noida high-risk customers only)")
+
+
+def bench_http_caching():
+    """Benchmark: bytes and CPU per endpoint for identity/gzip/zstd, and 304 revalidation vs a full response"""
+    import tempfile
+
+    from fastapi.testclient import TestClient
+
+    from app.core.compression import _compressor, zstandard
+    from app.core.config import settings
+    from app.core.simulator import generate
+    from main import app
+
+    print("\n🗜️  HTTP CACHING AND COMPRESSION")
+    print("=" * 50)
+
+    churn_page = json.dumps([
+        {"customer_id": f"C{i}", "bookings_count": i % 20, "avg_rating_given": 3.5 + (i % 3) / 2,
+         "days_since_last_booking": i % 120, "total_spent": 500.0 * (i % 40), "complaint_count": i % 4,
+         "preferred_services": ["House Cleaning"]} for i in range(1_000)]).encode()
+    requests = {
+        "demand (90d)": ("POST", "/api/v1/predictions/demand", {"json": {
+            "service_type": "House Cleaning", "location": "Noida", "time_horizon_days": 90,
+            "prediction_date": "2025-01-01T00:00:00"}}),
+        "market-trends": ("GET", "/api/v1/predictions/market-trends/Noida", {}),
+        "popular": ("GET", "/api/v1/recommendations/popular/Noida", {}),
+        "churn batch (1k)": ("POST", "/api/v1/predictions/churn/batch", {
+            "content": churn_page, "headers": {"Content-Type": "application/json"}}),
+        "churn export": ("GET", "/api/v1/predictions/churn/export", {}),
+    }
+    encodings = ["gzip"] + (["zstd"] if zstandard is not None else [])
+
+    def timed(fn, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return (time.perf_counter() - started) / repeat * 1e3, result
+
+    with tempfile.TemporaryDirectory() as root, TestClient(app) as client:
+        settings.retrain_data_path = root
+        generate(root, n_bookings=1_000, n_customers=50_000, n_providers=100)
+
+        print(f"{'endpoint':18s} {'identity':>10s}" + "".join(f" {name:>17s}" for name in encodings)
+              + f" {'200 ms':>8s} {'304 ms':>8s}")
+        for label, (method, path, kwargs) in requests.items():
+            headers = {**kwargs.get("headers", {}), "Accept-Encoding": "identity"}
+            call = lambda extra={}: client.request(method, path, **{**kwargs, "headers": {**headers, **extra}})
+            full_ms, response = timed(call, 5)
+            body, etag = response.content, response.headers.get("etag")
+            row = f"{label:18s} {len(body) / 1e3:8.1f}kB"
+            for encoding in encodings:
+                def compress():
+                    compressor = _compressor(encoding, settings.compression_gzip_level,
+                                             settings.compression_zstd_level)
+                    return compressor.compress(body) + compressor.flush()
+                cpu_ms, compressed = timed(compress, 5)
+                row += f" {len(compressed) / 1e3:7.1f}kB {cpu_ms:5.2f}ms"
+            if method != "GET":
+                # If-None-Match is honoured on reads only
+                print(row + f" {full_ms:8.2f} {'-':>8s}")
+                continue
+            not_modified_ms, revalidated = timed(lambda: call({"If-None-Match": etag}), 20)
+            assert revalidated.status_code == 304, revalidated.status_code
+            print(row + f" {full_ms:8.2f} {not_modified_ms:8.2f}")
+        print(f"  (compressed size and compression CPU per response at gzip level "
+              f"{settings.compression_gzip_level}, zstd level {settings.compression_zstd_level})")
+
+
+def bench_event_log():
+    """Benchmark: sustained append and replay throughput of the segmented event log on local disk"""
+    import tempfile
+
+    from app.core.config import settings
+    from app.core.event_log import EventLog
+
+    print("\n🪵 EVENT LOG")
+    print("=" * 50)
+
+    rng = random.Random(7)
+    services = ["House Cleaning", "Plumbing Repair", "Electrical Services", "Interior Painting"]
+    zones = ["Greater Noida", "Noida", "Delhi", "Gurgaon", "Ghaziabad", "Faridabad"]
+    events = [("booking", {"service": rng.choice(services), "location": rng.choice(zones),
+                           "customer_id": f"C{rng.randrange(1_000_000)}", "price": rng.randrange(500, 5000),
+                           "timestamp": "2025-06-01T10:00:00"}) for _ in range(10_000)]
+    n_events, batch = 1_000_000, 100
+
+    with tempfile.TemporaryDirectory() as root:
+        for label, fsync_bytes, n in (("fsync per append", 0, 2_000),
+                                      (f"fsync per {settings.event_log_fsync_bytes >> 10} KiB",
+                                       settings.event_log_fsync_bytes, n_events)):
+            log = EventLog(os.path.join(root, label.replace(" ", "-")), settings.event_log_segment_bytes,
+                           fsync_bytes, settings.event_log_index_interval)
+            started = time.perf_counter()
+            if fsync_bytes:
+                for begin in range(0, n, batch):
+                    log.append_many(events[(begin + i) % len(events)] for i in range(batch))
+            else:
+                for i in range(n):
+                    log.append(*events[i % len(events)])
+            log.sync()
+            elapsed = time.perf_counter() - started
+            status = log.status()
+            print(f"✅ append, {label}: {n / elapsed:,.0f} events/s, "
+                  f"{status['bytes'] / elapsed / 1e6:.1f} MB/s ({status['segments']} segments)")
+            log.close()
+
+        log = EventLog(log.path, settings.event_log_segment_bytes, settings.event_log_fsync_bytes,
+                       settings.event_log_index_interval)
+        started = time.perf_counter()
+        offset, replayed = 0, 0
+        while True:
+            records, offset = log.read(offset, settings.ingestion_batch_size)
+            if not records:
+                break
+            replayed += len(records)
+        elapsed = time.perf_counter() - started
+        print(f"✅ replay from offset 0 (cold open, mmap): {replayed / elapsed:,.0f} events/s")
+
+        seeks = [rng.randrange(n_events) for _ in range(1_000)]
+        started = time.perf_counter()
+        for offset in seeks:
+            log.read(offset, 1)
+        print(f"✅ seek to a random offset: {(time.perf_counter() - started) / len(seeks) * 1e6:.0f}µs")
+        log.close()
+
+
+def bench_explanations():
+    """Benchmark: batch scoring cost with and without per-feature explanations"""
+    from app.core.fast_validation import encode_records
+    from app.routers.predictions import (BASE_DURATIONS, CHURN_RESPONSE_FIELDS, DURATION_RESPONSE_FIELDS,
+                                         _estimate_durations, _score_churn)
+
+    print("\n🔍 EXPLANATIONS")
+    print("=" * 50)
+
+    rng = random.Random(11)
+    n = 100_000
+    churn_columns = {
+        "customer_id": [f"C{i}" for i in range(n)],
+        "bookings_count": [rng.randrange(0, 50) for _ in range(n)],
+        "avg_rating_given": [rng.uniform(1, 5) for _ in range(n)],
+        "days_since_last_booking": [rng.randrange(0, 400) for _ in range(n)],
+        "total_spent": [rng.uniform(0, 100_000) for _ in range(n)],
+        "complaint_count": [rng.randrange(0, 5) for _ in range(n)],
+        "preferred_services": [["House Cleaning"] * rng.randrange(0, 4) for _ in range(n)],
+    }
+    duration_columns = {
+        "service_type": [rng.choice(list(BASE_DURATIONS)) for _ in range(n)],
+        "complexity": [rng.choice(["low", "medium", "high"]) for _ in range(n)],
+        "provider_experience": [rng.randrange(0, 30) for _ in range(n)],
+        "area_sqft": [rng.uniform(200, 4000) for _ in range(n)],
+        "time_of_day": [rng.choice(["morning", "afternoon", "evening"]) for _ in range(n)],
+    }
+
+    for label, score, columns, fields in (("churn", _score_churn, churn_columns, CHURN_RESPONSE_FIELDS),
+                                          ("duration", _estimate_durations, duration_columns,
+                                           DURATION_RESPONSE_FIELDS)):
+        print(f"{label} ({n:,} rows):")
+        baseline = None
+        for explain in (False, True):
+            timings = []
+            for _ in range(3):
+                started = time.perf_counter()
+                result = score(columns, explain)
+                scored = time.perf_counter() - started
+                body = encode_records(result, [name for name in fields if name in result])
+                timings.append((scored, time.perf_counter() - started, len(body)))
+            scored, total, size = min(timings)
+            baseline = baseline or total
+            print(f"  explain={str(explain).lower():5s} score {scored * 1e3:7.1f}ms  score+encode {total * 1e3:7.1f}ms"
+                  f"  ({total / baseline:.2f}x)  {size / 1e6:5.1f} MB")
+
+
+def bench_candidates():
+    """Benchmark: candidate table build time and size, table hits vs live scoring, incremental refresh"""
+    import tempfile
+
+    from app.core.candidates import CandidateStore, build_candidates
+    from app.core.simulator import LOCATION_NAMES, SERVICE_TYPES, generate
+
+    print("\n🎯 RECOMMENDATION CANDIDATES")
+    print("=" * 50)
+
+    n_customers, n_bookings = 1_000_000, 5_000_000
+    with tempfile.TemporaryDirectory() as root:
+        data = os.path.join(root, "marketplace")
+        generate(data, n_bookings=n_bookings, n_customers=n_customers)
+        table = os.path.join(root, "candidates")
+        for workers in sorted({1, os.cpu_count() or 1}):
+            report = build_candidates(data, root=table, workers=workers)
+            print(f"✅ build, {workers} worker(s): {report['users']:,} active users in "
+                  f"{sum(report['seconds'].values()):.2f}s {report['seconds']}")
+        generation = os.path.join(table, f"gen-{report['generation']:08d}")
+        size = sum(os.path.getsize(os.path.join(generation, name)) for name in os.listdir(generation))
+        print(f"  table {report['table_bytes'] / 2**20:.1f} MiB in memory-mapped arrays "
+              f"({report['table_bytes'] / report['users']:.0f} B/user), {size / 2**20:.1f} MiB per generation on disk")
+
+        store = CandidateStore(table)
+        state = store.reader.current()
+        rng = random.Random(5)
+        known = [str(state["user_ids"][rng.randrange(report["users"])]) for _ in range(20_000)]
+        for label, users, n in (("table hit", known, report["top_n"]),
+                                ("live, unknown user", [f"guest-{i}" for i in range(20_000)], report["top_n"]),
+                                ("live, n > top_n", known, len(SERVICE_TYPES))):
+            timings = []
+            for user_id in users:
+                started = time.perf_counter()
+                result = store.recommend(user_id, None, n)
+                timings.append(time.perf_counter() - started)
+            timings.sort()
+            print(f"✅ {label:18s} ({result.source}): p50 {timings[len(timings) // 2] * 1e6:5.1f}µs  "
+                  f"p99 {timings[int(len(timings) * 0.99)] * 1e6:5.1f}µs")
+
+        for dirty in (1_000, 50_000):
+            records = [(offset, {"type": "booking", "customer_id": str(rng.randrange(n_customers)),
+                                 "service": rng.choice(SERVICE_TYPES), "location": rng.choice(LOCATION_NAMES)})
+                       for offset in range(dirty)]
+            store.record(records, dirty)
+            started = time.perf_counter()
+            refreshed = store.refresh()
+            print(f"✅ incremental refresh, {refreshed:,} users with new bookings: "
+                  f"{time.perf_counter() - started:.2f}s")
+
+
+BENCHMARKS = {
+    "trending": bench_trending_ingest,
+    "admission": bench_admission_overload,
+    "coalescing": bench_matching_coalescing,
+    "metrics-stream": bench_metrics_fanout,
+    "shared-state": bench_shared_state_rss,
+    "geo-sharding": bench_geo_sharding,
+    "validation": bench_validation_fast_path,
+    "simulator": bench_simulator,
+    "retraining": bench_retraining_isolation,
+    "pricing": bench_pricing_recompute,
+    "locations": bench_location_resolution,
+    "export": bench_columnar_export,
+    "http": bench_http_caching,
+    "event-log": bench_event_log,
+    "explain": bench_explanations,
+    "candidates": bench_candidates,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
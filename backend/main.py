@@ -5,9 +5,21 @@ Hyphomz ML Backend - Main Application
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
-import random
 from datetime import datetime
-from typing import Dict, Any
+import asyncio
+
+from app.core.admission import AdmissionMiddleware, admission_controller
+from app.core.candidates import candidates_refresh_loop
+from app.core.retraining import retrain_scheduler
+from app.core.compression import CompressionMiddleware
+from app.core.config import settings
+from app.core.event_log import event_log
+from app.core.ingestion import consume_pending, ingestion_loop
+from app.core.jobs import job_queue
+from app.core.pricing import pricing_loop
+from app.core.profiling import ProfilingMiddleware
+from app.core.rollups import flush_rollups, load_rollups, rollup_flush_loop
+from app.routers import admin, analytics, events, jobs, predictions, provider_matching, recommendations
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -18,6 +30,18 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+# Request profiling: Server-Timing for a sampled fraction of requests when enabled
+app.add_middleware(ProfilingMiddleware)
+
+# Compression: gzip or zstd, streamed, for responses above compression_min_bytes
+if settings.compression_enabled:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_bytes,
+                       gzip_level=settings.compression_gzip_level, zstd_level=settings.compression_zstd_level)
+
+# Admission control: prioritise urgent matching and shed analytics/batch under overload
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -39,124 +63,43 @@ app.add_middleware(
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-# Recommendations endpoints
-@app.post("/api/v1/recommendations/user/{user_id}")
-async def get_user_recommendations(user_id: str):
-    return [
-        {
-            "service_name": "House Cleaning",
-            "confidence_score": 0.95,
-            "reason": "Based on your previous bookings and seasonal patterns",
-            "estimated_price": 2500,
-            "estimated_duration": 150
-        },
-        {
-            "service_name": "Plumbing Repair", 
-            "confidence_score": 0.78,
-            "reason": "Popular service in your area this time of year",
-            "estimated_price": 1800,
-            "estimated_duration": 90
-        }
-    ]
+@app.get("/metrics/admission")
+async def get_admission_metrics():
+    return admission_controller.metrics()
 
-@app.get("/api/v1/recommendations/trending")
-async def get_trending_services():
-    return {
-        "trending_services": [
-            {
-                "service_name": "House Cleaning",
-                "trend_score": 0.95,
-                "booking_increase": "+25%",
-                "reason": "High demand due to festival season"
-            },
-            {
-                "service_name": "HVAC Services",
-                "trend_score": 0.88,
-                "booking_increase": "+15%", 
-                "reason": "Summer preparation surge"
-            }
-        ]
-    }
+# Routers backed by the ML core
+app.include_router(predictions.router, prefix="/api/v1/predictions", tags=["predictions"])
+app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["recommendations"])
+app.include_router(provider_matching.router, prefix="/api/v1/matching", tags=["matching"])
+app.include_router(analytics.router)
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
+app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
 
-# Predictions endpoints
-@app.post("/api/v1/predictions/duration")
-async def predict_duration(request: Dict[Any, Any]):
-    base_duration = 120  # 2 hours base
-    
-    # Adjust based on factors
-    if request.get("area_sqft", 1200) > 1500:
-        base_duration += 30
-    if request.get("complexity") == "high":
-        base_duration += 45
-    elif request.get("complexity") == "low":
-        base_duration -= 30
-        
-    return {
-        "estimated_duration_minutes": base_duration,
-        "confidence_score": 0.85,
-        "factors_considered": ["area_sqft", "complexity", "time_of_day"],
-        "duration_range": {
-            "min": base_duration - 30,
-            "max": base_duration + 30
-        }
-    }
+# Background jobs
+background_tasks = []
 
-# Provider matching endpoints
-@app.post("/api/v1/matching/find-best-provider")
-async def find_best_providers(request: Dict[Any, Any]):
-    return [
-        {
-            "provider_id": "prov_001",
-            "name": "Rajesh Kumar",
-            "rating": 4.9,
-            "experience_years": 8,
-            "distance_km": 2.5,
-            "estimated_arrival": "30 minutes",
-            "price_estimate": 2400,
-            "match_score": 0.96,
-            "availability_status": "Available"
-        },
-        {
-            "provider_id": "prov_002", 
-            "name": "Priya Sharma",
-            "rating": 4.7,
-            "experience_years": 5,
-            "distance_km": 3.2,
-            "estimated_arrival": "45 minutes",
-            "price_estimate": 2200,
-            "match_score": 0.89,
-            "availability_status": "Available"
-        }
-    ]
+@app.on_event("startup")
+async def start_background_jobs():
+    load_rollups()
+    background_tasks.append(asyncio.create_task(ingestion_loop()))
+    background_tasks.append(asyncio.create_task(retrain_scheduler.loop()))
+    background_tasks.append(asyncio.create_task(rollup_flush_loop()))
+    background_tasks.append(asyncio.create_task(pricing_loop()))
+    background_tasks.append(asyncio.create_task(candidates_refresh_loop()))
+    background_tasks.append(asyncio.create_task(analytics.metrics_broadcaster.run()))
+    if settings.jobs_enabled:
+        background_tasks.append(asyncio.create_task(job_queue.run()))
 
-# Analytics endpoints
-@app.get("/api/v1/analytics/real-time-metrics")
-async def get_real_time_metrics():
-    return {
-        "active_bookings": random.randint(45, 85),
-        "revenue_today": random.randint(15000, 45000),
-        "online_providers": random.randint(25, 45),
-        "customer_satisfaction_today": round(random.uniform(4.6, 4.9), 1),
-        "avg_response_time_minutes": random.randint(8, 18),
-        "popular_services_now": [
-            {"service": "House Cleaning", "current_demand": "High"},
-            {"service": "Plumbing Repair", "current_demand": "Medium"},
-            {"service": "Electrical Services", "current_demand": "High"}
-        ],
-        "system_health": {
-            "api_response_time": f"{random.randint(45, 120)}ms",
-            "cache_hit_rate": f"{random.randint(85, 98)}%",
-            "ml_model_status": "Healthy",
-            "database_performance": "Optimal"
-        },
-        "alerts": [
-            {
-                "type": "info",
-                "message": "Peak demand period detected for House Cleaning",
-                "timestamp": datetime.now().isoformat()
-            }
-        ]
-    }
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    consume_pending()
+    flush_rollups()
+    event_log.close()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+# Point every data path at a scratch directory before app modules read settings
+DATA_ROOT = tempfile.mkdtemp(prefix="hyphomz-tests-")
+for name, path in {
+    "DATABASE_URL": f"sqlite:///{os.path.join(DATA_ROOT, 'hyphomz_ml.db')}",
+    "MODEL_STORAGE_PATH": "models",
+    "CHURN_TRAINING_DATA_PATH": "churn",
+    "RETRAIN_DATA_PATH": "marketplace",
+    "ROLLUP_STORAGE_PATH": "rollups",
+    "SHARED_STATE_PATH": "shared",
+    "JOBS_RESULTS_PATH": "jobs",
+    "EVENT_LOG_PATH": "events",
+    "CANDIDATES_PATH": "candidates",
+    "PROFILING_OUTPUT_PATH": "profiles",
+}.items():
+    os.environ[name] = path if name == "DATABASE_URL" else os.path.join(DATA_ROOT, path)
+os.environ["LOCATION_GAZETTEER_PATH"] = os.path.join(BACKEND, "app", "data", "gazetteer.tsv")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DATA_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client without lifespan: no background loops, so requests see exactly what they write."""
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    return TestClient(app)
@@ -0,0 +1,111 @@
+import asyncio
+
+from app.core.coalescing import RequestCoalescer
+
+
+def _coalescer() -> RequestCoalescer:
+    return RequestCoalescer(ttl=60.0, idempotency_ttl=60.0, max_entries=100)
+
+
+class _Counter:
+    def __init__(self, delay: float = 0.05):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"call": self.calls}
+
+
+def test_concurrent_identical_requests_compute_once():
+    coalescer, compute = _coalescer(), _Counter()
+
+    async def run():
+        return await asyncio.gather(*(coalescer.get("key", compute) for _ in range(50)))
+
+    results = asyncio.run(run())
+    assert compute.calls == 1
+    assert all(result == {"call": 1} for result in results)
+    assert coalescer.metrics()["joined_in_flight"] == 49
+
+
+def test_invalidate_forces_recompute():
+    coalescer, compute = _coalescer(), _Counter(delay=0)
+
+    async def run():
+        first = await coalescer.get("key", compute)
+        cached = await coalescer.get("key", compute)
+        coalescer.invalidate()
+        return first, cached, await coalescer.get("key", compute)
+
+    first, cached, fresh = asyncio.run(run())
+    assert first == cached == {"call": 1}
+    assert fresh == {"call": 2}
+
+
+def test_invalidate_during_flight_is_not_cached():
+    coalescer, compute = _coalescer(), _Counter()
+
+    async def run():
+        pending = asyncio.ensure_future(coalescer.get("key", compute))
+        await asyncio.sleep(0.01)
+        coalescer.invalidate()
+        await pending
+        return await coalescer.get("key", compute)
+
+    assert asyncio.run(run()) == {"call": 2}
+
+
+def test_idempotency_key_replays_stored_response():
+    coalescer, compute = _coalescer(), _Counter(delay=0)
+
+    async def run():
+        original = await coalescer.get("key", compute, idempotency_key="retry-1")
+        # A later change must not alter what a retry of the original request sees
+        coalescer.invalidate()
+        replay = await coalescer.get("key", compute, idempotency_key="retry-1")
+        return original, replay
+
+    original, replay = asyncio.run(run())
+    assert replay is original
+    assert compute.calls == 1
+    assert coalescer.metrics()["idempotent_replays"] == 1
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    coalescer, compute = _coalescer(), _Counter(delay=0.1)
+
+    async def run():
+        leader = asyncio.ensure_future(coalescer.get("key", compute))
+        await asyncio.sleep(0.01)
+        followers = [asyncio.ensure_future(coalescer.get("key", compute)) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader, results
+
+    leader, results = asyncio.run(run())
+    assert leader.cancelled()
+    assert results == [{"call": 1}] * 5
+    assert compute.calls == 1
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    coalescer = _coalescer()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("shard down")
+
+    async def run():
+        return await asyncio.gather(*(coalescer.get("key", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    asyncio.run(run())
+    assert calls == 2
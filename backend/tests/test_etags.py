@@ -0,0 +1,53 @@
+import pytest
+
+CHURN = {"customer_id": "cust_1", "bookings_count": 4, "avg_rating_given": 4.2, "days_since_last_booking": 40,
+         "total_spent": 6000.0, "complaint_count": 1, "preferred_services": ["House Cleaning"]}
+
+
+def test_get_revalidates_with_304(client):
+    first = client.get("/api/v1/predictions/market-trends/Delhi")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    again = client.get("/api/v1/predictions/market-trends/Delhi", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag.replace("-gzip", "")
+    assert client.get("/api/v1/predictions/market-trends/Delhi",
+                      headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_post_ignores_if_none_match(client):
+    first = client.post("/api/v1/predictions/churn", json=CHURN)
+    assert first.status_code == 200
+    for if_none_match in (first.headers["etag"], "*"):
+        again = client.post("/api/v1/predictions/churn", json=CHURN, headers={"If-None-Match": if_none_match})
+        assert again.status_code == 200
+        assert again.json() == first.json()
+
+
+def test_post_star_does_not_hide_invalid_bodies(client):
+    response = client.post("/api/v1/predictions/churn", json={"customer_id": "cust_1"},
+                           headers={"If-None-Match": "*"})
+    assert response.status_code == 422
+
+
+def test_get_star_matches_only_an_existing_representation(client):
+    assert client.get("/api/v1/predictions/market-trends/Delhi",
+                      headers={"If-None-Match": "*"}).status_code == 304
+    invalid = client.get("/api/v1/analytics/rollups/export", params={"tier": "year"}, headers={"If-None-Match": "*"})
+    assert invalid.status_code == 422
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_small_compressible_responses_vary_on_accept_encoding(client, accept_encoding):
+    response = client.post("/api/v1/predictions/duration",
+                           json={"service_type": "Lawn Care", "complexity": "low", "provider_experience": 2},
+                           params={"explain": "false"}, headers={"Accept-Encoding": accept_encoding})
+    assert len(response.content) < 1024
+    assert "content-encoding" not in response.headers
+    assert "accept-encoding" in response.headers["vary"].lower()
+
+
+def test_compressed_responses_vary_once(client):
+    response = client.get("/api/v1/predictions/market-trends/Delhi", headers={"Accept-Encoding": "gzip"})
+    vary = [value.strip().lower() for value in response.headers["vary"].split(",")]
+    assert vary.count("accept-encoding") == 1
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+
+from app.core.event_log import EventLog
+
+SEGMENT_BYTES = 8 * 1024
+
+
+def open_log(path, **options):
+    return EventLog(path, segment_bytes=SEGMENT_BYTES, fsync_bytes=64 * 1024, index_interval=16, **options)
+
+
+def append_from_worker(path, worker, batches, offsets):
+    log = open_log(path)
+    appended = []
+    for batch in range(batches):
+        events = [("booking", {"worker": worker, "seq": batch * 3 + i, "service": "Plumbing Repair"})
+                  for i in range(3)]
+        appended.extend(log.append_many(events))
+    log.close()
+    offsets.put((worker, appended))
+
+
+def test_processes_append_to_one_log_without_colliding(tmp_path):
+    path = str(tmp_path / "events")
+    workers, batches = 4, 150
+    context = multiprocessing.get_context("fork")
+    offsets = context.Queue()
+    # One reader in this process keeps its view open while the others append and roll segments
+    reader = open_log(path, read_only=True)
+    assert reader.end_offset == 0
+    processes = [context.Process(target=append_from_worker, args=(path, worker, batches, offsets))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    appended = dict(offsets.get(timeout=60) for _ in processes)
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    total = workers * batches * 3
+    assert sorted(offset for worker_offsets in appended.values() for offset in worker_offsets) == list(range(total))
+    assert len([name for name in os.listdir(path) if name.endswith(".log")]) > 3
+
+    for log in (reader, open_log(path)):
+        assert log.end_offset == total
+        records, next_offset = log.read(0, max_records=total + 10)
+        assert next_offset == total
+        assert [offset for offset, _ in records] == list(range(total))
+        for worker, worker_offsets in appended.items():
+            events = [event for offset, event in records if offset in set(worker_offsets)]
+            assert [event["worker"] for event in events] == [worker] * len(worker_offsets)
+            assert [event["seq"] for event in events] == list(range(len(worker_offsets)))
+        # Random access lands on the record that was appended at that offset
+        offset = appended[2][100]
+        assert log.read(offset, 1)[0] == [(offset, {"type": "booking", "worker": 2, "seq": 100,
+                                                    "service": "Plumbing Repair"})]
+        log.close()
+
+
+def test_appends_after_another_process_rolled_the_log(tmp_path):
+    path = str(tmp_path / "events")
+    first, second = open_log(path), open_log(path)
+    for i in range(200):
+        log = first if i % 2 else second
+        assert log.append("booking", {"i": i}) == i
+    assert [event["i"] for _, event in first.read(0, 500)[0]] == list(range(200))
+    assert first.status()["segments"] == second.status()["segments"] > 1
+    first.close()
+    second.close()
+
+
+def test_torn_tail_is_truncated_before_appending(tmp_path):
+    path = str(tmp_path / "events")
+    log = open_log(path)
+    log.append_many([("booking", {"i": i}) for i in range(10)])
+    log.close()
+    segment = os.path.join(path, sorted(name for name in os.listdir(path) if name.endswith(".log"))[-1])
+    with open(segment, "ab") as f:
+        f.write(b"\x40\x00\x00\x00torn")
+    log = open_log(path)
+    assert log.append("booking", {"i": 10}) == 10
+    assert [event["i"] for _, event in log.read(0, 100)[0]] == list(range(11))
+    log.close()
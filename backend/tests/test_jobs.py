@@ -0,0 +1,84 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.core import jobs
+from app.core.admission import admission_controller
+from app.core.jobs import job_queue
+
+SERVICES = ["House Cleaning", "Plumbing Repair", "Electrical Work"]
+LOCATIONS = ["Delhi", "Mumbai", "Bangalore", "Noida", "Gurgaon", "Faridabad"]
+FORECAST = {"service_types": SERVICES, "locations": LOCATIONS,
+            "prediction_date": "2025-03-03T00:00:00", "time_horizon_days": 365}
+
+
+def test_demand_horizon_is_validated(client):
+    request = {"service_type": "House Cleaning", "location": "Delhi", "prediction_date": "2025-03-03T00:00:00"}
+    assert client.post("/api/v1/predictions/demand", json={**request, "time_horizon_days": None}).status_code == 422
+    assert client.post("/api/v1/predictions/demand", json={**request, "time_horizon_days": 0}).status_code == 422
+    too_long = client.post("/api/v1/predictions/demand", json={**request, "time_horizon_days": 365})
+    assert too_long.status_code == 400
+    assert "demand_forecast" in too_long.json()["detail"]
+    assert len(client.post("/api/v1/predictions/demand", json=request).json()["predicted_demand"]) == 7
+
+
+@pytest.fixture
+def slow_forecasts(monkeypatch):
+    """Forecast chunks that take a moment, logging each start and the batch slots in use meanwhile."""
+    kind = jobs.job_types["demand_forecast"]
+    calls = []
+
+    def run_chunk(params, start, stop):
+        calls.append((start, admission_controller.class_in_flight["batch"]))
+        time.sleep(0.2)
+        return kind.run_chunk(params, start, stop)
+
+    monkeypatch.setitem(jobs.job_types, "demand_forecast", kind._replace(run_chunk=run_chunk))
+    monkeypatch.setattr(job_queue, "poll_interval", 0.05)
+    return calls
+
+
+def test_long_forecast_job_resumes_and_streams(client, slow_forecasts):
+    submitted = client.post("/api/v1/jobs", json={"job_type": "demand_forecast", "params": FORECAST})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["job_id"]
+    assert submitted.json()["total_items"] == len(SERVICES) * len(LOCATIONS)
+
+    async def interrupted():
+        # Stop the worker like a shutdown would, part way through the second chunk
+        worker = asyncio.ensure_future(job_queue.run())
+        while job_queue.get(job_id)["chunks"] < 1:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    asyncio.run(interrupted())
+    job = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert job["status"] == "running"
+    assert job["chunks"] == 1
+    partial = client.get(f"/api/v1/jobs/{job_id}/results").json()
+    assert len(partial) == 8
+
+    async def resumed():
+        worker = asyncio.ensure_future(job_queue.run())
+        try:
+            return await asyncio.to_thread(client.get, f"/api/v1/jobs/{job_id}/results", params={"follow": "true"})
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    streamed = asyncio.run(resumed())
+    assert streamed.status_code == 200
+    forecasts = json.loads(streamed.content)
+    assert [(f["service_type"], f["location"]) for f in forecasts] == [
+        (service, location) for service in SERVICES for location in LOCATIONS]
+    assert all(len(f["predicted_demand"]) == 365 for f in forecasts)
+    assert client.get(f"/api/v1/jobs/{job_id}").json()["status"] == "succeeded"
+
+    # The first chunk was not recomputed after the restart, and the followed
+    # stream never held a batch admission slot while the job ran
+    starts = [start for start, _ in slow_forecasts]
+    assert starts.count(0) == 1 and starts[-2:] == [8, 16]
+    assert all(in_flight == 0 for _, in_flight in slow_forecasts)
@@ -0,0 +1,46 @@
+import pytest
+
+from app.core.locations import location_index
+
+
+@pytest.mark.parametrize("text, zone", [
+    ("Greater Noida", "Greater Noida"),
+    ("Gr. Noida West", "Greater Noida"),
+    ("flat 4, sector 62 noida", "Noida"),
+    ("H.No 12, Block B, Indirapuram, India", "Ghaziabad"),
+    ("Alpha 1", "Greater Noida"),
+    ("Gurugram", "Gurgaon"),
+    # Typos, resolved by similarity because no alias occurs in them
+    ("Gaziabaad", "Ghaziabad"),
+    ("faridbad", "Faridabad"),
+    ("New Dlehi", "Delhi"),
+])
+def test_resolves(text, zone):
+    assert location_index.resolve(text).name == zone
+
+
+@pytest.mark.parametrize("text", [
+    # Close in spelling to a zone, but different places
+    "Greater Kailash", "Ghazipur", "alpha", "Alpha 2",
+    # A served alias alongside a city outside the service area
+    "Dwarka Mumbai",
+    "Mumbai", "Bengaluru", "Pune", "Kolkata",
+    "xyz", "Springfield", "",
+])
+def test_unknown_places_stay_unresolved(text):
+    assert location_index.resolve(text) is None
+    assert location_index.coordinates(text) is None
+    assert location_index.canonical(text) == text.strip()
+
+
+def test_an_alias_beats_a_closer_whole_input_spelling():
+    # "greter noida" is nearer to "greater noida" as a whole, but only "noida" occurs in it
+    assert location_index.resolve("greter noida").name == "Noida"
+
+
+def test_aliases_of_two_zones_leave_the_input_unresolved():
+    assert location_index.resolve("Rohini Vaishali") is None
+    assert location_index.resolve("Noida Sector 18, near Delhi") is None
+    # Aliases contained in a longer one don't count: "noida" in "greater noida", "faridabad" in "sector 15 faridabad"
+    assert location_index.resolve("Gaur City, Greater Noida West").name == "Greater Noida"
+    assert location_index.resolve("Sector 15 Faridabad").name == "Faridabad"
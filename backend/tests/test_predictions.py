@@ -0,0 +1,63 @@
+import math
+
+import pytest
+
+from app.routers.predictions import DURATION_FACTORS, MAX_KEY_FACTORS
+
+DURATION_RECORDS = [
+    {"service_type": "House Cleaning", "area_sqft": 2400, "complexity": "high", "provider_experience": 2,
+     "time_of_day": "afternoon"},
+    {"service_type": "Plumbing Repair", "complexity": "low", "provider_experience": 12, "time_of_day": "evening"},
+    {"service_type": "Interior Painting", "area_sqft": 800},
+    {"service_type": "Unlisted Service", "complexity": "medium"},
+]
+
+
+@pytest.mark.parametrize("explain", ["false", "true"])
+def test_single_and_batch_duration_agree(client, explain):
+    batch = client.post(f"/api/v1/predictions/duration/batch?explain={explain}", json=DURATION_RECORDS)
+    assert batch.status_code == 200
+    assert len(batch.json()) == len(DURATION_RECORDS)
+    for record, batched in zip(DURATION_RECORDS, batch.json()):
+        single = client.post(f"/api/v1/predictions/duration?explain={explain}", json=record)
+        assert single.status_code == 200
+        assert single.json() == {"factor_contributions": None, **batched}
+
+
+def test_duration_is_served_by_the_model(client):
+    low = client.post("/api/v1/predictions/duration", json={"service_type": "Lawn Care", "complexity": "low"})
+    high = client.post("/api/v1/predictions/duration", json={"service_type": "Custom Furniture",
+                                                            "complexity": "high"})
+    assert low.json()["estimated_duration_minutes"] < high.json()["estimated_duration_minutes"]
+    assert low.json()["factors_considered"][0].startswith("Service type: Lawn Care")
+
+
+def test_duration_explains_by_default(client):
+    record = {"service_type": "House Cleaning", "area_sqft": 2400, "complexity": "high", "provider_experience": 1,
+              "time_of_day": "evening"}
+    explained = client.post("/api/v1/predictions/duration", json=record).json()
+    contributions = explained["factor_contributions"]
+    assert contributions and len(contributions) <= MAX_KEY_FACTORS
+    assert set(contributions) <= set(DURATION_FACTORS)
+    # Ranked by magnitude, and every rendered factor is one of them
+    magnitudes = [abs(value) for value in contributions.values()]
+    assert magnitudes == sorted(magnitudes, reverse=True)
+    assert 0 < len(explained["factors_considered"]) <= len(contributions)
+
+    unexplained = client.post("/api/v1/predictions/duration?explain=false", json=record).json()
+    assert unexplained["factor_contributions"] is None
+    assert unexplained["factors_considered"] == []
+    assert unexplained["estimated_duration_minutes"] == explained["estimated_duration_minutes"]
+
+
+def test_duration_contributions_add_up_to_the_estimate(client):
+    record = {"service_type": "Interior Painting", "area_sqft": 1800, "complexity": "low", "provider_experience": 8,
+              "time_of_day": "morning"}
+    explained = client.post(f"/api/v1/predictions/duration?top_factors={len(DURATION_FACTORS)}", json=record).json()
+    contributions = explained["factor_contributions"]
+    assert len(contributions) == len(DURATION_FACTORS)
+    # Contributions are log multipliers of a 120 minute medium job
+    assert math.isclose(120 * math.exp(sum(contributions.values())), explained["estimated_duration_minutes"],
+                        rel_tol=0.01, abs_tol=1)
+    assert len(client.post("/api/v1/predictions/duration?top_factors=1", json=record).json()
+               ["factor_contributions"]) == 1
@@ -0,0 +1,59 @@
+import asyncio
+import threading
+
+import numpy as np
+
+from app.core import pricing
+from app.core.pricing import PricingEngine
+
+LAT, LON = 28.6, 77.2
+
+
+def make_engine(**overrides):
+    options = dict(max_zones=64, slot_hours=3, cell_deg=0.05, half_life=300.0, requests_per_provider=2.0,
+                   min_supply=1.0, sensitivity=0.5, smoothing=1.0, min_multiplier=0.9,
+                   max_multiplier=2.5, step=0.05)
+    options.update(overrides)
+    return PricingEngine(**options)
+
+
+def demand_rate(engine, requests_per_hour):
+    """Demand whose decayed rate after one recompute is requests_per_hour."""
+    engine.half_life = 1e-9
+    engine._last_recompute -= 3600.0
+    for _ in range(requests_per_hour):
+        engine.record_demand(LAT, LON, "Plumbing Repair")
+    engine.recompute()
+
+
+def test_zone_without_providers_surges_with_demand_not_to_the_cap():
+    engine = make_engine()
+    engine.set_supply(np.array([LAT]), np.array([LON]), np.array([0]))
+    demand_rate(engine, 3)
+    # 3 requests an hour against the floor of one provider serving 2: 1 + 0.5 * (1.5 - 1)
+    assert engine.multiplier(LAT, LON, "Plumbing Repair") == 1.25
+
+
+def test_unknown_supply_does_not_surge():
+    engine = make_engine()
+    demand_rate(engine, 50)
+    assert engine.multiplier(LAT, LON, "Plumbing Repair") == 1.0
+
+
+def test_pricing_loop_recomputes_off_the_event_loop(monkeypatch):
+    threads = []
+    monkeypatch.setattr(pricing.settings, "pricing_recompute_interval_seconds", 0.01)
+    monkeypatch.setattr(pricing.settings, "pricing_enabled", True)
+    monkeypatch.setattr(pricing.pricing_engine, "refresh_supply", lambda: threads.append(threading.get_ident()))
+    monkeypatch.setattr(pricing.pricing_engine, "recompute", lambda: threads.append(threading.get_ident()))
+
+    async def run():
+        loop_thread = threading.get_ident()
+        task = asyncio.ensure_future(pricing.pricing_loop())
+        while len(threads) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads
@@ -0,0 +1,134 @@
+import asyncio
+import math
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.core import retraining
+from app.core.config import settings
+from app.core.retraining import RetrainScheduler, get_published_model, run_retraining
+from app.core.simulator import generate
+
+
+@pytest.fixture(scope="module")
+def marketplace(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp("marketplace"))
+    generate(root, n_bookings=1_000_000, n_customers=100_000, n_providers=2_000)
+    return root
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch, marketplace):
+    monkeypatch.setattr(settings, "model_storage_path", str(tmp_path / "models"))
+    monkeypatch.setattr(settings, "retrain_data_path", marketplace)
+    monkeypatch.setattr(settings, "churn_training_data_path", os.path.join(marketplace, "customers"))
+    monkeypatch.setattr(settings, "model_reload_interval_seconds", 0.0)
+    monkeypatch.setattr(retraining, "_published", {})
+    monkeypatch.setattr(retraining, "_next_checks", {})
+    return settings.model_storage_path
+
+
+def test_published_duration_and_demand_models_are_served(client, models):
+    record = {"service_type": "Plumbing Repair", "complexity": "high", "provider_experience": 10}
+    before = client.post("/api/v1/predictions/duration?explain=false", json=record).json()
+    assert get_published_model("duration") is None
+
+    reports = {report["model"]: report for report in run_retraining(["duration", "demand"])}
+    assert reports["duration"]["status"] == reports["demand"]["status"] == "published"
+
+    arrays, meta = get_published_model("duration")
+    coefficients = arrays["coefficients"]
+    n = len(meta["services"])
+    expected = math.exp(coefficients[meta["services"].index("Plumbing Repair")] + coefficients[n + 1]
+                        + coefficients[n + 2] + coefficients[n + 3])
+    after = client.post("/api/v1/predictions/duration?explain=false", json=record).json()
+    assert after["estimated_duration_minutes"] == int(expected)
+    assert after["estimated_duration_minutes"] != before["estimated_duration_minutes"]
+
+    arrays, meta = get_published_model("demand")
+    forecast = client.post("/api/v1/predictions/demand", json={
+        "service_type": "House Cleaning", "location": "noida", "prediction_date": "2025-03-03T09:00:00",
+        "time_horizon_days": 7}).json()
+    table = arrays["weekday_demand"][:, meta["locations"].index("Noida"), meta["services"].index("House Cleaning")]
+    assert [day["demand"] for day in forecast["predicted_demand"]] == np.rint(table).astype(int).tolist()
+
+
+def test_only_one_scheduler_leads_and_runs(models):
+    first, second = RetrainScheduler(), RetrainScheduler()
+    assert first.leader
+    assert not second.leader
+    first._claim()
+    try:
+        with pytest.raises(RuntimeError):
+            second._claim()
+    finally:
+        first._release()
+    second._claim()
+    second._release()
+
+
+def test_scheduler_waits_an_interval_before_the_first_run(models, monkeypatch):
+    scheduler = RetrainScheduler()
+    runs = []
+
+    async def run_once(models=None):
+        runs.append(models)
+
+    monkeypatch.setattr(scheduler, "run_once", run_once)
+    monkeypatch.setattr(settings, "retrain_enabled", True)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.loop(), timeout=0.2)
+
+    asyncio.run(run())
+    assert runs == []
+
+
+def test_serving_p99_is_unaffected_by_a_worker_retrain(models):
+    from app.routers.predictions import _score_churn
+
+    rng = np.random.default_rng(7)
+    columns = {
+        "customer_id": [f"cust_{i}" for i in range(100)],
+        "bookings_count": rng.integers(0, 40, 100).tolist(),
+        "avg_rating_given": rng.uniform(1, 5, 100).tolist(),
+        "days_since_last_booking": rng.integers(0, 200, 100).tolist(),
+        "total_spent": rng.uniform(0, 20000, 100).tolist(),
+        "complaint_count": rng.integers(0, 5, 100).tolist(),
+        "preferred_services": [[] for _ in range(100)],
+    }
+
+    async def probe(done):
+        """A 100-customer churn batch every 2ms; latency from arrival, so event loop stalls count."""
+        latencies = []
+        arrival = time.perf_counter()
+        while not done():
+            arrival += 0.002
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            _score_churn(columns)
+            latencies.append(time.perf_counter() - arrival)
+        return sorted(latencies)
+
+    def p99(latencies):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    async def idle():
+        deadline = time.perf_counter() + 2
+        return await probe(lambda: time.perf_counter() > deadline)
+
+    async def during_retrain():
+        task = asyncio.ensure_future(RetrainScheduler().run_once())
+        latencies = await probe(task.done)
+        run = await task
+        assert run["exit_code"] == 0
+        assert {report["model"] for report in run["models"]} == set(retraining.MODELS)
+        return latencies
+
+    baseline = asyncio.run(idle())
+    retraining_latencies = asyncio.run(during_retrain())
+    assert len(retraining_latencies) > 100
+    # The worker is a separate, niced process: serving keeps its latency, give or take scheduler noise
+    assert p99(retraining_latencies) <= max(3 * p99(baseline), p99(baseline) + 0.01)
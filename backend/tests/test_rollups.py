@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core import ingestion
+from app.core.event_log import EventLog
+from app.core.rollups import DAY, MONTH, SNAPSHOT_FILE, TIERS, WEEK, RollupStore, backfill, rollup_items
+
+LOCATIONS = ["Delhi", "Noida", "Mumbai"]
+SERVICES = ["House Cleaning", "Plumbing Repair"]
+
+
+def write_events(path, n=3000):
+    log = EventLog(path, segment_bytes=16 * 1024, fsync_bytes=1 << 20, index_interval=64)
+    rng = np.random.default_rng(5)
+    start = datetime(2025, 1, 1)
+    types = ["booking", "booking", "rating", "complaint"]
+    events = []
+    for i in range(n):
+        event_type = types[rng.integers(len(types))]
+        event = {"customer_id": f"cust_{i % 50}", "service": SERVICES[rng.integers(len(SERVICES))],
+                 "timestamp": (start + timedelta(hours=int(rng.integers(24 * 90)))).isoformat()}
+        if event_type != "complaint":
+            event["location"] = LOCATIONS[rng.integers(len(LOCATIONS))]
+        if event_type == "booking":
+            event["price"] = float(rng.integers(300, 3000))
+        if event_type == "rating":
+            event["rating"] = float(rng.integers(1, 6))
+        events.append((event_type, event))
+    for i in range(0, n, 100):
+        log.append_many(events[i:i + 100])
+    log.close()
+    return log
+
+
+def replayed(path) -> RollupStore:
+    """Rollups built the way the live consumer builds them: one batch after another."""
+    log = EventLog(path, segment_bytes=16 * 1024, fsync_bytes=1 << 20, index_interval=64)
+    store, offset = RollupStore(), 0
+    while offset < log.end_offset:
+        records, offset = log.read(offset, 500)
+        store.record_batch(rollup_items(records), offset)
+    log.close()
+    return store
+
+
+def test_backfill_replays_every_segment(tmp_path):
+    path = str(tmp_path / "events")
+    log = write_events(path)
+    reopened = EventLog(path, segment_bytes=16 * 1024, fsync_bytes=1 << 20, index_interval=64, read_only=True)
+    assert len(reopened.segment_ranges()) > 3
+    reopened.close()
+
+    rebuilt = backfill(path, workers=2)
+    expected = replayed(path)
+    assert rebuilt.log_offset == expected.log_offset == 3000
+    for tier in TIERS:
+        assert rebuilt.tiers[tier] == expected.tiers[tier]
+    assert rebuilt.services_by_location == expected.services_by_location
+
+
+def test_read_only_log_leaves_a_torn_tail_alone(tmp_path):
+    path = str(tmp_path / "events")
+    write_events(path, n=100)
+    segment = sorted(os.listdir(path))[-1]
+    with open(os.path.join(path, segment), "ab") as f:
+        f.write(b"\x10\x00")
+    size = os.path.getsize(os.path.join(path, segment))
+    log = EventLog(path, segment_bytes=16 * 1024, fsync_bytes=1 << 20, index_interval=64, read_only=True)
+    assert log.end_offset == 100
+    log.close()
+    assert os.path.getsize(os.path.join(path, segment)) == size
+
+
+def test_snapshot_holds_every_tier_and_one_offset(tmp_path):
+    store = RollupStore()
+    store.record_batch([("Delhi", "House Cleaning", datetime(2025, 3, 3, 10), 1200.0, None, 1),
+                        ("Delhi", "House Cleaning", datetime(2025, 3, 4, 10), None, 4.0, 0)], 42)
+    path = str(tmp_path / "rollups")
+    store.save(path)
+    # A save interrupted before its rename leaves only a temporary file behind
+    with open(os.path.join(path, "rollups.tmp.npz"), "wb") as f:
+        f.write(b"partial")
+    assert set(os.listdir(path)) == {SNAPSHOT_FILE, "rollups.tmp.npz"}
+
+    loaded = RollupStore.load(path)
+    assert loaded.log_offset == 42
+    for tier in (DAY, WEEK, MONTH):
+        assert loaded.tiers[tier] == store.tiers[tier]
+
+
+def test_ingest_appends_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def append_many(events):
+        threads.append(threading.get_ident())
+        return []
+
+    monkeypatch.setattr(ingestion.event_log, "append_many", append_many)
+
+    async def run():
+        await ingestion.ingest([("booking", {"service": "House Cleaning"})])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and threads[0] != loop_thread
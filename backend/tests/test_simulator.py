@@ -0,0 +1,22 @@
+import numpy as np
+
+from app.core.catalog import BASE_DURATIONS, BASE_PRICES
+from app.core.locations import location_index
+from app.core.simulator import LOCATION_NAMES, LOCATIONS, MarketplaceSimulator, SERVICE_TYPES
+
+
+def test_locations_cover_the_gazetteer():
+    assert LOCATION_NAMES == [zone.name for zone in location_index.zones.values()]
+    assert abs(sum(share for *_, share in LOCATIONS) - 1.0) < 1e-9
+
+
+def test_bookings_follow_the_catalog():
+    simulator = MarketplaceSimulator(n_customers=10_000, n_providers=500, chunk_size=200_000)
+    chunk = next(simulator.iter_booking_chunks(200_000))
+    # Medium complexity: price and duration scatter around the catalog's base values
+    medium = chunk["complexity"] == 1
+    for code, service in enumerate(SERVICE_TYPES):
+        rows = medium & (chunk["service"] == code)
+        assert abs(np.median(chunk["price"][rows]) / BASE_PRICES[service] - 1) < 0.1
+        assert abs(np.median(chunk["duration_minutes"][rows]) / BASE_DURATIONS[service] - 1) < 0.25
+    assert set(np.unique(chunk["location"])) == set(range(len(LOCATION_NAMES)))